@@ -0,0 +1,3 @@
+"""
+Benchmarks of parsing and downloading against a local stand-in server.
+"""
@@ -0,0 +1,221 @@
+"""
+Runs the benchmarks and compares them against a stored baseline.
+
+Run (from basedir): python3 -m bench.run -h
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from bench.scenarios import SCENARIOS, BASE_DIR, measure
+from bench.server import BenchServer, SIZE_PROFILES
+
+# Default baseline-file (written with --save-baseline)
+BASELINE_PATH = os.path.join(BASE_DIR, 'bench', 'baseline.json')
+
+# Measures compared with the baseline: name -> higher is better
+MEASURES = {
+    'files_per_second': True,
+    'mb_per_second': True,
+    'peak_rss_mb': False,
+    'seconds': False,
+    'bytes_per_url': False,
+}
+
+
+def _get_parser():
+    """Argument-parser of the benchmark-runner.
+
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmarks against a local stand-in server')
+    parser.add_argument('--lines', default='1000',
+                        help=('Comma-separated sizes of the synthetic '
+                              'input-files (default: 1000; e.g. '
+                              '1000,100000,1000000)'))
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=('Comma-separated scenarios (default: {})'
+                              .format(','.join(SCENARIOS))))
+    parser.add_argument('--profile', choices=sorted(SIZE_PROFILES),
+                        default='small', help='Object-sizes (default: small)')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='WORKERS setting (default: 8)')
+    parser.add_argument('--engine', choices=('thread', 'async'),
+                        default='thread', help='ENGINE setting')
+    parser.add_argument('--pipeline', type=int, default=1,
+                        help='PIPELINE setting (default: 1)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Server-latency per response in seconds')
+    parser.add_argument('--bandwidth', type=float, default=None,
+                        help='Server-bandwidth per response in bytes/s')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Share of URLs answered once with 503')
+    parser.add_argument('--baseline', default=BASELINE_PATH,
+                        help='Baseline-file (default: bench/baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store the results as new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help=('Allowed relative regression against the '
+                              'baseline (default: 0.2)'))
+    parser.add_argument('--json', default=None, metavar='FILE',
+                        help='Also write the results to FILE')
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    return parser
+
+
+def run_benchmarks(args):
+    """Run every scenario for every input-size against a fresh server.
+
+       Each scenario runs in its own process (own peak-RSS, server not
+       competing for the GIL) on an input-file of synthetic URLs.
+
+       Returns:
+           dict: "<scenario>/<lines>" -> measures.
+
+    """
+    server = BenchServer(args.profile, args.latency, args.bandwidth,
+                         args.error_rate)
+    server.start()
+    settings = {'WORKERS': args.workers, 'ENGINE': args.engine,
+                'PIPELINE': args.pipeline, 'BACKOFF': 0.01}
+    results = {}
+    try:
+        for lines in [int(value) for value in args.lines.split(',')]:
+            for name in args.scenarios.split(','):
+                if name not in SCENARIOS:
+                    raise ValueError('Unknown scenario "{}"'.format(name))
+                # Startup is measured on a single URL
+                count = 1 if name in ('startup', 'imports') else lines
+                results['{}/{}'.format(name, lines)] = _run_scenario(
+                    server, name, count, settings)
+    finally:
+        server.stop()
+    return results
+
+
+def _run_scenario(server, name, lines, settings):
+    """Run a scenario in a new process on a new input-file.
+
+       Returns:
+           dict: measures (see MEASURES).
+
+    """
+    work_dir = tempfile.mkdtemp()
+    try:
+        url_file = os.path.join(work_dir, 'urls.txt')
+        size = server.write_url_file(url_file, lines)
+        spec = {'scenario': name, 'url_file': url_file,
+                'work_dir': work_dir, 'settings': settings}
+        output = subprocess.run(
+            [sys.executable, '-m', 'bench.run', '--worker', json.dumps(spec)],
+            cwd=BASE_DIR, check=True, stdout=subprocess.PIPE).stdout
+        result = json.loads(output.decode().splitlines()[-1])
+    finally:
+        shutil.rmtree(work_dir)
+
+    if name in ('parse', 'validate', 'imports'):
+        size = 0  # nothing downloaded
+    seconds = result['seconds']
+    result['files_per_second'] = result['files'] / seconds
+    result['mb_per_second'] = size / 1e6 / seconds
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against baseline.
+
+       Args:
+           results (dict): as returned by run_benchmarks.
+           baseline (dict): stored results.
+           tolerance (float): allowed relative regression.
+
+       Returns:
+           List(str): one message per regression.
+
+    """
+    regressions = []
+    for key, result in sorted(results.items()):
+        for measure, higher_is_better in MEASURES.items():
+            old = baseline.get(key, {}).get(measure)
+            new = result.get(measure)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change < -tolerance if higher_is_better
+                    else change > tolerance):
+                regressions.append('{} {}: {:.4g} -> {:.4g} ({:+.0%})'
+                                   .format(key, measure, old, new, change))
+    return regressions
+
+
+def _print_results(results, baseline):
+    """Print one line per scenario (with baseline-values if known).
+
+    """
+    print('{:<24}{:>10}{:>12}{:>12}{:>12}{:>12}{:>12}'.format(
+        'scenario/lines', 'files', 'seconds', 'files/s', 'MB/s',
+        'peak MB', 'bytes/URL'))
+    for key, result in sorted(results.items()):
+        _print_result(key, result)
+        old = baseline.get(key)
+        if old is not None:
+            _print_result('  (baseline)', old)
+
+
+def _print_result(label, result):
+    """Print the measures of one scenario.
+
+    """
+    bytes_per_url = result.get('bytes_per_url')
+    print('{:<24}{:>10}{:>12.3f}{:>12.1f}{:>12.2f}{:>12.1f}{:>12}'.format(
+        label, result['files'], result['seconds'],
+        result['files_per_second'], result['mb_per_second'],
+        result['peak_rss_mb'],
+        '-' if bytes_per_url is None else '{:.0f}'.format(bytes_per_url)))
+
+
+def main(argv):
+    """Entry of python3 -m bench.run.
+
+       Returns:
+           int: 0 (no regression) / 1 (regression against the baseline).
+
+    """
+    args = _get_parser().parse_args(argv)
+
+    if args.worker is not None:
+        spec = json.loads(args.worker)
+        print(json.dumps(measure(spec['scenario'], spec['url_file'],
+                                 spec['work_dir'], spec['settings'])))
+        return 0
+
+    results = run_benchmarks(args)
+
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    _print_results(results, baseline)
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print('REGRESSION', regression)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
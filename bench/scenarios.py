@@ -0,0 +1,181 @@
+"""
+Benchmark-scenarios, each run in a fresh process (see bench.run).
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from src.async_downloader import AsyncDownloader
+from src.downloader import Downloader
+from src.input_parser import InputParser
+from src.run_script import run
+
+# Base-dir of the repository (holding run.py)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse(url_file, work_dir, settings):
+    """Read and check all URLs of url_file (lazy InputParser, no download).
+
+       Returns:
+           int: URLs parsed.
+
+    """
+    parser = InputParser(url_file, _get_out_dir(work_dir), lazy=True)
+    return sum(1 for _ in parser.iter_url_targetname_pairs())
+
+
+def validate(url_file, work_dir, settings):
+    """Read and check all URLs of url_file up front and keep them (InputParser
+       not lazy, as with --validate-first; no download).
+
+       Memory is traced (tracemalloc), which slows the parser down.
+
+       Returns:
+           dict: files (URLs kept) and bytes_per_url (memory held by the
+                 parser per URL kept).
+
+    """
+    tracemalloc.start()
+    try:
+        parser = InputParser(url_file, _get_out_dir(work_dir))
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    files = len(parser.records)
+    return {'files': files, 'bytes_per_url': size / max(1, files)}
+
+
+def downloader(url_file, work_dir, settings):
+    """Download all URLs of url_file with the engine of settings; pairs are
+       prepared before (no URL-checks).
+
+       Returns:
+           int: files downloaded.
+
+    """
+    out_dir = _get_out_dir(work_dir)
+    with open(url_file) as f:
+        pairs = [(url, url.rsplit('/', 1)[1]) for url in f.read().split()]
+
+    if settings.get('ENGINE') == 'async':
+        engine = AsyncDownloader(out_dir, settings=settings)
+    else:
+        engine = Downloader(out_dir, settings=settings)
+    try:
+        engine.download_many(pairs)
+    finally:
+        engine.close()
+    return len(pairs)
+
+
+def pipeline(url_file, work_dir, settings):
+    """Whole program (run_script.run) on url_file, settings in config.ini.
+
+       Returns:
+           int: files downloaded.
+
+    """
+    _write_config(work_dir, settings)
+    os.chdir(work_dir)
+    run(['run.py', '-i', url_file])
+    return len(os.listdir(_get_out_dir(work_dir)))
+
+
+def startup(url_file, work_dir, settings):
+    """Program as new process (python3 run.py) on url_file; meant for a
+       single URL, so interpreter-start and imports dominate.
+
+       Returns:
+           int: files downloaded.
+
+    """
+    _write_config(work_dir, settings)
+    subprocess.run([sys.executable, os.path.join(BASE_DIR, 'run.py'),
+                    '-i', url_file], cwd=work_dir, check=True)
+    return len(os.listdir(_get_out_dir(work_dir)))
+
+
+def imports(url_file, work_dir, settings):
+    """Import of the program (run.py) as new process, nothing run: the share
+       of interpreter-start and imports in startup.
+
+       Returns:
+           int: files downloaded (0).
+
+    """
+    subprocess.run([sys.executable, '-c', 'import run'], cwd=BASE_DIR,
+                   check=True)
+    return 0
+
+
+SCENARIOS = {
+    'parse': parse,
+    'validate': validate,
+    'downloader': downloader,
+    'pipeline': pipeline,
+    'startup': startup,
+    'imports': imports,
+}
+
+# Modules the program imports only where needed (not for a small batch with
+# the thread-engine)
+DEFERRED_MODULES = ('asyncio', 'multiprocessing', 'sqlite3', 'hashlib')
+
+
+def measure(name, url_file, work_dir, settings):
+    """Run a scenario and measure it.
+
+       Args:
+           name (str): key of SCENARIOS.
+           url_file (str): path of the input-file.
+           work_dir (str): empty directory for config.ini and output.
+           settings (dict): "download"-settings.
+
+       Returns:
+           dict: keys seconds, files and peak_rss_mb (of this process and
+                 its children) and further measures of the scenario (e.g.
+                 bytes_per_url).
+
+    """
+    start = time.perf_counter()
+    result = SCENARIOS[name](url_file, work_dir, settings)
+    seconds = time.perf_counter() - start
+    if not isinstance(result, dict):
+        result = {'files': result}
+    result.update(seconds=seconds, peak_rss_mb=_get_peak_rss_mb())
+    return result
+
+
+def _get_out_dir(work_dir):
+    """Output-directory within work_dir (created if missing).
+
+    """
+    out_dir = os.path.join(work_dir, 'out')
+    os.makedirs(out_dir, exist_ok=True)
+    return out_dir
+
+
+def _write_config(work_dir, settings):
+    """Write config.ini with output-directory and settings to work_dir.
+
+    """
+    _get_out_dir(work_dir)
+    with open(os.path.join(work_dir, 'config.ini'), 'w') as f:
+        f.write('[output]\nTARGET_DIR=out\n\n[download]\n')
+        for key, value in settings.items():
+            f.write('{}={}\n'.format(key, value))
+
+
+def _get_peak_rss_mb():
+    """Peak resident set size of this process or its children in MB.
+
+    """
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)  # bytes
+    return peak / 1024  # kilobytes
@@ -0,0 +1,195 @@
+"""
+Local HTTP-server standing in for remote storage in benchmarks.
+"""
+
+import random
+import threading
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+# Object-sizes (bytes) cycled through by the synthetic files: mostly small
+# images, some larger ones
+SIZE_PROFILES = {
+    'tiny': (100,),
+    'small': (2 * 1024, 8 * 1024, 16 * 1024, 32 * 1024),
+    'mixed': (4 * 1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024,
+              16 * 1024, 8 * 1024, 32 * 1024),
+    'large': (8 * 1024 * 1024, 32 * 1024 * 1024),
+}
+
+# Bodies are slices of this block (repeated for larger objects)
+_BLOCK = memoryview(random.Random(0).getrandbits(8 * 1024 * 1024)
+                    .to_bytes(1024 * 1024, 'little'))
+
+# Bytes written per write while throttled
+_THROTTLE_CHUNK = 16 * 1024
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves "/<n>.bin" (n >= 0) with the size given by the size-profile
+       (keep-alive), after the configured latency and failures.
+
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # head and body are written separately
+
+    def do_GET(self):
+        server = self.server
+        size = server.get_size(self.path)
+        if size is None:
+            self.send_error(404)
+            return
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.should_fail(self.path):
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('ETag', '"{}"'.format(size))
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+
+        start = time.monotonic()
+        sent = 0
+        while sent < size:
+            n = min(size - sent, len(_BLOCK),
+                    _THROTTLE_CHUNK if server.bandwidth else len(_BLOCK))
+            if server.bandwidth:
+                # Wait until the bytes sent with this chunk are within the
+                # bandwidth-cap
+                delay = ((sent + n) / server.bandwidth -
+                         (time.monotonic() - start))
+                if delay > 0:
+                    time.sleep(delay)
+            self.wfile.write(_BLOCK[:n])
+            sent += n
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BenchServer():
+    """HTTP-server on localhost serving synthetic files "/0.bin", "/1.bin", ...
+
+    Files are not kept in memory: every path is served from one shared block
+    with the size given by the size-profile (SIZE_PROFILES, cycled by n).
+    Faults can be injected:
+
+    - latency: seconds before every response
+    - bandwidth: bytes per second per response
+    - error_rate: share of paths answered once with "503" (Retry-After: 0),
+      chosen reproducibly by seed
+
+    Expected usage: start; url per file; stop at the end.
+
+    """
+    def __init__(self, profile='mixed', latency=0.0, bandwidth=None,
+                 error_rate=0.0, seed=0):
+        """Init with (optional) size-profile and faults.
+
+           Args:
+               profile (str, optional): key of SIZE_PROFILES.
+               latency (float, optional): seconds before each response.
+               bandwidth (float, optional): bytes per second per response
+                                            (default: unlimited).
+               error_rate (float, optional): share of paths failing once.
+               seed (int, optional): seed choosing the failing paths.
+
+           Raises:
+               ValueError: If profile is unknown.
+
+        """
+        if profile not in SIZE_PROFILES:
+            raise ValueError('Unknown size-profile "{}"'.format(profile))
+
+        self.sizes = SIZE_PROFILES[profile]
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.seed = seed
+        self.httpd = None
+
+    def start(self):
+        """Bind to a free port and serve in a background-thread.
+
+        """
+        self.httpd = _ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.httpd.latency = self.latency
+        self.httpd.bandwidth = self.bandwidth
+        self.httpd.get_size = self.get_size
+        self.httpd.should_fail = self._should_fail
+        self._failed = set()
+        self._lock = threading.Lock()
+        thread = threading.Thread(target=self.httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        """Shutdown server.
+
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def get_size(self, path):
+        """Size of the file served for url-path (None if not served).
+
+        """
+        name = path.lstrip('/')
+        if not name.endswith('.bin') or not name[:-4].isdigit():
+            return None
+        return self.sizes[int(name[:-4]) % len(self.sizes)]
+
+    def _should_fail(self, path):
+        """Check if the request for path is to be answered with 503 (only
+           the first request of a failing path).
+
+        """
+        if not self.error_rate:
+            return False
+
+        with self._lock:
+            if path in self._failed:
+                return False
+            chance = random.Random('{}:{}'.format(self.seed, path)).random()
+            if chance >= self.error_rate:
+                return False
+            self._failed.add(path)
+            return True
+
+    def url(self, path):
+        """Get full URL for some url-path.
+
+        """
+        return 'http://127.0.0.1:{}{}'.format(self.httpd.server_port, path)
+
+    def write_url_file(self, path, lines):
+        """Write an input-file with one URL per line ("/0.bin" ...).
+
+           Args:
+               path (str): path of the input-file.
+               lines (int): number of URLs.
+
+           Returns:
+               int: total size of the files listed in bytes.
+
+        """
+        total = 0
+        base = self.url('/')
+        with open(path, 'w') as f:
+            for n in range(lines):
+                f.write('{}{}.bin\n'.format(base, n))
+                total += self.sizes[n % len(self.sizes)]
+        return total
@@ -28,6 +28,7 @@ def main():
        9:   URLInferFilenameError
        10:  URLParsingError
        11:  DownloaderDownloadError
+       12:  RunScriptIncompleteError (--keep-going: some lines failed)
        100: any other non-explicitly handled error
 
     """
@@ -55,6 +56,8 @@ def main():
         out_traceback_and_exit(10)
     except DownloaderDownloadError:
         out_traceback_and_exit(11)
+    except RunScriptIncompleteError:
+        out_traceback_and_exit(12)
     except Exception as e:
         out_traceback_and_exit(100)
 
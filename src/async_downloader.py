@@ -0,0 +1,474 @@
+"""
+This module provides the asyncio-based downloader (setting ENGINE=async).
+
+Kept apart from src.downloader, so runs with the thread-engine do not import
+asyncio.
+"""
+
+import asyncio
+import socket
+import ssl
+import time
+from os.path import join
+from urllib.parse import urlsplit
+from src.compression import get_accept_encoding, is_identity, DecodingWriter
+from src.downloader import (MAX_REDIRECTS, _BaseDownloader, _get_item,
+                            _get_redirect)
+from src.exceptions import DownloaderDownloadError, DownloaderHTTPError
+from src.journal import PART_SUFFIX
+from src.retry import parse_retry_after
+
+
+class AsyncDownloader(_BaseDownloader):
+    """Alternative to Downloader based on asyncio (selected by setting
+       ENGINE=async).
+
+    Speaks plain HTTP/1.1 (one request per connection) over
+    asyncio.open_connection, which allows many more downloads in flight than
+    one thread per download. Concurrency is capped globally
+    (MAX_CONNECTIONS) and per host (MAX_CONNECTIONS_PER_HOST).
+
+    Partial downloads of a previous run are not continued but restarted.
+
+    As the socket-timeout of the thread-engine, TIMEOUT applies to each
+    network-operation (connect, TLS-handshake, send, every read), not to a
+    whole download: a large file is not cut off while data keeps arriving.
+
+    Part-files are opened and written on the event-loop (blocking, chunk by
+    chunk): on a slow disk, every write stalls all downloads in flight. Use
+    the thread-engine where the output-directory is slow (e.g. a network
+    filesystem).
+
+    With metrics, "connect_seconds" includes the TLS-handshake (done by
+    asyncio.open_connection); with DNS-cache, name-resolution is recorded
+    as "dns_seconds" (else it is part of "connect_seconds").
+
+    Expected usage: init once; call download or download_many multiple times.
+
+    """
+    def download(self, url, target_filename):
+        """Download single file from URL and save to target-filename.
+
+           Args:
+               url (str): valid URL.
+               target_filename (str): valid filename
+
+           Raises:
+               DownloaderDownloadError: If download/saving fails.
+
+        """
+        self.download_many([(url, target_filename)])
+
+    def download_many(self, pairs, on_error=None):
+        """Download all url / target-filename pairs on an event-loop.
+
+           Pairs are consumed lazily: a new download is only started when a
+           global connection-slot is free. The first failing download cancels
+           all others and its error is raised (with an error-handler, the
+           batch goes on instead).
+
+           Args:
+               pairs (iterable(Tuple(str, str))): url / target-filename pairs
+                   (optionally followed by the line-number of the URL).
+               on_error (callable, optional): called as
+                   on_error(error, line_number, url) for downloads failing
+                   for good (default: raise).
+
+           Raises:
+               DownloaderDownloadError: If any download/saving fails (without
+                                        error-handler).
+
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._download_all(pairs, on_error))
+        finally:
+            loop.close()
+
+    async def _download_all(self, pairs, on_error):
+        """Coroutine behind download_many.
+
+        """
+        global_slots = asyncio.Semaphore(self.settings['MAX_CONNECTIONS'])
+        host_slots = {}
+        tasks = set()
+
+        try:
+            for pair in pairs:
+                url, target_filename, _, line_number = _get_item(pair)
+                while len(tasks) >= self.settings['LOOKAHEAD']:
+                    # Downloads waiting for their host hold no slot: limit
+                    # the URLs read ahead
+                    await asyncio.wait(tasks,
+                                       return_when=asyncio.FIRST_COMPLETED)
+                    self._raise_first_error(tasks)
+                await global_slots.acquire()
+                self._raise_first_error(tasks)
+
+                host = urlsplit(url).netloc
+                if host not in host_slots:
+                    host_slots[host] = asyncio.Semaphore(
+                        self.settings['MAX_CONNECTIONS_PER_HOST'])
+
+                task = asyncio.ensure_future(self._download_slot(
+                    url, target_filename, host_slots[host], global_slots,
+                    line_number, on_error))
+                tasks.add(task)
+
+            while tasks:
+                await asyncio.wait(tasks,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                self._raise_first_error(tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    @staticmethod
+    def _raise_first_error(tasks):
+        """Drop finished tasks from tasks and raise the first error found.
+
+           Args:
+               tasks (set(asyncio.Task)): started downloads (modified).
+
+           Raises:
+               DownloaderDownloadError: If a finished download failed.
+
+        """
+        for task in [task for task in tasks if task.done()]:
+            tasks.discard(task)
+            task.result()
+
+    async def _download_slot(self, url, target_filename, host_slot,
+                             global_slot, line_number=None, on_error=None):
+        """Download while holding a host-slot; frees the global-slot after.
+
+           Failed downloads are retried after their backoff (waiting without
+           holding any slot); so are downloads for a host with open
+           circuit-breaker or at its rate-limit (token reserved meanwhile).
+           The breaker is asked for a probe only once the token is due.
+
+        """
+        host = urlsplit(url).netloc
+        attempt = 0
+        holding = True
+        reserved = False  # token of the rate-limiter reserved already
+        try:
+            while True:
+                # No token is reserved while the breaker is open
+                wait_time = self.breaker.wait_time(host, probe=False)
+                if not wait_time and not reserved:
+                    wait_time = self.rate_limiter.reserve(host)
+                    reserved = True
+                if not wait_time:
+                    wait_time = self.breaker.wait_time(host)
+                if not wait_time:
+                    reserved = False
+                    try:
+                        async with host_slot:
+                            await self._download(url, target_filename)
+                    except DownloaderDownloadError as e:
+                        wait_time = self._get_retry_delay(url, attempt, e)
+                        if wait_time is None:
+                            if on_error is None:
+                                raise
+                            on_error(e, line_number, url)
+                            return
+                        attempt += 1
+                    else:
+                        self.breaker.success(host)
+                        return
+
+                global_slot.release()
+                holding = False
+                await asyncio.sleep(wait_time)
+                await global_slot.acquire()
+                holding = True
+        finally:
+            if holding:
+                global_slot.release()
+
+    async def _download(self, url, target_filename):
+        """Download single file from URL and save to target-filename.
+
+           Raises:
+               DownloaderDownloadError: If download/saving fails.
+
+        """
+        joined_out_path = join(self.out_path, target_filename)
+
+        if self._skip_done(url, target_filename, joined_out_path):
+            return
+
+        if self.verbose:
+            print('Download "{}" -> "{}"'.format(url, joined_out_path))
+
+        start = self._started()
+        try:
+            await self._fetch(url, target_filename, joined_out_path)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            raise DownloaderDownloadError(
+                '\n\nCould not retrieve / download url "{}" -> "{}"'
+                .format(url, joined_out_path))
+        finally:
+            self._ended(start)
+
+        if self.index is not None:
+            self.index.add(target_filename)
+
+        if self.verbose:
+            print('...success')
+
+    async def _fetch(self, url, target_filename, joined_out_path):
+        """Send GET over a fresh connection (following redirects) and store
+           the response-body in the part-file (skipped if unchanged since the
+           last download).
+
+           Raises:
+               OSError: On network or filesystem problems.
+               ValueError: On unexpected status or malformed responses.
+
+        """
+        conditional = self._get_conditional_headers(url, target_filename,
+                                                    joined_out_path)
+        part_path = joined_out_path + PART_SUFFIX
+
+        parts = urlsplit(url)
+        redirects = 0
+        while True:
+            reader, writer, status, headers = await self._request(
+                parts, conditional)
+            target = _get_redirect(parts, status, headers.get('location'))
+            if target is None:
+                break
+            writer.close()  # Connection: close, body not needed
+            redirects += 1
+            if redirects > MAX_REDIRECTS:
+                raise DownloaderHTTPError('Too many redirects', status)
+            parts = target
+
+        try:
+            if status == 304 and conditional:
+                return  # Unchanged since the last download: keep file
+            if status != 200:
+                raise DownloaderHTTPError(
+                    'HTTP status {}'.format(status), status,
+                    parse_retry_after(headers.get('retry-after')))
+
+            coding = headers.get('content-encoding')
+            decoder = self._get_decoder(coding)
+            length = headers.get('content-length')
+            size = int(length) if length and decoder is None else None
+            preallocate = self._should_preallocate(0, size)
+            self._record(url, target_filename, 'partial', headers, size,
+                         is_identity(coding) and not preallocate)
+
+            checksum = self._new_checksum(part_path, 0)
+            start = time.perf_counter()
+            with open(part_path, 'wb') as f:
+                if preallocate:
+                    self._preallocate(f, 0, size)
+                if decoder is None:
+                    await self._read_body(reader, headers, f, checksum)
+                    received = f.tell()
+                else:
+                    sink = DecodingWriter(f, decoder, checksum)
+                    await self._read_body(reader, headers, sink, None)
+                    sink.close()
+                    received = sink.received
+                self._record_body(start, received)
+        finally:
+            writer.close()
+
+        self._finish(url, target_filename, joined_out_path, part_path,
+                     headers, checksum)
+
+    async def _request(self, parts, conditional):
+        """Open a connection, send GET and read the response-head.
+
+           Args:
+               parts (urllib.parse.SplitResult): parsed URL.
+               conditional (dict): conditional headers to send.
+
+           Returns:
+               Tuple(asyncio.StreamReader, asyncio.StreamWriter, int, dict):
+                   streams (to be closed by the caller), status-code,
+                   headers (lower-case names).
+
+           Raises:
+               OSError: On network problems.
+               ValueError: On unsupported scheme or malformed responses.
+
+        """
+        if parts.scheme == 'https':
+            ssl_context = ssl.create_default_context()
+            port = parts.port or 443
+        elif parts.scheme == 'http':
+            ssl_context = None
+            port = parts.port or 80
+        else:
+            raise ValueError('Unsupported scheme "{}"'.format(parts.scheme))
+
+        reader, writer = await self._open_connection(parts.hostname, port,
+                                                     ssl_context)
+        try:
+            path = parts.path + ('?' + parts.query if parts.query else '')
+            request = ('GET {} HTTP/1.1\r\n'
+                       'Host: {}\r\n'
+                       'Accept-Encoding: {}\r\n'
+                       'Connection: close\r\n'
+                       .format(path or '/', parts.netloc.rpartition('@')[2],
+                               get_accept_encoding(
+                                   self.settings['COMPRESSION'])))
+            for name, value in conditional.items():
+                request += '{}: {}\r\n'.format(name, value)
+            start = time.perf_counter()
+            writer.write((request + '\r\n').encode('latin-1'))
+            await self._timed(writer.drain())
+
+            status, headers = await self._read_head(reader)
+            if self.metrics is not None:
+                self.metrics.observe('ttfb_seconds',
+                                     time.perf_counter() - start)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer, status, headers
+
+    async def _open_connection(self, host, port, ssl_context):
+        """Open a connection (timed), resolving host through the DNS-cache
+           (if any): cached addresses are used directly, others resolved in
+           a thread. Each address is given TIMEOUT seconds (connect and
+           TLS-handshake). If no address is reachable, they are dropped from
+           the cache.
+
+           Returns:
+               Tuple(asyncio.StreamReader, asyncio.StreamWriter): streams.
+
+        """
+        start = time.perf_counter()
+        if self.dns is None:
+            addresses = [(None, None, None, None, (host, port))]
+            server_hostname = None
+        else:
+            addresses = self.dns.lookup(host, port)
+            if addresses is None:
+                addresses = await asyncio.get_event_loop().run_in_executor(
+                    None, self.dns.resolve, host, port)
+            server_hostname = host if ssl_context is not None else None
+            resolved = time.perf_counter()
+            if self.metrics is not None:
+                self.metrics.observe('dns_seconds', resolved - start)
+            start = resolved
+
+        error = None
+        for family, type_, proto, _, address in addresses:
+            if family is None:
+                sock = None
+            else:
+                # Connect to the full address (IPv6 flow-info and scope-id
+                # kept)
+                sock = socket.socket(family, type_, proto)
+                sock.setblocking(False)
+            try:
+                if sock is None:
+                    streams = await self._timed(asyncio.open_connection(
+                        address[0], address[1], ssl=ssl_context))
+                else:
+                    await self._timed(asyncio.get_event_loop().sock_connect(
+                        sock, address))
+                    streams = await self._timed(asyncio.open_connection(
+                        sock=sock, ssl=ssl_context,
+                        server_hostname=server_hostname))
+                break
+            except BaseException as e:
+                if sock is not None:
+                    sock.close()
+                if not isinstance(e, (OSError, asyncio.TimeoutError)):
+                    raise
+                error = e
+        else:
+            if self.dns is not None:
+                self.dns.invalidate(host, port)
+            raise error
+
+        if self.metrics is not None:
+            self.metrics.observe('connect_seconds',
+                                 time.perf_counter() - start)
+        return streams
+
+    def _timed(self, awaitable):
+        """Limit a single network-operation to TIMEOUT seconds.
+
+           Returns:
+               awaitable: raising asyncio.TimeoutError (retryable) when
+                   TIMEOUT is exceeded.
+
+        """
+        return asyncio.wait_for(awaitable, self.settings['TIMEOUT'])
+
+    async def _read_head(self, reader):
+        """Read status-line and headers of a response.
+
+           Returns:
+               Tuple(int, dict): status-code, headers (lower-case names).
+
+        """
+        status_line = (await self._timed(reader.readline())).decode(
+            'latin-1').split()
+        if len(status_line) < 2 or not status_line[0].startswith('HTTP/'):
+            raise ValueError('Malformed status-line')
+
+        headers = {}
+        while True:
+            line = (await self._timed(reader.readline())).decode(
+                'latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        return int(status_line[1]), headers
+
+    async def _read_body(self, reader, headers, f, checksum):
+        """Copy response-body (chunked, sized or until EOF) into f (and
+           checksum if not None).
+
+        """
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size_line = await self._timed(reader.readline())
+                size = int(size_line.split(b';')[0].strip(), 16)
+                if size == 0:
+                    break
+                await self._copy(reader, f, checksum, size)
+                # CRLF after each chunk
+                await self._timed(reader.readexactly(2))
+        elif 'content-length' in headers:
+            await self._copy(reader, f, checksum,
+                             int(headers['content-length']))
+        else:
+            while True:
+                data = await self._timed(
+                    reader.read(self.settings['CHUNK_SIZE']))
+                if not data:
+                    break
+                f.write(data)
+                if checksum is not None:
+                    checksum.update(data)
+
+    async def _copy(self, reader, f, checksum, size):
+        """Copy exactly size bytes from reader into f (and checksum if not
+           None).
+
+        """
+        while size > 0:
+            data = await self._timed(reader.readexactly(
+                min(size, self.settings['CHUNK_SIZE'])))
+            f.write(data)
+            if checksum is not None:
+                checksum.update(data)
+            size -= len(data)
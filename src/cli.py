@@ -2,9 +2,46 @@
 This module is responsible for CLI argument parsing.
 """
 import argparse
+from collections import namedtuple
 from src.exceptions import CLIParseError, UtilsFileDoesNotExistError
+from src.metrics import METRICS_FORMATS
+from src.output_index import COLLISION_POLICIES
 from src.utils import assert_file_existing
 
+# Result of CLI.parse; jobs / on_collision are None if not given on the
+# commandline
+CLIArgs = namedtuple('CLIArgs', ['filename', 'verbose', 'jobs',
+                                 'validate_first', 'strict_filenames',
+                                 'on_collision', 'resume', 'refresh',
+                                 'shards', 'keep_going', 'failure_report',
+                                 'stats', 'metrics', 'metrics_format',
+                                 'daemon'])
+
+
+def _positive_int(value):
+    """Argparse-type for strictly positive integers.
+
+       Args:
+           value (str): raw argument.
+
+       Returns:
+           int: parsed value.
+
+       Raises:
+           argparse.ArgumentTypeError: if value is not a positive integer.
+
+    """
+    try:
+        parsed = int(value)
+    except ValueError:
+        parsed = 0
+
+    if parsed < 1:
+        raise argparse.ArgumentTypeError(
+            '"{}" is not a positive integer'.format(value))
+
+    return parsed
+
 
 class CLI():
     """Use python's argparse to validate and prepare arguments.
@@ -19,11 +56,76 @@ class CLI():
         """
         self.parser = argparse.ArgumentParser(
             description='Downloads images specified in txt-file')
-        self.parser.add_argument('-i', dest='filename', required=True,
-                                 help='Path to input file', metavar='FILE',
-                                 type=lambda x: assert_file_existing(x))
+        source = self.parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('-i', dest='filename', default=None,
+                            help='Path to input file', metavar='FILE',
+                            type=lambda x: assert_file_existing(x))
+        source.add_argument('--daemon', dest='daemon', metavar='SOCKET',
+                            default=None,
+                            help=('Keep running and download URL-batches '
+                                  'submitted as JSON-lines over the '
+                                  'Unix-socket SOCKET ("-": stdin, results '
+                                  'on stdout) instead of an input file'))
         self.parser.add_argument('-v', dest='verbose', help='Verbose mode',
                                  action='store_true')
+        self.parser.add_argument('-j', '--jobs', dest='jobs', metavar='N',
+                                 type=_positive_int, default=None,
+                                 help=('Number of parallel downloads '
+                                       '(overrides WORKERS in config.ini; '
+                                       'with ENGINE=async MAX_CONNECTIONS)'))
+        self.parser.add_argument('--validate-first', dest='validate_first',
+                                 action='store_true',
+                                 help=('Check all URLs before the first '
+                                       'download (default: check while '
+                                       'downloading)'))
+        self.parser.add_argument('--strict-filenames',
+                                 dest='strict_filenames', action='store_true',
+                                 help=('Check each filename by creating a '
+                                       'probe-file in the output-directory '
+                                       '(default: check in memory)'))
+        self.parser.add_argument('--on-collision', dest='on_collision',
+                                 choices=COLLISION_POLICIES, default=None,
+                                 help=('What to do if a filename exists '
+                                       'or is used twice (overrides '
+                                       'ON_COLLISION in config.ini)'))
+        self.parser.add_argument('--resume', dest='resume',
+                                 action='store_true',
+                                 help=('Continue an interrupted run: skip '
+                                       'completed files, continue partial '
+                                       'ones'))
+        self.parser.add_argument('--refresh', dest='refresh',
+                                 action='store_true',
+                                 help=('Re-download files of previous runs '
+                                       'only if changed (needs '
+                                       'METADATA_STORE in config.ini)'))
+        self.parser.add_argument('--shards', dest='shards', metavar='N',
+                                 type=_positive_int, default=1,
+                                 help=('Split the input-file into N parts '
+                                       'processed by one process each '
+                                       '(default: 1)'))
+        self.parser.add_argument('--keep-going', dest='keep_going',
+                                 action='store_true',
+                                 help=('Skip invalid lines and failed '
+                                       'downloads instead of stopping; '
+                                       'failures are written to the '
+                                       'failure-report'))
+        self.parser.add_argument('--failure-report', dest='failure_report',
+                                 metavar='FILE', default='failures.jsonl',
+                                 help=('JSONL-file listing failures of '
+                                       '--keep-going (default: '
+                                       'failures.jsonl)'))
+        self.parser.add_argument('--stats', dest='stats',
+                                 action='store_true',
+                                 help=('Print timings (per stage, with '
+                                       'percentiles) and throughput at the '
+                                       'end of the run'))
+        self.parser.add_argument('--metrics', dest='metrics', metavar='FILE',
+                                 default=None,
+                                 help=('Write timings and counters of the '
+                                       'run to FILE'))
+        self.parser.add_argument('--metrics-format', dest='metrics_format',
+                                 choices=METRICS_FORMATS, default='json',
+                                 help='Format of --metrics (default: json)')
 
     def parse(self, args):
         """Parse arguments.
@@ -32,7 +134,21 @@ class CLI():
                args (str): CLI arguments.
 
            Returns:
-               Tuple(str, bool): input-filename, verbose (default: False)
+               CLIArgs: input-filename (None with daemon),
+                        verbose (default: False),
+                        jobs (default: None),
+                        validate_first (default: False),
+                        strict_filenames (default: False),
+                        on_collision (default: None),
+                        resume (default: False),
+                        refresh (default: False),
+                        shards (default: 1),
+                        keep_going (default: False),
+                        failure_report (default: "failures.jsonl"),
+                        stats (default: False),
+                        metrics (default: None),
+                        metrics_format (default: "json"),
+                        daemon (default: None).
 
            Raises:
                UtilsFileDoesNotExistError: if input-file does not exist.
@@ -46,4 +162,16 @@ class CLI():
         except SystemExit as e:
             raise CLIParseError("The commandline given was invalid")
 
-        return parsed_args.filename, parsed_args.verbose
+        if parsed_args.daemon is not None and (parsed_args.shards > 1 or
+                                               parsed_args.resume):
+            raise CLIParseError("--daemon can not be combined with --shards "
+                                "or --resume")
+
+        return CLIArgs(parsed_args.filename, parsed_args.verbose,
+                       parsed_args.jobs, parsed_args.validate_first,
+                       parsed_args.strict_filenames,
+                       parsed_args.on_collision, parsed_args.resume,
+                       parsed_args.refresh, parsed_args.shards,
+                       parsed_args.keep_going, parsed_args.failure_report,
+                       parsed_args.stats, parsed_args.metrics,
+                       parsed_args.metrics_format, parsed_args.daemon)
@@ -0,0 +1,184 @@
+"""
+This module provides compressed transfer (Content-Encoding) of downloads.
+"""
+
+import zlib
+
+# Optional module brotli ("br" is only offered if installed); looked up on
+# first use, as a failing import costs startup-time
+_brotli = None
+
+# Modes of setting COMPRESSION:
+# - off: request the file as-is ("Accept-Encoding: identity")
+# - decode: offer gzip / deflate (/ br), decode while writing the file
+# - keep: offer gzip / deflate (/ br), write the file as received
+COMPRESSION_MODES = ('off', 'decode', 'keep')
+
+
+def get_accept_encoding(mode):
+    """Accept-Encoding header-value for a compression-mode.
+
+       Args:
+           mode (str): one of COMPRESSION_MODES.
+
+       Returns:
+           str: header-value.
+
+    """
+    if mode == 'off':
+        return 'identity'
+    if _get_brotli() is not None:
+        return 'gzip, deflate, br'
+    return 'gzip, deflate'
+
+
+def is_identity(content_encoding):
+    """Check if a Content-Encoding header-value means "not encoded".
+
+       Args:
+           content_encoding (str): header-value or None.
+
+       Returns:
+           Bool: True (Yes) / False (No).
+
+    """
+    return (content_encoding or 'identity').strip().lower() == 'identity'
+
+
+def get_decoder(content_encoding):
+    """Decoder of a Content-Encoding.
+
+       Args:
+           content_encoding (str): header-value (single coding).
+
+       Returns:
+           Decoder with decompress(data) / flush() / eof or None for
+           identity.
+
+       Raises:
+           ValueError: If the coding is not supported.
+
+    """
+    coding = (content_encoding or 'identity').strip().lower()
+    if coding == 'identity':
+        return None
+    if coding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if coding == 'deflate':
+        return _DeflateDecoder()
+    if coding == 'br' and _get_brotli() is not None:
+        return _BrotliDecoder()
+    raise ValueError('Unsupported Content-Encoding "{}"'
+                     .format(content_encoding))
+
+
+def _get_brotli():
+    """Module brotli (imported on first call).
+
+       Returns:
+           module: brotli or None if not installed.
+
+    """
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+        except ImportError:
+            brotli = False
+        _brotli = brotli
+    return _brotli or None
+
+
+class _DeflateDecoder():
+    """Decoder of "deflate": zlib-wrapped as specified, raw deflate as sent
+       by some servers.
+
+    """
+    def __init__(self):
+        self._decoder = zlib.decompressobj()
+        self._first = True
+
+    @property
+    def eof(self):
+        return self._decoder.eof
+
+    def decompress(self, data):
+        if self._first:
+            self._first = False
+            try:
+                return self._decoder.decompress(data)
+            except zlib.error:
+                self._decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._decoder.decompress(data)
+
+    def flush(self):
+        return self._decoder.flush()
+
+
+class _BrotliDecoder():
+    """Decoder of "br" (needs module brotli).
+
+    """
+    def __init__(self):
+        self._decoder = _get_brotli().Decompressor()
+
+    @property
+    def eof(self):
+        return self._decoder.is_finished()
+
+    def decompress(self, data):
+        return self._decoder.process(bytes(data))
+
+    def flush(self):
+        return b''
+
+
+class DecodingWriter():
+    """File-like wrapper decoding everything written before writing it to the
+       file (and adding it to the checksum).
+
+    Expected usage: write per chunk received; close at the end (the file
+    itself is not closed).
+
+    """
+    def __init__(self, f, decoder, checksum=None):
+        """Init with file, decoder and (optional) checksum.
+
+           Args:
+               f: file opened for binary writing.
+               decoder: as returned by get_decoder.
+               checksum (hashlib.sha256, optional): checksum of the decoded
+                                                    content.
+
+           Attributes:
+               received (int): bytes written (encoded) so far.
+
+        """
+        self.received = 0
+        self._f = f
+        self._decoder = decoder
+        self._checksum = checksum
+
+    def write(self, data):
+        """Decode data and write the result.
+
+        """
+        self.received += len(data)
+        self._write(self._decoder.decompress(data))
+
+    def close(self):
+        """Write the rest of the decoded content.
+
+           Raises:
+               ValueError: If the encoded content was incomplete.
+
+        """
+        self._write(self._decoder.flush())
+        if not self._decoder.eof:
+            raise ValueError('Incomplete encoded content')
+
+    def _write(self, data):
+        if data:
+            self._f.write(data)
+            if self._checksum is not None:
+                self._checksum.update(data)
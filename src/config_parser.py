@@ -2,12 +2,114 @@
 This module provides parsing-capabilities used to grab infos from "config.ini".
 """
 
-import configparser
+import os
 from src.exceptions import (ConfigParserParseError,
                             ConfigParserParseErrorSection,
                             ConfigParserParseErrorKey)
+from src.compression import COMPRESSION_MODES
+from src.object_store import LINK_MODES
+from src.output_index import COLLISION_POLICIES
 from src.utils import assert_file_existing
 
+# Optional "download" section: key -> default (the default's type is the
+# type the value is parsed as)
+DOWNLOAD_DEFAULTS = {
+    'WORKERS': 1,
+    'ENGINE': 'thread',
+    'TIMEOUT': 30.0,
+    'MAX_CONNECTIONS': 100,
+    'MAX_CONNECTIONS_PER_HOST': 8,
+    'POOL_MAX_SIZE': 8,
+    'POOL_IDLE_TIMEOUT': 30.0,
+    'PIPELINE': 1,
+    'CHUNK_SIZE': 1024 * 1024,
+    'PREALLOCATE': False,
+    'SEGMENTS': 1,
+    'SEGMENT_THRESHOLD': 64 * 1024 * 1024,
+    'RETRIES': 3,
+    'BACKOFF': 1.0,
+    'BACKOFF_MAX': 60.0,
+    'BREAKER_THRESHOLD': 5,
+    'BREAKER_COOLDOWN': 30.0,
+    'RATE_LIMIT': 0.0,
+    'RATE_BURST': 1,
+    'LOOKAHEAD': 1000,
+    'COMPRESSION': 'off',
+    'DNS_TTL': 300.0,
+}
+
+# Keys of DOWNLOAD_DEFAULTS with a fixed set of allowed values
+DOWNLOAD_CHOICES = {
+    'ENGINE': ('thread', 'async'),
+    'COMPRESSION': COMPRESSION_MODES,
+}
+
+# Keys of DOWNLOAD_DEFAULTS with a lower bound: key -> minimum
+DOWNLOAD_MINIMUMS = {
+    'MAX_CONNECTIONS': 1,
+    'MAX_CONNECTIONS_PER_HOST': 1,
+    'PIPELINE': 1,
+    'CHUNK_SIZE': 1,
+    'SEGMENTS': 1,
+    'RETRIES': 0,
+    'RATE_BURST': 1,
+    'LOOKAHEAD': 1,
+}
+
+# Optional keys of the "output" section (next to mandatory TARGET_DIR)
+OUTPUT_DEFAULTS = {
+    'ON_COLLISION': 'fail',
+    'METADATA_STORE': '',
+    'CONTENT_ADDRESSED': 'off',
+}
+
+OUTPUT_CHOICES = {
+    'ON_COLLISION': COLLISION_POLICIES,
+    'CONTENT_ADDRESSED': ('off',) + LINK_MODES,
+}
+
+
+# Parsed config-files: absolute path -> ((mtime, size), config)
+_CONFIG_CACHE = {}
+
+
+def _load_config(fp):
+    """Read and parse an ini-file.
+
+       The parsed config is cached per path until the file's mtime or size
+       changes: a run reads several sections, a long-running process (daemon)
+       many runs.
+
+       Args:
+           fp (str): Path to config-file.
+
+       Returns:
+           configparser.ConfigParser: parsed config (not to be modified).
+
+       Raises:
+           ConfigParserParseError: When path is valid, but parsing fails.
+
+    """
+    assert_file_existing(fp)
+
+    st = os.stat(fp)
+    key, stamp = os.path.abspath(fp), (st.st_mtime_ns, st.st_size)
+    cached = _CONFIG_CACHE.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    import configparser  # only needed on a cache-miss
+
+    try:
+        config = configparser.ConfigParser()
+        config.read(fp)
+    except Exception as e:
+        raise ConfigParserParseError(
+            'Parsing of config from "{}" failed'.format(fp))
+
+    _CONFIG_CACHE[key] = (stamp, config)
+    return config
+
 
 def read_config(fp='config.ini'):
     """Read "config.ini" to prepare configuration.
@@ -27,14 +129,7 @@ def read_config(fp='config.ini'):
                necessary key within a sections is missing.
 
     """
-    assert_file_existing(fp)
-
-    try:
-        config = configparser.ConfigParser()
-        config.read(fp)
-    except Exception as e:
-        raise ConfigParserParseError(
-            'Parsing of config from "{}" failed'.format(fp))
+    config = _load_config(fp)
 
     # Explicit checkes for current "config.ini" specification:
     # "output" section with "TARGET_DIR" key
@@ -47,3 +142,96 @@ def read_config(fp='config.ini'):
             'Parsing of config from "{}" failed'.format(fp))
 
     return config['output']['TARGET_DIR']
+
+
+def read_download_config(fp='config.ini'):
+    """Read the optional "download" section of "config.ini".
+
+       Missing section or keys fall back to ``DOWNLOAD_DEFAULTS``.
+
+       Args:
+           fp (str): Path to config-file (default: "config.ini" in base-dir).
+
+       Returns:
+           dict: key -> typed value for every key in ``DOWNLOAD_DEFAULTS``.
+
+       Raises:
+           ConfigParserParseError: When parsing fails or a value has the
+               wrong type / is not one of DOWNLOAD_CHOICES / is below its
+               DOWNLOAD_MINIMUMS.
+
+    """
+    config = _load_config(fp)
+    settings = _read_typed_section(config, 'download', DOWNLOAD_DEFAULTS,
+                                   DOWNLOAD_CHOICES, fp)
+    for key, minimum in DOWNLOAD_MINIMUMS.items():
+        if settings[key] < minimum:
+            raise ConfigParserParseError(
+                'Parsing of config from "{}" failed: "{}" must be at least '
+                '{}'.format(fp, key, minimum))
+    return settings
+
+
+def read_output_config(fp='config.ini'):
+    """Read the optional keys of the "output" section of "config.ini".
+
+       Missing keys fall back to ``OUTPUT_DEFAULTS``.
+
+       Args:
+           fp (str): Path to config-file (default: "config.ini" in base-dir).
+
+       Returns:
+           dict: key -> typed value for every key in ``OUTPUT_DEFAULTS``.
+
+       Raises:
+           ConfigParserParseError: When parsing fails or a value has the
+               wrong type / is not one of OUTPUT_CHOICES.
+
+    """
+    config = _load_config(fp)
+    return _read_typed_section(config, 'output', OUTPUT_DEFAULTS,
+                               OUTPUT_CHOICES, fp)
+
+
+def _read_typed_section(config, section, defaults, choices, fp):
+    """Grab all keys of defaults from section, converted to the default's type.
+
+       Args:
+           config (configparser.ConfigParser): parsed config.
+           section (str): section-name (may be missing in config).
+           defaults (dict): key -> default value.
+           choices (dict): key -> allowed values (for some keys).
+           fp (str): Path to config-file (used for error-messages).
+
+       Returns:
+           dict: key -> typed value.
+
+       Raises:
+           ConfigParserParseError: When a value can not be converted or is
+                                   not allowed.
+
+    """
+    settings = dict(defaults)
+    if section not in config:
+        return settings
+
+    getters = {bool: config.getboolean, int: config.getint,
+               float: config.getfloat, str: config.get}
+
+    for key, default in defaults.items():
+        if key not in config[section]:
+            continue
+        try:
+            settings[key] = getters[type(default)](section, key)
+        except ValueError:
+            raise ConfigParserParseError(
+                'Parsing of config from "{}" failed: invalid value for "{}"'
+                .format(fp, key))
+
+    for key, allowed in choices.items():
+        if settings[key] not in allowed:
+            raise ConfigParserParseError(
+                'Parsing of config from "{}" failed: "{}" must be one of {}'
+                .format(fp, key, ', '.join(allowed)))
+
+    return settings
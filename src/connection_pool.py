@@ -0,0 +1,238 @@
+"""
+This module provides a pool of persistent (keep-alive) HTTP-connections.
+"""
+
+import http.client
+import socket
+import ssl
+import threading
+import time
+
+
+class ConnectionPool():
+    """This class keeps idle HTTP(S)-connections per host for later reuse.
+
+    Connections are taken out of the pool while in use (one user at a time)
+    and given back after the response was read completely. Idle connections
+    are dropped after idle_timeout seconds; at most max_size idle connections
+    are kept per host.
+
+    With a DNS-cache, new connections resolve their host through it (shared
+    by all connections). With metrics, new connections record the time of
+    name-resolution, TCP-connect and TLS-handshake ("dns_seconds",
+    "connect_seconds", "tls_seconds").
+
+    Thread-safe. Expected usage: init once; get / put per request; close_all
+    at the end.
+
+    """
+    def __init__(self, max_size=8, idle_timeout=30.0, timeout=30.0,
+                 metrics=None, dns=None):
+        """Init with pool-limits, network-timeout and (optional) metrics and
+           DNS-cache.
+
+           Args:
+               max_size (int, optional): idle connections kept per host.
+               idle_timeout (float, optional): seconds an idle connection is
+                                               considered reusable.
+               timeout (float, optional): socket-timeout of new connections.
+               metrics (Metrics, optional): metrics of the run.
+               dns (DNSCache, optional): cache of name-resolutions.
+
+           Attributes:
+               max_size (int): idle connections kept per host.
+               idle_timeout (float): seconds an idle connection is reusable.
+               timeout (float): socket-timeout of new connections.
+               metrics (Metrics): metrics of the run or None.
+               dns (DNSCache): cache of name-resolutions or None.
+
+        """
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.metrics = metrics
+        self.dns = dns
+        self._idle = {}  # key -> list of (connection, time of last use)
+        self._lock = threading.Lock()
+        self._ssl_context = None
+
+    @staticmethod
+    def get_key(urlsplit_res):
+        """Pool-key of a parsed URL.
+
+           Args:
+               urlsplit_res (urllib.parse.SplitResult): parsed URL.
+
+           Returns:
+               Tuple(str, str, int): scheme, host, port.
+
+           Raises:
+               ValueError: If scheme is not http / https.
+
+        """
+        scheme = urlsplit_res.scheme
+        if scheme not in ('http', 'https'):
+            raise ValueError('Unsupported scheme "{}"'.format(scheme))
+
+        port = urlsplit_res.port or (443 if scheme == 'https' else 80)
+        return scheme, urlsplit_res.hostname, port
+
+    def get(self, key):
+        """Get an idle connection for key or a new one.
+
+           Args:
+               key (Tuple(str, str, int)): as returned by get_key.
+
+           Returns:
+               Tuple(http.client.HTTPConnection, bool): connection, reused.
+
+        """
+        now = time.monotonic()
+        expired = []
+        conn = None
+
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate, last_used = idle.pop()
+                if now - last_used <= self.idle_timeout:
+                    conn = candidate
+                    break
+                expired.append(candidate)
+
+        for candidate in expired:
+            candidate.close()
+
+        if conn is not None:
+            return conn, True
+
+        return self.new(key), False
+
+    def new(self, key):
+        """Create a new (not yet connected) connection for key.
+
+           Args:
+               key (Tuple(str, str, int)): as returned by get_key.
+
+           Returns:
+               http.client.HTTPConnection: connection.
+
+        """
+        scheme, host, port = key
+        custom = self.metrics is not None or self.dns is not None
+        if scheme == 'https':
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            if custom:
+                return _HTTPSConnection(self.metrics, self.dns, host, port,
+                                        timeout=self.timeout,
+                                        context=self._ssl_context)
+            return http.client.HTTPSConnection(host, port,
+                                               timeout=self.timeout,
+                                               context=self._ssl_context)
+
+        if custom:
+            return _HTTPConnection(self.metrics, self.dns, host, port,
+                                   timeout=self.timeout)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def put(self, key, conn):
+        """Give back a connection (response fully read) for later reuse.
+
+           Args:
+               key (Tuple(str, str, int)): as returned by get_key.
+               conn (http.client.HTTPConnection): connection.
+
+        """
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_size:
+                idle.append((conn, time.monotonic()))
+                return
+
+        conn.close()
+
+    def close_all(self):
+        """Close all idle connections.
+
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+
+        for connections in idle.values():
+            for conn, _ in connections:
+                conn.close()
+
+
+class _HTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection resolving through a DNS-cache (if given) and recording
+       the time of name-resolution and TCP-connect (with metrics).
+
+    """
+    def __init__(self, metrics, dns, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics
+        self.dns = dns
+
+    def connect(self):
+        """Resolve host (timed), then connect to the first address reachable
+           (timed). If none is, cached addresses are dropped.
+
+        """
+        start = time.perf_counter()
+        if self.dns is not None:
+            addresses = self.dns.resolve(self.host, self.port)
+        else:
+            addresses = socket.getaddrinfo(self.host, self.port, 0,
+                                           socket.SOCK_STREAM)
+        resolved = time.perf_counter()
+        if self.metrics is not None:
+            self.metrics.observe('dns_seconds', resolved - start)
+
+        error = None
+        for family, type_, proto, _, address in addresses:
+            # Connect to the full address (IPv6 flow-info and scope-id kept)
+            sock = socket.socket(family, type_, proto)
+            try:
+                if self.timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(self.timeout)
+                if self.source_address:
+                    sock.bind(self.source_address)
+                sock.connect(address)
+            except OSError as e:
+                sock.close()
+                error = e
+                continue
+            self.sock = sock
+            break
+        else:
+            if self.dns is not None:
+                self.dns.invalidate(self.host, self.port)
+            raise error
+
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.metrics is not None:
+            self.metrics.observe('connect_seconds',
+                                 time.perf_counter() - resolved)
+
+
+class _HTTPSConnection(http.client.HTTPSConnection):
+    """HTTPSConnection as _HTTPConnection, also recording the time of the
+       TLS-handshake (with metrics).
+
+    """
+    def __init__(self, metrics, dns, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics
+        self.dns = dns
+
+    def connect(self):
+        """Connect as _HTTPConnection, then wrap the socket (timed).
+
+        """
+        _HTTPConnection.connect(self)
+        start = time.perf_counter()
+        self.sock = self._context.wrap_socket(self.sock,
+                                              server_hostname=self.host)
+        if self.metrics is not None:
+            self.metrics.observe('tls_seconds', time.perf_counter() - start)
@@ -0,0 +1,236 @@
+"""
+This module provides the daemon-mode: URL-batches submitted over a
+Unix-socket (or stdin) are downloaded by one long-lived downloader.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+from src.failure_report import get_failure_entry
+from src.input_parser import InputParser
+
+
+class DownloadDaemon():
+    """This class downloads URL-batches with one downloader kept for all of
+       them (warm keep-alive connections, config read and modules imported
+       once).
+
+    Protocol (both directions): one JSON-object per line.
+
+    - request: {"id": any (optional, echoed), "urls": [str, ...]}
+    - response: {"id": ..., "downloaded": [{"line": ..., "url": ...,
+      "filename": ...}, ...], "skipped": [line, ...], "failed":
+      [failure-entry (see failure_report.get_failure_entry), ...]} or
+      {"id": ..., "error": message} for a malformed request (or a batch
+      failing as a whole, e.g. output-directory gone)
+
+    "line" is the position of the URL within the batch (starting at 1).
+    Every batch is checked and downloaded like an input-file with
+    --keep-going: invalid URLs and failed downloads are reported in "failed"
+    and do not stop the daemon. URLs skipped (duplicate within the batch or
+    filename existing with ON_COLLISION=skip) are listed in "skipped".
+
+    Batches run one at a time (each with the downloader's parallelism);
+    batches of other connections wait meanwhile.
+
+    Thread-safe. Expected usage: init once; serve_stream or serve_unix;
+    close at the end.
+
+    """
+    def __init__(self, downloader, out_path, verbose=False, lazy=True,
+                 strict_filenames=False, index=None, metrics=None):
+        """Init with downloader, output-path (directory) and (optional)
+           input-parser options.
+
+           Args:
+               downloader (Downloader / AsyncDownloader): downloader used for
+                                                          all batches.
+               out_path (str): valid path to output-directory.
+               verbose (bool, optional): be verbose or not (default).
+               lazy (bool, optional): check URLs while downloading (default)
+                                      instead of before.
+               strict_filenames (bool, optional): see InputParser.
+               index (OutputIndex, optional): index of out_path (shared by
+                                              all batches).
+               metrics (Metrics, optional): metrics of all batches.
+
+           Attributes:
+               downloader: downloader used for all batches.
+               batches (int): batches handled so far.
+
+        """
+        self.downloader = downloader
+        self.batches = 0
+        self._out_path = out_path
+        self._verbose = verbose
+        self._lazy = lazy
+        self._strict_filenames = strict_filenames
+        self._index = index
+        self._metrics = metrics
+        self._lock = threading.Lock()
+        self._server = None
+
+    def handle(self, request):
+        """Check and download one batch.
+
+           Args:
+               request (dict): request (see class-docs).
+
+           Returns:
+               dict: response (see class-docs).
+
+        """
+        batch_id = request.get('id') if isinstance(request, dict) else None
+        urls = request.get('urls') if isinstance(request, dict) else None
+        if (not isinstance(urls, list) or
+                not all(isinstance(url, str) for url in urls)):
+            return {'id': batch_id,
+                    'error': 'Request needs "urls" (list of strings)'}
+
+        failed = []
+        started = []
+
+        def on_error(error, line_number, url):
+            failed.append(get_failure_entry(error, line_number, url))
+
+        try:
+            with self._lock:
+                self.batches += 1
+                parser = InputParser('<batch {}>'.format(self.batches),
+                                     self._out_path, self._verbose,
+                                     lazy=self._lazy,
+                                     strict_filenames=self._strict_filenames,
+                                     index=self._index, on_error=on_error,
+                                     metrics=self._metrics, urls=urls)
+                if not self._lazy:
+                    self.downloader.prefetch(parser.iter_urls())
+                pairs = parser.iter_url_targetname_pairs(line_numbers=True)
+                self.downloader.download_many(_record_pairs(pairs, started),
+                                              on_error)
+        except Exception as e:
+            return {'id': batch_id, 'error': '{}: {}'.format(
+                type(e).__name__, str(e).strip())}
+
+        failed_lines = {entry['line'] for entry in failed}
+        downloaded = [{'line': line, 'url': url, 'filename': name}
+                      for url, name, line in started
+                      if line not in failed_lines]
+        used_lines = failed_lines.union(entry['line']
+                                        for entry in downloaded)
+        return {'id': batch_id, 'downloaded': downloaded,
+                'skipped': [line for line in range(1, len(urls) + 1)
+                            if line not in used_lines],
+                'failed': sorted(failed, key=lambda entry: entry['line'])}
+
+    def serve_stream(self, rfile, wfile):
+        """Answer requests read from rfile (one per line) on wfile until
+           end of input.
+
+           Args:
+               rfile: binary file-like read line by line.
+               wfile: binary file-like written (flushed per response).
+
+        """
+        for line in rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError:
+                response = {'id': None, 'error': 'Malformed request'}
+            else:
+                response = self.handle(request)
+            wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            wfile.flush()
+
+    def serve_unix(self, path):
+        """Accept connections on a Unix-socket (each served by serve_stream
+           in its own thread) until stop is called.
+
+           A stale socket-file (no daemon listening) is replaced; the
+           socket-file is removed at the end.
+
+           Args:
+               path (str): path of the socket-file.
+
+           Raises:
+               OSError: If path is in use by another daemon, is no
+                        socket-file or can not be bound.
+
+        """
+        _remove_stale_socket(path)
+        self._server = _ThreadingUnixServer(path, _StreamHandler)
+        self._server.daemon = self
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            os.remove(path)
+
+    def stop(self):
+        """Stop serve_unix (from another thread or a signal-handler); batches
+           running are completed.
+
+        """
+        if self._server is not None:
+            threading.Thread(target=self._server.shutdown).start()
+
+    def close(self):
+        """Wait for the running batch (if any) and close the downloader.
+
+        """
+        with self._lock:
+            self.downloader.close()
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn,
+                           socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _StreamHandler(socketserver.StreamRequestHandler):
+    """Serves one connection of serve_unix.
+
+    """
+    def handle(self):
+        self.server.daemon.serve_stream(self.rfile, self.wfile)
+
+
+def _record_pairs(pairs, started):
+    """Pass url / target-filename / line-number triples on, appending each
+       to started.
+
+    """
+    for pair in pairs:
+        started.append(pair)
+        yield pair
+
+
+def _remove_stale_socket(path):
+    """Remove socket-file at path if no daemon is listening on it (any
+       other file is left alone).
+
+       Raises:
+           OSError: If a daemon is listening on path or path is no
+                    socket-file.
+
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError('"{}" exists and is no socket-file'.format(path))
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(path)
+        return
+    finally:
+        probe.close()
+    raise OSError('Socket "{}" is in use by another daemon'.format(path))
@@ -0,0 +1,150 @@
+"""
+This module provides a cache of name-resolutions shared by all downloads.
+"""
+
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+
+class DNSCache():
+    """This class keeps the addresses of resolved hosts for ttl seconds.
+
+    Concurrent lookups of the same host wait for a single getaddrinfo. Failed
+    resolutions are not cached (the next lookup tries again). getaddrinfo
+    does not report record-TTLs, so a fixed ttl is used; addresses failing
+    to connect can be dropped early with invalidate.
+
+    Thread-safe. Expected usage: init once; (prefetch the hosts of a batch;)
+    resolve per new connection.
+
+    """
+    def __init__(self, ttl=300.0):
+        """Init with (optional) time-to-live.
+
+           Args:
+               ttl (float, optional): seconds addresses are reused.
+
+           Attributes:
+               ttl (float): seconds addresses are reused.
+
+        """
+        self.ttl = ttl
+        self._entries = {}  # (host, port) -> (expiry, addresses)
+        self._pending = {}  # (host, port) -> threading.Event
+        self._lock = threading.Lock()
+
+    def lookup(self, host, port):
+        """Cached addresses of host (without resolving).
+
+           Returns:
+               List(Tuple): as returned by socket.getaddrinfo or None if not
+                            cached (or expired).
+
+        """
+        with self._lock:
+            entry = self._entries.get((host, port))
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def resolve(self, host, port):
+        """Addresses of host (cached or resolved now).
+
+           Args:
+               host (str): hostname (or address).
+               port (int): port.
+
+           Returns:
+               List(Tuple): as returned by socket.getaddrinfo (stream
+                            sockets).
+
+           Raises:
+               OSError (socket.gaierror): If resolution fails.
+
+        """
+        key = (host, port)
+        while True:
+            addresses = self.lookup(host, port)
+            if addresses is not None:
+                return addresses
+
+            with self._lock:
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = threading.Event()
+                    break
+            pending.wait()  # resolved (or failed) by another thread
+
+        try:
+            addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+            with self._lock:
+                self._entries[key] = (time.monotonic() + self.ttl, addresses)
+            return addresses
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.set()
+
+    def invalidate(self, host, port):
+        """Drop cached addresses of host (e.g. none of them was reachable).
+
+        """
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+    def prefetch(self, hosts, workers=16):
+        """Resolve hosts not cached yet in parallel; failures are ignored
+           (raised again by the download needing them).
+
+           Args:
+               hosts (iterable(Tuple(str, int))): host / port pairs.
+               workers (int, optional): resolutions at once.
+
+           Returns:
+               int: hosts resolved.
+
+        """
+        hosts = [host for host in set(hosts) if self.lookup(*host) is None]
+        if not hosts:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(hosts))) as pool:
+            return sum(pool.map(self._try_resolve, hosts))
+
+    def _try_resolve(self, host):
+        """Resolve a host / port pair.
+
+           Returns:
+               Bool: True (resolved) / False (failed).
+
+        """
+        try:
+            self.resolve(*host)
+        except OSError:
+            return False
+        return True
+
+
+def get_hosts(urls):
+    """Distinct host / port pairs of http(s)-URLs (default-port by scheme).
+
+       Args:
+           urls (iterable(str)): URLs (others than http(s) are skipped).
+
+       Returns:
+           set(Tuple(str, int)): host / port pairs.
+
+    """
+    hosts = set()
+    for url in urls:
+        try:
+            parts = urlsplit(url)
+            if parts.scheme in ('http', 'https') and parts.hostname:
+                hosts.add((parts.hostname, parts.port or
+                           (443 if parts.scheme == 'https' else 80)))
+        except ValueError:
+            continue
+    return hosts
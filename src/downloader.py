@@ -2,35 +2,464 @@
 This module does the actual downloading & file-saving.
 """
 
+import http.client
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from os.path import join
-from urllib.request import urlretrieve
-from src.exceptions import DownloaderDownloadError
+from urllib.parse import urljoin, urlsplit
+from src.compression import (get_accept_encoding, get_decoder, is_identity,
+                             DecodingWriter)
+from src.config_parser import DOWNLOAD_DEFAULTS
+from src.connection_pool import ConnectionPool
+from src.dns_cache import DNSCache, get_hosts
+from src.exceptions import DownloaderDownloadError, DownloaderHTTPError
+from src.journal import PART_SUFFIX
+from src.metrics import RATE_BUCKETS
+from src.retry import (get_retry_after, parse_retry_after, CircuitBreaker,
+                       RetryPolicy, RetryQueue)
+from src.scheduler import HostScheduler, RateLimiter
 
+# Redirects followed per download at most (as urllib)
+MAX_REDIRECTS = 10
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
 
-class Downloader():
-    """This class is responsible for actual network-activity / downloading and
-       saving.
 
-    This class "retrieves" links and store them on the HDD. This includes
-    network-activity and filesystem-activity.
+class _BaseDownloader():
+    """Shared part of Downloader and AsyncDownloader: settings, output-index
+       and journal.
+
+    Files are written to "<target-filename>.part" and renamed atomically when
+    complete. Every download is recorded in the journal (if given); with a
+    journal in resume-mode, files completed by a previous run are skipped.
+
+    With a metadata-store, completed downloads are recorded there and files
+    already present from a previous run are requested conditionally
+    (unchanged files are not downloaded again).
+
+    Retryable failures (see retry.get_retry_after) are retried up to RETRIES
+    times with backoff; hosts failing repeatedly are paused by a
+    circuit-breaker (BREAKER_THRESHOLD / BREAKER_COOLDOWN). Downloads per
+    host are limited to RATE_LIMIT per second (bursts of RATE_BURST).
+
+    With COMPRESSION decode / keep, gzip / deflate (/ br) is offered for
+    complete downloads: encoded bodies are decoded while writing (decode) or
+    written as received (keep). Encoded part-files are not continued by a
+    later run.
+
+    Name-resolutions are cached for DNS_TTL seconds and shared by all
+    downloads (0: no cache); prefetch resolves the hosts of a batch in
+    parallel up front.
+
+    With an object-store, completed files are stored by checksum and linked
+    to their target-filename (byte-identical files are kept once).
 
-    Expected usage: init once; call download multiple times.
+    Redirects (301 / 302 / 303 / 307 / 308) are followed up to MAX_REDIRECTS
+    times per download. Proxies (*_proxy environment-variables) are not
+    used: downloads connect to the hosts directly.
+
+    With metrics, every download records its timings (see Metrics): total
+    ("download_seconds"), time to first byte ("ttfb_seconds"), body
+    ("body_seconds"), its throughput ("throughput_bytes_per_second") and the
+    downloads in flight; retries and failures are counted.
 
     """
-    def __init__(self, out_path, verbose=False):
-        """Init with output-path and (optional) verbosity-flag.
+    def __init__(self, out_path, verbose=False, settings=None, index=None,
+                 journal=None, metadata=None, metrics=None, objects=None):
+        """Init with output-path and (optional) verbosity-flag, settings,
+           output-index, journal, metadata-store, metrics and object-store.
 
            Args:
                out_path (str): valid output-path.
                verbose (bool, optional): be verbose or not (default).
+               settings (dict, optional): "download"-section as returned by
+                   read_download_config (default: DOWNLOAD_DEFAULTS).
+               index (OutputIndex, optional): index of out_path; written
+                   files are added to it.
+               journal (DownloadJournal, optional): journal of out_path.
+               metadata (MetadataStore, optional): metadata of previous
+                                                   downloads.
+               metrics (Metrics, optional): metrics of the run.
+               objects (ObjectStore, optional): content-addressed storage
+                                                of out_path.
 
            Attributes:
                out_path (str): original output-path given.
                verbose (bool): be verbose or not.
+               settings (dict): "download"-settings used.
+               index (OutputIndex): index of out_path or None.
+               journal (DownloadJournal): journal of out_path or None.
+               metadata (MetadataStore): metadata-store or None.
+               metrics (Metrics): metrics of the run or None.
+               objects (ObjectStore): object-store or None.
+               retry_policy (RetryPolicy): delays of retries.
+               breaker (CircuitBreaker): per-host circuit-breaker.
+               rate_limiter (RateLimiter): per-host rate-limits.
+               dns (DNSCache): cache of name-resolutions or None.
 
         """
         self.out_path = out_path
         self.verbose = verbose
+        self.index = index
+        self.journal = journal
+        self.metadata = metadata
+        self.metrics = metrics
+        self.objects = objects
+        self.settings = dict(DOWNLOAD_DEFAULTS)
+        if settings is not None:
+            self.settings.update(settings)
+        self.retry_policy = RetryPolicy(self.settings['RETRIES'],
+                                        self.settings['BACKOFF'],
+                                        self.settings['BACKOFF_MAX'])
+        self.breaker = CircuitBreaker(self.settings['BREAKER_THRESHOLD'],
+                                      self.settings['BREAKER_COOLDOWN'])
+        self.rate_limiter = RateLimiter(self.settings['RATE_LIMIT'],
+                                        self.settings['RATE_BURST'])
+        self.dns = None
+        if self.settings['DNS_TTL'] > 0:
+            self.dns = DNSCache(self.settings['DNS_TTL'])
+
+    def close(self):
+        """Free resources kept between downloads.
+
+        """
+
+    def prefetch(self, urls):
+        """Resolve the distinct hosts of urls in parallel (into the
+           DNS-cache), so downloads do not wait for name-resolution.
+
+           Args:
+               urls (iterable(str)): URLs about to be downloaded.
+
+           Returns:
+               int: hosts resolved (0 without DNS-cache).
+
+        """
+        if self.dns is None:
+            return 0
+        return self.dns.prefetch(get_hosts(urls))
+
+    def _is_done(self, url, target_filename, joined_out_path):
+        """Check if a previous run completed this download (resume only).
+
+           Returns:
+               Bool: True (Yes) / False (No).
+
+        """
+        if self.journal is None or not self.journal.resume:
+            return False
+
+        entry = self.journal.get(target_filename)
+        if (entry is None or entry['url'] != url or
+                entry['state'] != 'done' or
+                not os.path.isfile(joined_out_path)):
+            return False
+
+        return (entry['size'] is None or
+                os.path.getsize(joined_out_path) == entry['size'])
+
+    def _get_resume_point(self, url, target_filename, part_path):
+        """Where to continue a partial download of a previous run.
+
+           Continuing needs a strong validator (ETag or Last-Modified) of the
+           previous response, sent as If-Range.
+
+           Returns:
+               Tuple(int, str): bytes already downloaded, If-Range-value or
+                                (0, None) if nothing can be continued.
+
+        """
+        if self.journal is None or not self.journal.resume:
+            return 0, None
+
+        entry = self.journal.get(target_filename)
+        if (entry is None or entry['url'] != url or
+                entry['state'] != 'partial' or
+                not entry.get('resumable', True) or
+                not os.path.isfile(part_path)):
+            return 0, None
+
+        validator = _get_validator(entry['etag'], entry['last_modified'])
+        if validator is None:
+            return 0, None
+
+        return os.path.getsize(part_path), validator
+
+    def _get_conditional_headers(self, url, target_filename, joined_out_path):
+        """Headers to request url only if changed since the last download.
+
+           Only used if the file of the last download is still present
+           unchanged (by size) under the same target-filename.
+
+           Returns:
+               dict: If-None-Match / If-Modified-Since (maybe empty).
+
+        """
+        if self.metadata is None:
+            return {}
+
+        entry = self.metadata.get(url)
+        if (entry is None or entry['file'] != target_filename or
+                not os.path.isfile(joined_out_path) or
+                os.path.getsize(joined_out_path) != entry['size']):
+            return {}
+
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def _new_checksum(self, part_path, offset):
+        """Checksum for a download (None without metadata- and
+           object-store).
+
+           Bytes already in the part-file (continued download) are included.
+
+           Returns:
+               hashlib.sha256: checksum or None.
+
+        """
+        if self.metadata is None and self.objects is None:
+            return None
+
+        import hashlib  # only needed with metadata- / object-store
+
+        checksum = hashlib.sha256()
+        if offset:
+            with open(part_path, 'rb') as f:
+                for data in iter(lambda: f.read(self.settings['CHUNK_SIZE']),
+                                 b''):
+                    checksum.update(data)
+        return checksum
+
+    def _record(self, url, target_filename, state, headers=None, size=None,
+                resumable=True):
+        """Record state of a download in the journal (if any).
+
+           Args:
+               headers (optional): response-headers (mapping with get).
+               size (int, optional): expected size in bytes.
+               resumable (bool, optional): part-file can be continued from
+                                           its size (default: True).
+
+        """
+        if self.journal is None:
+            return
+
+        etag = last_modified = None
+        if headers is not None:
+            etag = headers.get('etag')
+            last_modified = headers.get('last-modified')
+
+        self.journal.record(target_filename, url, state, etag, last_modified,
+                            size, resumable)
+
+    def _get_decoder(self, content_encoding):
+        """Decoder for a response-body (only with COMPRESSION decode).
+
+           Args:
+               content_encoding (str): Content-Encoding of the response or
+                                       None.
+
+           Returns:
+               Decoder (see compression.get_decoder) or None if the body is
+               written as received.
+
+           Raises:
+               ValueError: If the coding is not supported.
+
+        """
+        if self.settings['COMPRESSION'] != 'decode':
+            return None
+        return get_decoder(content_encoding)
+
+    def _should_preallocate(self, offset, size):
+        """Check if the part-file is to be preallocated (setting PREALLOCATE,
+           known size, supported by OS).
+
+           A preallocated part-file has its final size from the start, so it
+           can not be continued by a later run (see _record).
+
+           Returns:
+               Bool: True (Yes) / False (No).
+
+        """
+        return (self.settings['PREALLOCATE'] and size is not None and
+                size > offset and hasattr(os, 'posix_fallocate'))
+
+    @staticmethod
+    def _preallocate(f, offset, size):
+        """Reserve disk-space for bytes offset..size of f (if supported by the
+           filesystem).
+
+        """
+        try:
+            os.posix_fallocate(f.fileno(), offset, size - offset)
+        except OSError:
+            pass
+
+    def _finish(self, url, target_filename, joined_out_path, part_path,
+                headers, checksum=None):
+        """Rename completed part-file to target-filename (or store it in the
+           object-store and link it) and record it.
+
+           Args:
+               headers: response-headers (mapping with get) providing ETag /
+                        Last-Modified.
+               checksum (hashlib.sha256, optional): checksum of the file
+                   (given with metadata- or object-store).
+
+        """
+        if self.objects is not None:
+            new = self.objects.store(part_path, checksum.hexdigest(),
+                                     joined_out_path)
+            if not new and self.metrics is not None:
+                self.metrics.add('duplicate_contents_total')
+        else:
+            os.replace(part_path, joined_out_path)
+        size = os.path.getsize(joined_out_path)
+        etag = headers.get('etag')
+        last_modified = headers.get('last-modified')
+
+        if self.journal is not None:
+            self.journal.record(target_filename, url, 'done', etag,
+                                last_modified, size)
+
+        if self.metadata is not None:
+            self.metadata.record(
+                url, target_filename, etag, last_modified, size,
+                checksum.hexdigest() if checksum is not None else None)
+
+    def _get_retry_delay(self, url, attempt, error):
+        """Delay before retrying a failed download; retryable failures are
+           recorded for the circuit-breaker of the host.
+
+           Args:
+               url (str): URL of the failed download.
+               attempt (int): retries done so far.
+               error (BaseException): error raised.
+
+           Returns:
+               float: seconds or None if not to be retried.
+
+        """
+        retry_after = get_retry_after(error)
+        delay = None
+        if retry_after is not None:
+            self.breaker.failure(urlsplit(url).netloc)
+            delay = self.retry_policy.get_delay(attempt, retry_after)
+
+        if self.metrics is not None:
+            self.metrics.add('retries_total' if delay is not None
+                             else 'failures_total')
+        if delay is not None and self.verbose:
+            print('Retry "{}" in {:.1f}s'.format(url, delay))
+        return delay
+
+    def _started(self):
+        """Record a download starting (with metrics).
+
+           Returns:
+               float: start-time (time.perf_counter) or None.
+
+        """
+        if self.metrics is None:
+            return None
+
+        self.metrics.enter('in_flight')
+        return time.perf_counter()
+
+    def _ended(self, start):
+        """Record a download (started at start) ending.
+
+        """
+        if self.metrics is None:
+            return
+
+        self.metrics.leave('in_flight')
+        self.metrics.observe('download_seconds', time.perf_counter() - start)
+
+    def _record_body(self, start, size):
+        """Record a response-body of size bytes read since start.
+
+        """
+        if self.metrics is None:
+            return
+
+        elapsed = time.perf_counter() - start
+        self.metrics.observe('body_seconds', elapsed)
+        self.metrics.add('bytes_total', size)
+        self.metrics.add('downloads_total')
+        if elapsed > 0:
+            self.metrics.observe('throughput_bytes_per_second',
+                                 size / elapsed, RATE_BUCKETS)
+
+    def _skip_done(self, url, target_filename, joined_out_path):
+        """Skip a download completed by a previous run (resume only).
+
+           Returns:
+               Bool: True (skipped) / False (needs download).
+
+        """
+        if not self._is_done(url, target_filename, joined_out_path):
+            return False
+
+        if self.index is not None:
+            self.index.add(target_filename)
+
+        if self.verbose:
+            print('Skip "{}" -> "{}" (already complete)'
+                  .format(url, joined_out_path))
+
+        return True
+
+
+class Downloader(_BaseDownloader):
+    """This class is responsible for actual network-activity / downloading and
+       saving.
+
+    This class "retrieves" links and store them on the HDD. This includes
+    network-activity and filesystem-activity.
+
+    Connections are kept alive in a ConnectionPool and reused by later
+    downloads from the same host (POOL_MAX_SIZE, POOL_IDLE_TIMEOUT).
+
+    Partial downloads of a previous run (journal in resume-mode) are
+    continued with Range-requests.
+
+    With PIPELINE > 1, download_many batches up to PIPELINE downloads of a
+    host and sends their GETs at once over one connection (HTTP/1.1
+    pipelining, see download_pipelined): many small files of one host no
+    longer wait a round-trip each.
+
+    Expected usage: init once; call download (single file) or download_many
+    (whole batch) multiple times; close at the end.
+
+    """
+    def __init__(self, out_path, verbose=False, settings=None, index=None,
+                 journal=None, metadata=None, metrics=None, objects=None):
+        """Init as _BaseDownloader.
+
+           Attributes:
+               pool (ConnectionPool): persistent connections.
+
+        """
+        super().__init__(out_path, verbose, settings, index, journal,
+                         metadata, metrics, objects)
+        self.pool = ConnectionPool(self.settings['POOL_MAX_SIZE'],
+                                   self.settings['POOL_IDLE_TIMEOUT'],
+                                   self.settings['TIMEOUT'], metrics,
+                                   self.dns)
+        self._buffers = threading.local()
+
+    def close(self):
+        """Close all pooled connections.
+
+        """
+        self.pool.close_all()
 
     def download(self, url, target_filename):
         """Download single file from URL and save to target-filename.
@@ -45,16 +474,838 @@ class Downloader():
         """
         joined_out_path = join(self.out_path, target_filename)
 
+        if self._skip_done(url, target_filename, joined_out_path):
+            return
+
+        self._download(url, target_filename, joined_out_path, self._fetch,
+                       url, target_filename, joined_out_path)
+
+    def download_pipelined(self, pairs):
+        """Download url / target-filename pairs of one host with their GETs
+           pipelined on one persistent connection (HTTP/1.1).
+
+           All requests are sent at once, then the responses are read in
+           order and stored to their target-filenames. Pairs to be continued
+           (Range-request) or of another host than the first, pairs
+           redirected and pairs left unanswered (e.g. server closing the
+           connection after a response) are downloaded one by one (see
+           download) afterwards.
+
+           Args:
+               pairs (list(Tuple(str, str))): url / target-filename pairs.
+
+           Returns:
+               list: per pair None (downloaded or skipped) or
+                     DownloaderDownloadError (failed).
+
+        """
+        errors = [None] * len(pairs)
+        key = None
+        requests = []  # (index, url, target-filename, joined_out_path,
+        #                 conditional-headers, request-head)
+        single = []
+        for i, (url, target_filename) in enumerate(pairs):
+            joined_out_path = join(self.out_path, target_filename)
+            if self._skip_done(url, target_filename, joined_out_path):
+                continue
+
+            urlsplit_res = urlsplit(url)
+            try:
+                pair_key = self.pool.get_key(urlsplit_res)
+            except ValueError:
+                pair_key = None
+            key = key or pair_key
+            offset, _ = self._get_resume_point(
+                url, target_filename, joined_out_path + PART_SUFFIX)
+            if offset or pair_key is None or pair_key != key:
+                single.append(i)
+                continue
+
+            headers, conditional = self._get_request_headers(
+                url, target_filename, joined_out_path)
+            try:
+                head = _format_request(key, _get_target(urlsplit_res),
+                                       headers)
+            except ValueError:
+                single.append(i)
+                continue
+            requests.append((i, url, target_filename, joined_out_path,
+                             conditional, head))
+
+        if requests:
+            answered, redirected = self._fetch_pipelined(key, requests,
+                                                         errors)
+            single.extend(redirected)
+            single.extend(request[0] for request in requests[answered:])
+
+        for i in sorted(single):
+            try:
+                self.download(*pairs[i])
+            except DownloaderDownloadError as e:
+                errors[i] = e
+        return errors
+
+    def _download(self, url, target_filename, joined_out_path, fetch, *args):
+        """Run fetch(*args) as the download of url (timed with metrics;
+           target-filename added to the output-index when done).
+
+           Raises:
+               DownloaderDownloadError: If fetch fails.
+
+        """
         if self.verbose:
             print('Download "{}" -> "{}"'.format(url, joined_out_path))
 
+        start = self._started()
         try:
-            local_filename, headers = urlretrieve(url, joined_out_path)
+            fetch(*args)
 
         except Exception as e:
             raise DownloaderDownloadError(
                 '\n\nCould not retrieve / download url "{}" -> "{}"'
                 .format(url, joined_out_path))
+        finally:
+            self._ended(start)
+
+        if self.index is not None:
+            self.index.add(target_filename)
 
         if self.verbose:
             print('...success')
+
+    def _fetch(self, url, target_filename, joined_out_path):
+        """GET over a pooled connection and store the response-body in the
+           part-file (continued with a Range-request if possible, skipped if
+           unchanged since the last download).
+
+           Raises:
+               OSError / http.client.HTTPException: On network or filesystem
+                                                    problems.
+               ValueError: On unexpected status.
+
+        """
+        offset, if_range = self._get_resume_point(
+            url, target_filename, joined_out_path + PART_SUFFIX)
+        headers, conditional = self._get_request_headers(
+            url, target_filename, joined_out_path, offset, if_range)
+
+        key, urlsplit_res, conn, response = self._request_redirected(
+            urlsplit(url), headers)
+        try:
+            self._receive(url, target_filename, joined_out_path, response,
+                          offset, conditional, (key, urlsplit_res))
+        finally:
+            self._release(key, conn, response)
+
+    def _request_redirected(self, urlsplit_res, headers):
+        """Send GET (see _request), following redirects (each to the
+           pool of its target).
+
+           Returns:
+               Tuple(Tuple(str, str, int), urllib.parse.SplitResult,
+                     http.client.HTTPConnection,
+                     http.client.HTTPResponse): pool-key, parsed URL (of the
+                                                last hop), connection,
+                                                response.
+
+           Raises:
+               DownloaderHTTPError: After MAX_REDIRECTS redirects.
+               ValueError: If a target is not http / https.
+
+        """
+        redirects = 0
+        while True:
+            key = self.pool.get_key(urlsplit_res)
+            conn, response = self._request(key, urlsplit_res, headers)
+            target = _get_redirect(urlsplit_res, response.status,
+                                   response.getheader('Location'))
+            if target is None:
+                return key, urlsplit_res, conn, response
+
+            response.read()
+            self._release(key, conn, response)
+            redirects += 1
+            if redirects > MAX_REDIRECTS:
+                raise DownloaderHTTPError('Too many redirects',
+                                          response.status)
+            urlsplit_res = target
+
+    def _get_request_headers(self, url, target_filename, joined_out_path,
+                             offset=0, if_range=None):
+        """Headers of the GET of a download (Range-request if offset).
+
+           Returns:
+               Tuple(dict, dict): all headers, conditional headers among them
+                                  (see _get_conditional_headers).
+
+        """
+        if offset:
+            return {'Accept-Encoding': 'identity',
+                    'Range': 'bytes={}-'.format(offset),
+                    'If-Range': if_range}, {}
+
+        headers = {'Accept-Encoding': get_accept_encoding(
+            self.settings['COMPRESSION'])}
+        conditional = self._get_conditional_headers(url, target_filename,
+                                                    joined_out_path)
+        headers.update(conditional)
+        return headers, conditional
+
+    def _receive(self, url, target_filename, joined_out_path, response,
+                 offset=0, conditional=None, segment_source=None):
+        """Store the response-body of a download in its part-file and finish
+           it (nothing to do if unchanged since the last download).
+
+           The response is read completely, unless the download fails or is
+           segmented (see _release).
+
+           Args:
+               response (http.client.HTTPResponse): response (head read).
+               offset (int, optional): bytes requested to be skipped (Range).
+               conditional (dict, optional): conditional headers sent.
+               segment_source (Tuple, optional): pool-key and parsed URL to
+                   request further segments from (default: not segmented).
+
+           Raises:
+               OSError / http.client.HTTPException: On network or filesystem
+                                                    problems.
+               ValueError: On unexpected status.
+
+        """
+        part_path = joined_out_path + PART_SUFFIX
+        if (response.status == 206 and offset and
+                _get_range_start(response) == offset):
+            mode = 'ab'
+        elif response.status == 200:
+            mode, offset = 'wb', 0
+        elif response.status == 304 and conditional:
+            # Unchanged since the last download: keep file
+            response.read()
+            return
+        elif (response.status == 416 and offset and
+                self.journal.get(target_filename)['size'] == offset):
+            # Part-file was complete already (crash before renaming)
+            response.read()
+            mode = None
+        else:
+            response.read()
+            raise DownloaderHTTPError(
+                'HTTP status {}'.format(response.status),
+                response.status,
+                parse_retry_after(response.getheader('Retry-After')))
+
+        checksum = self._new_checksum(part_path, offset)
+        if mode is None:
+            entry = self.journal.get(target_filename)
+            response_headers = {'etag': entry['etag'],
+                                'last-modified': entry['last_modified']}
+        elif (segment_source is not None and
+                self._should_segment(response, offset)):
+            response_headers = response.headers
+            size = int(response.getheader('Content-Length'))
+            self._record(url, target_filename, 'partial',
+                         response_headers, size, False)
+            start = time.perf_counter()
+            self._fetch_segments(*segment_source, response, part_path, size)
+            self._record_body(start, size)
+            checksum = self._new_checksum(part_path, size)
+        else:
+            response_headers = response.headers
+            coding = response.getheader('Content-Encoding')
+            decoder = self._get_decoder(coding)
+            length = response.getheader('Content-Length')
+            size = (offset + int(length) if length and decoder is None
+                    else None)
+            preallocate = self._should_preallocate(offset, size)
+            self._record(url, target_filename, 'partial',
+                         response_headers, size,
+                         is_identity(coding) and not preallocate)
+
+            start = time.perf_counter()
+            with open(part_path, mode) as f:
+                if preallocate:
+                    self._preallocate(f, offset, size)
+                if decoder is None:
+                    self._copy(response, f, checksum)
+                    received = f.tell() - offset
+                else:
+                    sink = DecodingWriter(f, decoder, checksum)
+                    self._copy(response, sink, None)
+                    sink.close()
+                    received = sink.received
+                self._record_body(start, received)
+
+        self._finish(url, target_filename, joined_out_path, part_path,
+                     response_headers, checksum)
+
+    def _release(self, key, conn, response):
+        """Give conn back to the pool if its response was read completely and
+           the server keeps the connection open; close it otherwise.
+
+        """
+        if response.isclosed() and not response.will_close:
+            self.pool.put(key, conn)
+        else:
+            conn.close()
+
+    def _fetch_pipelined(self, key, requests, errors):
+        """Send the request-heads of requests at once over a pooled
+           connection for key, then store the responses in order (see
+           download_pipelined).
+
+           A reused connection closed by the server in the meantime is
+           replaced once by a new one. Reading stops at the first response
+           after which the connection can not be used anymore.
+
+           Args:
+               key (Tuple(str, str, int)): pool-key of all requests.
+               requests (list(Tuple)): as built by download_pipelined.
+               errors (list): per pair of download_pipelined; failures are
+                              set here.
+
+           Returns:
+               Tuple(int, list(int)): requests answered (the first ones, in
+                                      order), indices (in pairs) of those
+                                      redirected (not followed here).
+
+        """
+        conn, reused = self.pool.get(key)
+        while True:
+            responses = None
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                start = time.perf_counter()
+                conn.sock.sendall(b''.join(request[-1]
+                                           for request in requests))
+                responses = _PipelinedResponses(conn.sock)
+                response = responses.next()
+                break
+            except (http.client.RemoteDisconnected, ConnectionError):
+                if responses is not None:
+                    responses.close()
+                conn.close()
+                if not reused:
+                    return 0, []
+            except (OSError, http.client.HTTPException):
+                if responses is not None:
+                    responses.close()
+                conn.close()
+                return 0, []
+            conn, reused = self.pool.new(key), False
+
+        if self.metrics is not None:
+            self.metrics.observe('ttfb_seconds', time.perf_counter() - start)
+            self.metrics.add('pipelined_total', len(requests))
+
+        answered = 0
+        redirected = []
+        try:
+            for i, url, target_filename, joined_out_path, conditional, _ \
+                    in requests:
+                if answered:
+                    response = responses.next()
+                answered += 1
+                if response.status in REDIRECT_STATUSES:
+                    response.read()
+                    redirected.append(i)
+                else:
+                    try:
+                        self._download(url, target_filename, joined_out_path,
+                                       self._receive, url, target_filename,
+                                       joined_out_path, response, 0,
+                                       conditional)
+                    except DownloaderDownloadError as e:
+                        errors[i] = e
+                if not response.isclosed() or response.will_close:
+                    break
+        except (OSError, http.client.HTTPException):
+            pass  # Connection lost: the others are left unanswered
+        finally:
+            responses.close()
+            if answered == len(requests):
+                self._release(key, conn, response)
+            else:
+                conn.close()
+        return answered, redirected
+
+    def _should_segment(self, response, offset):
+        """Check if a complete response (200) is to be downloaded in segments
+           (setting SEGMENTS > 1, Accept-Ranges, not encoded, Content-Length
+           of at least SEGMENT_THRESHOLD and a validator for If-Range).
+
+           Returns:
+               Bool: True (Yes) / False (No).
+
+        """
+        length = response.getheader('Content-Length')
+        return (self.settings['SEGMENTS'] > 1 and offset == 0 and
+                response.status == 200 and hasattr(os, 'pwrite') and
+                response.getheader('Accept-Ranges', '').lower() == 'bytes' and
+                is_identity(response.getheader('Content-Encoding')) and
+                length is not None and length.isdigit() and
+                int(length) >= max(2, self.settings['SEGMENT_THRESHOLD']) and
+                _get_validator(response.getheader('ETag'),
+                               response.getheader('Last-Modified'))
+                is not None)
+
+    def _fetch_segments(self, key, urlsplit_res, response, part_path, size):
+        """Download size bytes in SEGMENTS byte-ranges at once into the
+           (preallocated) part-file.
+
+           The first segment is read from the complete response already
+           received (its connection is closed afterwards), the others are
+           requested in parallel with Range / If-Range. Segments are written
+           with os.pwrite at their offset.
+
+           Raises:
+               OSError / http.client.HTTPException: On network or filesystem
+                                                    problems.
+               ValueError: If a segment is not served as requested (e.g. file
+                           changed in the meantime).
+
+        """
+        segments = min(self.settings['SEGMENTS'], size)
+        bounds = [size * i // segments for i in range(segments + 1)]
+        ranges = list(zip(bounds[:-1], bounds[1:]))
+        validator = _get_validator(response.getheader('ETag'),
+                                   response.getheader('Last-Modified'))
+
+        with open(part_path, 'wb') as f:
+            f.truncate(size)
+            if hasattr(os, 'posix_fallocate'):
+                self._preallocate(f, 0, size)
+
+            with ThreadPoolExecutor(max_workers=segments - 1) as executor:
+                futures = [executor.submit(self._fetch_segment, key,
+                                           urlsplit_res, f.fileno(), start,
+                                           end, validator)
+                           for start, end in ranges[1:]]
+                try:
+                    self._copy_range(response, f.fileno(), *ranges[0])
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+                for future in futures:
+                    future.result()
+
+    def _fetch_segment(self, key, urlsplit_res, fd, start, end, validator):
+        """Request bytes start..end (Range / If-Range) over a pooled
+           connection and write them to fd at their offset.
+
+        """
+        headers = {'Accept-Encoding': 'identity',
+                   'Range': 'bytes={}-{}'.format(start, end - 1),
+                   'If-Range': validator}
+        conn, response = self._request(key, urlsplit_res, headers)
+        try:
+            if (response.status != 206 or
+                    _get_range_start(response) != start):
+                raise ValueError('HTTP status {} for bytes {}-{}'
+                                 .format(response.status, start, end - 1))
+            self._copy_range(response, fd, start, end)
+            if response.read():
+                raise ValueError('Too long response for bytes {}-{}'
+                                 .format(start, end - 1))
+        finally:
+            self._release(key, conn, response)
+
+    def _copy_range(self, response, fd, start, end):
+        """Copy the next end - start bytes of the response-body into fd at
+           offset start (os.pwrite).
+
+           Raises:
+               ValueError: If the response-body ends before.
+
+        """
+        view = self._get_buffer()
+        pos = start
+        while pos < end:
+            n = response.readinto(view[:end - pos])
+            if not n:
+                raise ValueError('Incomplete response for bytes {}-{}'
+                                 .format(start, end - 1))
+            os.pwrite(fd, view[:n], pos)
+            pos += n
+
+    def _copy(self, response, f, checksum):
+        """Copy response-body into f (and checksum if given).
+
+           Reads into a buffer of CHUNK_SIZE bytes reused by all downloads of
+           the current thread (no new bytes-object per chunk).
+
+        """
+        view = self._get_buffer()
+        while True:
+            n = response.readinto(view)
+            if not n:
+                break
+            f.write(view[:n])
+            if checksum is not None:
+                checksum.update(view[:n])
+
+    def _get_buffer(self):
+        """Read-buffer of the current thread.
+
+           Returns:
+               memoryview: view on a bytearray of CHUNK_SIZE bytes.
+
+        """
+        view = getattr(self._buffers, 'view', None)
+        if view is None:
+            view = memoryview(bytearray(self.settings['CHUNK_SIZE']))
+            self._buffers.view = view
+        return view
+
+    def _request(self, key, urlsplit_res, headers):
+        """Send GET and read the response-head.
+
+           A reused connection might have been closed by the server in the
+           meantime: in this case the request is repeated once on a new
+           connection.
+
+           Returns:
+               Tuple(http.client.HTTPConnection,
+                     http.client.HTTPResponse): connection, response.
+
+        """
+        target = _get_target(urlsplit_res)
+        conn, reused = self.pool.get(key)
+        try:
+            return conn, self._get_response(conn, target, headers)
+        except (http.client.RemoteDisconnected, ConnectionError):
+            conn.close()
+            if not reused:
+                raise
+
+        conn = self.pool.new(key)
+        try:
+            return conn, self._get_response(conn, target, headers)
+        except BaseException:
+            conn.close()
+            raise
+
+    def _get_response(self, conn, target, headers):
+        """Send GET over conn (connecting if needed) and read the
+           response-head (time to first byte recorded with metrics).
+
+           Returns:
+               http.client.HTTPResponse: response.
+
+        """
+        if self.metrics is None:
+            conn.request('GET', target, headers=headers)
+            return conn.getresponse()
+
+        if conn.sock is None:
+            conn.connect()
+        start = time.perf_counter()
+        conn.request('GET', target, headers=headers)
+        response = conn.getresponse()
+        self.metrics.observe('ttfb_seconds', time.perf_counter() - start)
+        return response
+
+    def download_many(self, pairs, on_error=None):
+        """Download all url / target-filename pairs.
+
+           The downloads run on a bounded pool of WORKERS worker-threads.
+           Pairs are consumed lazily: at most 2 * WORKERS downloads are
+           queued at any time.
+
+           Downloads are queued per host and handed to the workers
+           interleaved over hosts (see HostScheduler): downloads for a host
+           at its rate-limit or with open circuit-breaker wait without taking
+           a worker, while other hosts go on. Failed downloads are put aside
+           and queued again (first for their host) when their backoff is
+           over.
+
+           With PIPELINE > 1, further downloads of a host ready at the same
+           time are batched with the one handed out (up to PIPELINE) and
+           pipelined on one connection (see download_pipelined).
+
+           The first download failing for good stops the batch: queued
+           downloads are cancelled, running ones are finished, then the error
+           is raised. With an error-handler, the batch goes on instead.
+
+           Args:
+               pairs (iterable(Tuple(str, str))): url / target-filename pairs
+                   (optionally followed by the line-number of the URL).
+               on_error (callable, optional): called as
+                   on_error(error, line_number, url) for downloads failing
+                   for good (default: raise).
+
+           Raises:
+               DownloaderDownloadError: If any download/saving fails (without
+                                        error-handler).
+
+        """
+        workers = max(1, self.settings['WORKERS'])
+        pipeline = self.settings['PIPELINE']
+        pairs = iter(pairs)
+        hosts = HostScheduler(self.rate_limiter, self.breaker)
+        retries = RetryQueue()
+        pending = {}  # future -> list of items (see _get_item)
+        exhausted = False
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                while True:
+                    item = retries.pop_due()
+                    while item is not None:
+                        hosts.add(urlsplit(item[0]).netloc, item, first=True)
+                        item = retries.pop_due()
+
+                    while len(pending) < 2 * workers:
+                        # Keep PIPELINE pairs queued to be batched
+                        while not exhausted and len(hosts) < min(
+                                pipeline, self.settings['LOOKAHEAD']):
+                            exhausted = not _queue_next(pairs, hosts)
+
+                        item = hosts.pop_ready()
+                        if item is None:
+                            # Read ahead (up to LOOKAHEAD pairs waiting for
+                            # their host) while no host is ready
+                            if (exhausted or
+                                    len(hosts) >= self.settings['LOOKAHEAD']):
+                                break
+                            exhausted = not _queue_next(pairs, hosts)
+                            continue
+
+                        items = [item]
+                        if pipeline > 1:
+                            items.extend(hosts.pop_more(
+                                urlsplit(item[0]).netloc, pipeline - 1))
+                        if len(items) > 1:
+                            future = executor.submit(
+                                self.download_pipelined,
+                                [(url, name) for url, name, _, _ in items])
+                        else:
+                            future = executor.submit(
+                                self.download, item[0], item[1])
+                        pending[future] = items
+
+                    timeout = _get_min(hosts.next_ready(),
+                                       retries.next_due())
+                    if not pending:
+                        if exhausted and timeout is None:
+                            return
+                        time.sleep(timeout)
+                        continue
+
+                    done, _ = wait(pending, timeout=timeout,
+                                   return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._check_result(future, pending.pop(future),
+                                           retries, on_error)
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+
+    def _check_result(self, future, items, retries, on_error):
+        """Check finished downloads (single or pipelined); queue them again
+           if they failed but are to be retried.
+
+           Args:
+               future (concurrent.futures.Future): finished download(s).
+               items (list(Tuple(str, str, int, int))): url, target-filename,
+                   attempt, line-number per download.
+               retries (RetryQueue): downloads waiting for a retry.
+               on_error (callable): error-handler or None.
+
+           Raises:
+               DownloaderDownloadError: If a download failed for good
+                                        (without error-handler).
+
+        """
+        if len(items) > 1:
+            errors = future.result()
+        else:
+            try:
+                future.result()
+                errors = [None]
+            except DownloaderDownloadError as e:
+                errors = [e]
+
+        for (url, target_filename, attempt, line_number), error in zip(
+                items, errors):
+            if error is None:
+                self.breaker.success(urlsplit(url).netloc)
+                continue
+
+            delay = self._get_retry_delay(url, attempt, error)
+            if delay is not None:
+                retries.push((url, target_filename, attempt + 1,
+                              line_number), delay)
+            elif on_error is not None:
+                on_error(error, line_number, url)
+            else:
+                raise error
+
+
+def _get_item(pair):
+    """Scheduling-item of a url / target-filename (/ line-number) pair.
+
+       Returns:
+           Tuple(str, str, int, int): url, target-filename, attempt (0),
+                                      line-number (or None).
+
+    """
+    return pair[0], pair[1], 0, pair[2] if len(pair) > 2 else None
+
+
+def _queue_next(pairs, hosts):
+    """Queue the next pair of pairs for its host.
+
+       Returns:
+           Bool: True (queued) / False (pairs exhausted).
+
+    """
+    pair = next(pairs, None)
+    if pair is None:
+        return False
+    hosts.add(urlsplit(pair[0]).netloc, _get_item(pair))
+    return True
+
+
+def _get_redirect(urlsplit_res, status, location):
+    """Target of a redirect-response.
+
+       Args:
+           urlsplit_res (urllib.parse.SplitResult): parsed URL requested.
+           status (int): HTTP-status of the response.
+           location (str): "Location"-header of the response or None.
+
+       Returns:
+           urllib.parse.SplitResult: parsed target (relative locations
+                                     resolved) or None if no redirect.
+
+    """
+    if status not in REDIRECT_STATUSES or not location:
+        return None
+    return urlsplit(urljoin(urlsplit_res.geturl(), location))
+
+
+def _get_target(urlsplit_res):
+    """Request-target (path and query) of a parsed URL.
+
+    """
+    target = urlsplit_res.path
+    if urlsplit_res.query:
+        target += '?' + urlsplit_res.query
+    return target
+
+
+def _format_request(key, target, headers):
+    """Head of a GET-request (HTTP/1.1) as sent by http.client.
+
+       Args:
+           key (Tuple(str, str, int)): pool-key (scheme, host, port).
+           target (str): request-target.
+           headers (dict): further headers.
+
+       Returns:
+           bytes: request-head.
+
+       Raises:
+           ValueError (UnicodeEncodeError): If target is not ASCII.
+
+    """
+    scheme, host, port = key
+    if ':' in host:
+        host = '[{}]'.format(host)
+    if port != (443 if scheme == 'https' else 80):
+        host = '{}:{}'.format(host, port)
+
+    lines = ['Host: ' + host]
+    lines.extend('{}: {}'.format(name, value)
+                 for name, value in headers.items())
+    return ('GET {} HTTP/1.1\r\n'.format(target or '/').encode('ascii') +
+            '\r\n'.join(lines).encode('latin-1') + b'\r\n\r\n')
+
+
+class _PipelinedResponses():
+    """Reads the responses of pipelined requests from one socket in order.
+
+    All responses share one buffered reader (a response may arrive in the
+    same read as the end of the one before).
+
+    """
+    def __init__(self, sock):
+        self._file = sock.makefile('rb')
+
+    def makefile(self, mode):
+        """Reader of the next response (used by http.client.HTTPResponse).
+
+        """
+        return _KeptOpen(self._file)
+
+    def next(self):
+        """Read the head of the next response (the one before must be read
+           completely).
+
+           Returns:
+               http.client.HTTPResponse: response.
+
+        """
+        response = http.client.HTTPResponse(self, method='GET')
+        response.begin()
+        return response
+
+    def close(self):
+        self._file.close()
+
+
+class _KeptOpen():
+    """File-proxy not closing the shared reader when a response is done.
+
+    """
+    def __init__(self, f):
+        self._f = f
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def close(self):
+        pass
+
+
+def _get_min(*values):
+    """Minimum of the values which are not None (None if there are none).
+
+    """
+    values = [value for value in values if value is not None]
+    return min(values) if values else None
+
+
+def _get_validator(etag, last_modified):
+    """Validator usable as If-Range: strong ETag or else Last-Modified.
+
+       Returns:
+           str: validator or None.
+
+    """
+    if etag and not etag.startswith('W/'):
+        return etag
+    return last_modified or None
+
+
+def _get_range_start(response):
+    """First byte-position of a 206-response (from Content-Range).
+
+       Args:
+           response (http.client.HTTPResponse): response.
+
+       Returns:
+           int: position or None if header is missing / malformed.
+
+    """
+    content_range = response.getheader('Content-Range', '')
+    try:
+        unit, _, byte_range = content_range.partition(' ')
+        if unit.strip() != 'bytes':
+            return None
+        return int(byte_range.split('-')[0])
+    except ValueError:
+        return None
@@ -72,6 +72,24 @@ class DownloaderDownloadError(Exception):
     pass
 
 
+class DownloaderHTTPError(DownloaderDownloadError):
+    """Raised when the server answered a download with an unexpected
+       HTTP-status.
+
+       Attributes:
+           status (int): HTTP-status.
+           retry_after (float): seconds given by "Retry-After" or None.
+
+    """
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message, status, retry_after)
+        self.status = status
+        self.retry_after = retry_after
+
+    def __str__(self):
+        return self.args[0]
+
+
 class InputParserParseError(Exception):
     """Raised when class-method InputParser._parse_file failed.
 
@@ -98,7 +116,8 @@ class UtilsFileDoesNotExistError(Exception):
 
 
 class UtilsFileDoesExistError(Exception):
-    """Raised when function assert_file_nonexisting failed.
+    """Raised when function assert_file_nonexisting (or a collision-check on
+       the output-directory) failed.
 
        This means, that:
 
@@ -110,7 +129,8 @@ class UtilsFileDoesExistError(Exception):
 
 
 class UtilsFileNameValidError(Exception):
-    """Raised when function is_filename_valid failed.
+    """Raised when function assert_filename_valid or class-method
+       FilenameValidator.assert_valid failed.
 
        This means, that:
        - the given name is not a valid path
@@ -119,3 +139,21 @@ class UtilsFileNameValidError(Exception):
 
     """
     pass
+
+
+class RunScriptIncompleteError(Exception):
+    """Raised when function run completed with --keep-going, but some lines
+       or downloads failed.
+
+       The failures are listed in the failure-report.
+
+       Attributes:
+           failures (int): number of failed lines / downloads.
+
+    """
+    def __init__(self, message, failures=0):
+        super().__init__(message, failures)
+        self.failures = failures
+
+    def __str__(self):
+        return self.args[0]
@@ -0,0 +1,82 @@
+"""
+This module provides the failure-report of runs with --keep-going.
+"""
+
+import json
+import threading
+
+
+def get_failure_entry(error, line_number, url):
+    """Describe a failed line / download.
+
+       Args:
+           error (Exception): error raised.
+           line_number (int): line-number within the input or None.
+           url (str): URL of the line.
+
+       Returns:
+           dict: keys line, url, error (exception-class, e.g.
+                 "URLParsingError"), message (exception-message) and cause
+                 (message of the underlying error, e.g. "HTTP status 404",
+                 or None).
+
+    """
+    cause = error.__cause__ or error.__context__
+    return {'line': line_number, 'url': url,
+            'error': type(error).__name__,
+            'message': str(error).strip(),
+            'cause': (str(cause) or type(cause).__name__
+                      if cause is not None else None)}
+
+
+class FailureReport():
+    """This class writes one JSON-object per failed line / download (see
+       get_failure_entry; "url" is "" for empty lines).
+
+    Several processes may append to the same report (sharded runs): one
+    starts it (e.g. the coordinator), the others append.
+
+    Thread-safe. Expected usage: init once; add per failure; close at the
+    end.
+
+    """
+    def __init__(self, path, append=False):
+        """Init with path to report-file and (optional) append-flag.
+
+           Args:
+               path (str): path to report-file.
+               append (bool, optional): keep existing lines (default: False).
+
+           Attributes:
+               path (str): original path given.
+               failures (int): failures added so far.
+
+           Raises:
+               OSError: If the report-file can not be written.
+
+        """
+        self.path = path
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._file = open(path, 'a' if append else 'w')
+
+    def add(self, error, line_number, url):
+        """Record a failed line / download.
+
+           Args:
+               error (Exception): error raised.
+               line_number (int): line-number within the input-file or None.
+               url (str): URL of the line.
+
+        """
+        entry = get_failure_entry(error, line_number, url)
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            self.failures += 1
+
+    def close(self):
+        """Close report-file.
+
+        """
+        self._file.close()
@@ -2,84 +2,397 @@
 This module provides the parsing of some input-link including basic checks.
 """
 
-from src.exceptions import InputParserParseError
-from src.utils import assert_file_existing
-from src.url_handler import URLHandler
+import locale
+import os
+import time
+from itertools import islice
+from src.exceptions import (InputParserParseError,
+                            URLParsingError,
+                            URLInferFilenameError,
+                            UtilsFileDoesExistError)
+from src.metrics import timed_iter
+from src.utils import assert_file_existing, FilenameValidator
+from src.mapped_file import MappedLines
+from src.url_handler import claim_filename, split_url, split_urls
+from src.url_table import URLTable
+
+# URLs split at once by _check_urls (bounds the temporary lists)
+CHECK_CHUNK_SIZE = 65536
+
+# Bytes of the digest kept per URL to skip duplicates
+URL_DIGEST_SIZE = 16
 
 
 class InputParser():
     """This class is responsible for parsing URLS (including basic checking)
        & inferrence of target-filenames for later storage.
 
+    By default the whole input-file is parsed and checked at init. In lazy
+    mode nothing is read at init: iter_url_targetname_pairs reads, checks and
+    yields line by line, so downloading can start after the first line and
+    memory stays flat for huge input-files: per distinct URL only a
+    fixed-size digest is kept (besides its filename in the output-index).
+
+    With a byte-range only the lines starting within this range are used
+    (see split_byte_ranges), so several parsers can share one input-file.
+
+    A URL given several times is only used (checked and downloaded) at its
+    first line; later lines are skipped. URLs checked already are recognized
+    by a digest of URL_DIGEST_SIZE bytes (blake2b) instead of keeping them.
+
+    With an error-handler, invalid lines (empty line, invalid URL or
+    filename, filename-collision) are passed to it and skipped instead of
+    raising.
+
+    Instead of an input-file, a list of URLs can be given (e.g. a batch of
+    the daemon); it is parsed like the lines of a file.
+
+    Input-files are read through mmap (see MappedLines): lines are located
+    over the mapped bytes and each URL is decoded when it is consumed. Not
+    lazy, the file is read twice (parsed, then checked in chunks) instead of
+    keeping all raw URLs. Checked URLs are kept in a URLTable (a few flat
+    buffers instead of objects per URL).
+
+    With metrics, the time spent reading the input-file
+    ("parse_seconds_total") and checking each URL ("validate_seconds") is
+    recorded, as are the lines read ("lines_total").
+
     """
-    def __init__(self, filepath, out_path, verbose=False):
+    def __init__(self, filepath, out_path, verbose=False, lazy=False,
+                 strict_filenames=False, index=None, byte_range=None,
+                 on_error=None, metrics=None, urls=None):
         """Init with input-path (file with links), output-path (directory) and
-           (optional) verbosity-flag.
+           (optional) verbosity-flag, lazy-flag, strict-filenames-flag,
+           output-index, byte-range, error-handler, metrics and URLs.
 
            Args:
                filepath (str): valid path to input-file (with correct format).
                out_path (str): valid path to output-directory.
                verbose (bool, optional): be verbose or not (default).
+               lazy (bool, optional): parse and check while iterating instead
+                                      of at init (default: False).
+               strict_filenames (bool, optional): check filenames by
+                   creating probe-files in out_path instead of in memory
+                   (default: False).
+               index (OutputIndex, optional): index of out_path deciding
+                   on collisions (default: new index, policy fail).
+               byte_range (Tuple(int, int), optional): start / end offset
+                   of the lines to use (default: whole file).
+               on_error (callable, optional): called as
+                   on_error(error, line_number, url) for invalid lines,
+                   which are skipped (default: raise).
+               metrics (Metrics, optional): metrics of the run.
+               urls (list(str), optional): URLs used instead of the lines of
+                   the input-file (filepath is only used in messages).
 
            Attributes:
                filepath (str): original input-filepath given.
-               urls (list(str)): parsed URLs.
-               target_filenames (list(str)): inferred filename for each url
-                                             in urls.
+               records (URLTable): parsed URLs with inferred filename and
+                   line-number (without URLs skipped on filename-collision
+                   or as duplicate).
                out_path (str): original output-path given.
                verbose (bool): be verbose or not.
+               lazy (bool): parse and check while iterating.
+               byte_range (Tuple(int, int)): start / end offset or None.
+               on_error (callable): error-handler or None.
+               metrics (Metrics): metrics of the run or None.
+               validator (FilenameValidator): filename-checks for out_path
+                                              (shared by all URLs).
 
            Raises:
-               InputParserParseError: When opening or parsing input-file fails.
+               InputParserParseError: When opening or parsing input-file fails
+                                      (not lazy).
+               UtilsFileDoesNotExistError: When input-file does not exist.
 
         """
         self.filepath = filepath
-        self.urls = []
-        self.target_filenames = []
+        self._given_urls = urls
+        self.records = URLTable()
         self.out_path = out_path
         self.verbose = verbose
+        self.lazy = lazy
+        self.byte_range = byte_range
+        self.on_error = on_error
+        self.metrics = metrics
+        self._seen = set()  # digests of URLs checked already
+        self.validator = FilenameValidator(out_path, strict_filenames, index,
+                                           metrics)
+
+        if lazy:
+            if urls is None:
+                assert_file_existing(self.filepath)
+        else:
+            self._parse_file()
+            self._check_urls()
+            self._seen = set()  # only needed while checking
+
+    @property
+    def urls(self):
+        """Parsed URLs (list decoded from records; not lazy).
+
+        """
+        return list(self.records.iter_urls())
+
+    @property
+    def target_filenames(self):
+        """Inferred filename for each url in urls.
 
-        self._parse_file()
-        self._check_urls()
+        """
+        return list(self.records.filenames)
+
+    @property
+    def line_numbers(self):
+        """Line-number of each url in urls.
+
+        """
+        return list(self.records.line_numbers)
+
+    def iter_urls(self):
+        """Parsed URLs one by one (not lazy; no list as urls).
+
+           Yields:
+               str: URL.
+
+        """
+        return self.records.iter_urls()
+
+    def count_lines(self):
+        """Number of input-lines (within byte_range, if given), counted
+           over the mapped file without reading URLs (e.g. for progress).
+
+           Returns:
+               int: lines (empty ones included).
+
+           Raises:
+               InputParserParseError: When opening input-file fails.
+
+        """
+        if self._given_urls is not None:
+            return len(self._given_urls)
+
+        start, end = self.byte_range or (0, None)
+        try:
+            with MappedLines(self.filepath) as lines:
+                return lines.count_lines(start, end)
+        except OSError:
+            raise InputParserParseError(
+                'Could not open input "{}"'.format(self.filepath))
 
     def _parse_file(self):
-        """Open file and parse line-by-line.
+        """Open file and parse line-by-line (URLs are not kept, see
+           _check_urls).
+
+           Returns:
+               int: lines read (without empty ones skipped).
 
         """
         if self.verbose:
             print('Read input-file...')
 
-        assert_file_existing(self.filepath)
+        if self._given_urls is None:
+            assert_file_existing(self.filepath)
+
+        # empty lines are disallowed (raised with their line-number)
+        count = sum(1 for _ in self._iter_timed_lines())
+
+        if self.verbose:
+            print('...success ({} lines)'.format(count))
+        return count
+
+    def _check_urls(self):
+        """Check URLs (read again, parsed by _parse_file already) & infer
+           filenames into records.
+
+           URLs are decoded and split in chunks of CHECK_CHUNK_SIZE (see
+           split_urls); filenames are claimed in order.
 
+        """
+        if self.verbose:
+            print('Check URLs')
+
+        lines = ((line_number, url)
+                 for line_number, url in self._iter_stripped_lines() if url)
+        while True:
+            chunk = list(islice(lines, CHECK_CHUNK_SIZE))
+            if not chunk:
+                break
+            netlocs, paths, filenames, failed = split_urls(
+                [url for _, url in chunk])
+            for i, (line_number, url) in enumerate(chunk):
+                parts = (None if failed[i] else
+                         (netlocs[i], paths[i], filenames[i]))
+                target_filename = self._get_filename(url, line_number,
+                                                     parts)
+                if target_filename is not None:
+                    self.records.append(url, target_filename, line_number)
+
+        if self.verbose:
+            print('...success')
+
+    def _get_filename(self, url, line_number, parts=None):
+        """Check URL & infer (and claim) its filename.
+
+           Args:
+               url (str): URL.
+               line_number (int): line-number of url.
+               parts (Tuple(str, str, str), optional): url split already (see
+                   split_url; default: split here).
+
+           Returns:
+               str: target-filename or None if skipped as duplicate or on
+                    collision (or invalid, with error-handler).
+
+        """
+        digest = _get_digest(url)
+        if digest in self._seen:
+            if self.verbose:
+                print('Skip "{}" (duplicate of an earlier line)'.format(url))
+            if self.metrics is not None:
+                self.metrics.add('duplicates_total')
+            return None
+
+        start = time.perf_counter()
+        try:
+            if parts is None:
+                parts = split_url(url)
+            target_filename = claim_filename(
+                url, parts[2] if parts is not None else None, self.out_path,
+                self.validator)
+        except (URLParsingError, URLInferFilenameError,
+                UtilsFileDoesExistError) as e:
+            if self.on_error is None:
+                raise
+            self.on_error(e, line_number, url)
+            return None
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe('validate_seconds',
+                                     time.perf_counter() - start)
+
+        self._seen.add(digest)
+        if self.verbose and target_filename is None:
+            print('Skip "{}" (filename exists)'.format(url))
+
+        return target_filename
+
+    def _iter_timed_lines(self):
+        """_iter_lines, timed and counted with metrics.
+
+        """
+        if self.metrics is None:
+            yield from self._iter_lines()
+            return
+
+        for line in timed_iter(self._iter_lines(), self.metrics,
+                               'parse_seconds_total'):
+            self.metrics.add('lines_total')
+            yield line
+
+    def _iter_lines(self):
+        """Yield the input (file or given URLs) line-by-line (lazy counterpart
+           of _parse_file).
+
+           Yields:
+               Tuple(int, str): line-number, url.
+
+           Raises:
+               InputParserParseError: When reading fails or an empty line is
+                                      found (without error-handler).
+
+        """
         try:
-            with open(self.filepath, 'r') as f:
-                for url in f.readlines():
-                    self.urls.append(url.strip())
+            for line_number, url in self._iter_stripped_lines():
+                if url or self._empty_line(line_number):
+                    yield line_number, url
+        except InputParserParseError:
+            raise
         except Exception as e:
             raise InputParserParseError(
                 'Could not open input "{}"'.format(self.filepath))
 
-        # check number of urls read against number of lines
-        # this disallows empty lines!
-        n_lines = len(self.urls)
-        self.urls = list(filter(None, self.urls))
-        if n_lines != len(self.urls):
-            raise InputParserParseError(
-                'Input file-format looks wrong. Are there empty lines?')
+    def _iter_stripped_lines(self):
+        """Yield all lines (empty ones included) stripped, with their
+           line-number.
 
-        if self.verbose:
-            print('...success')
+           Lines of the input-file are those starting within byte_range (a
+           line belongs to the range its first byte is in), located over the
+           mapped file and decoded one by one.
 
-    def _check_urls(self):
-        """Check URLs & infer filenames of previously read raw URLs.
+        """
+        if self._given_urls is not None:
+            for line_number, url in enumerate(self._given_urls, 1):
+                yield line_number, url.strip()
+            return
+
+        start, end = self.byte_range or (0, None)
+        encoding = locale.getpreferredencoding(False)
+
+        with MappedLines(self.filepath) as lines:
+            line_number = lines.get_line_number(lines.line_start(start))
+            for _, line in lines.iter_lines(start, end):
+                yield line_number, line.decode(encoding).strip()
+                line_number += 1
+
+    def _empty_line(self, line_number):
+        """Handle an empty line: pass it to the error-handler (line is
+           skipped) or raise.
+
+           Returns:
+               Bool: False (line is not to be used).
+
+           Raises:
+               InputParserParseError: Without error-handler.
 
         """
+        error = InputParserParseError(
+            'Input file-format looks wrong. Are there empty lines? '
+            '(line {})'.format(line_number))
+        if self.on_error is None:
+            raise error
+        self.on_error(error, line_number, '')
+        return False
+
+    def iter_url_targetname_pairs(self, line_numbers=False):
+        """Public getter for results as generator.
+
+           In lazy mode, each line is read and checked when it is consumed.
+           Errors are raised when the offending line is reached.
+
+           Args:
+               line_numbers (bool, optional): yield line-numbers as well
+                                              (default: False).
+
+           Yields:
+               Tuple(str, str): pair of url / target-filename (or
+               Tuple(str, str, int): url / target-filename / line-number).
+
+           Raises:
+               InputParserParseError: When reading fails (lazy).
+               URLParsingError: When URL parsing failed (lazy).
+               URLInferFilenameError: When no valid filename could be parsed
+                                      from URL (lazy).
+
+        """
+        if not self.lazy:
+            if line_numbers:
+                yield from self.records
+            else:
+                for url, target_filename, _ in self.records:
+                    yield url, target_filename
+            return
+
         if self.verbose:
-            print('Check URLs')
+            print('Read & check input-file (lazy, {} lines)...'.format(
+                self.count_lines()))
 
-        for url in self.urls:
-            urlhandler = URLHandler(url, self.out_path)
-            self.target_filenames.append(urlhandler.get_filename())
+        for line_number, url in self._iter_timed_lines():
+            target_filename = self._get_filename(url, line_number)
+            if target_filename is None:
+                continue
+            if line_numbers:
+                yield url, target_filename, line_number
+            else:
+                yield url, target_filename
 
         if self.verbose:
             print('...success')
@@ -92,4 +405,37 @@ class InputParser():
                                       url / target-filename.
 
         """
-        return list(zip(self.urls, self.target_filenames))
+        return list(self.iter_url_targetname_pairs())
+
+
+def _get_digest(url):
+    """Digest of url used to recognize duplicates.
+
+       Returns:
+           int: URL_DIGEST_SIZE bytes of blake2b (as int: smaller than bytes).
+
+    """
+    import hashlib  # not imported at startup (see run_script)
+
+    return int.from_bytes(hashlib.blake2b(
+        url.encode('utf-8', 'surrogatepass'),
+        digest_size=URL_DIGEST_SIZE).digest(), 'little')
+
+
+def split_byte_ranges(filepath, n):
+    """Split input-file into n byte-ranges of (nearly) equal size.
+
+       Ranges are not aligned to lines: InputParser assigns every line to
+       the range its first byte is in.
+
+       Args:
+           filepath (str): valid path to input-file.
+           n (int): number of ranges.
+
+       Returns:
+           List(Tuple(int, int)): start / end offset of each range.
+
+    """
+    size = os.path.getsize(filepath)
+    bounds = [size * i // n for i in range(n + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
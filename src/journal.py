@@ -0,0 +1,172 @@
+"""
+This module provides the download-journal used to resume interrupted runs.
+"""
+
+import json
+import os
+import threading
+
+# Journal-file within the output-directory
+JOURNAL_FILENAME = '.download-journal.jsonl'
+
+# Suffix of files being downloaded (renamed to the target-filename when done)
+PART_SUFFIX = '.part'
+
+
+class DownloadJournal():
+    """This class records the state of every download in the output-directory.
+
+    One JSON-object per line (append-only) with keys:
+
+    - file: target-filename
+    - url: URL downloaded
+    - state: "partial" (being written to "<file>.part") or "done"
+    - etag / last_modified: validators of the response (or null)
+    - size: expected size in bytes (or null)
+    - resumable: part-file can be continued from its size (false e.g. for
+      preallocated part-files)
+
+    The latest line per file wins. A line cut off by a crash is ignored.
+    Without resume the journal is started empty (one left by an interrupted
+    run is replaced, see replaced); with resume its entries are loaded (and
+    compacted to one line per file).
+
+    Entries are only kept in memory with resume: those loaded and the
+    downloads in progress (dropped when done). Without resume the journal is
+    only written, so memory stays flat for huge batches.
+
+    Several processes may append to the same journal (sharded runs): one
+    opens it with compact (e.g. the coordinator), the others without.
+
+    Thread-safe. Expected usage: init once; record per download; close at
+    the end.
+
+    """
+    def __init__(self, out_dir, resume=False, compact=True):
+        """Init with output-directory and (optional) resume-flag and
+           compact-flag.
+
+           Args:
+               out_dir (str): path to output-directory.
+               resume (bool, optional): load entries of a previous run
+                                        (default: False).
+               compact (bool, optional): rewrite the journal-file with the
+                                         entries loaded (default: True);
+                                         otherwise only append to it.
+
+           Attributes:
+               path (str): path of journal-file.
+               resume (bool): entries of previous run were loaded.
+               replaced (bool): a journal of an interrupted run was replaced
+                                (compact without resume).
+
+           Raises:
+               OSError: If the journal-file can not be written.
+
+        """
+        self.path = os.path.join(out_dir, JOURNAL_FILENAME)
+        self.resume = resume
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        if resume:
+            self._load()
+        self.replaced = bool(compact and not resume and
+                             os.path.isfile(self.path) and
+                             os.path.getsize(self.path))
+
+        # (Re)write compacted journal atomically; keep appending afterwards
+        if compact:
+            with open(self.path + '.tmp', 'w') as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(entry) + '\n')
+            os.replace(self.path + '.tmp', self.path)
+        self._file = open(self.path, 'a')
+
+    def _load(self):
+        """Read entries of a previous run (if any).
+
+        """
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self._entries[entry['file']] = entry
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+
+    def _write(self, entry):
+        """Append an entry and flush it to the OS.
+
+        """
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+
+    def get(self, name):
+        """Latest entry of a target-filename (resume only).
+
+           Args:
+               name (str): target-filename.
+
+           Returns:
+               dict: entry or None.
+
+        """
+        with self._lock:
+            return self._entries.get(name)
+
+    def items(self):
+        """All (target-filename, entry) pairs kept (resume only).
+
+           Returns:
+               List(Tuple(str, dict)): target-filename, entry.
+
+        """
+        with self._lock:
+            return list(self._entries.items())
+
+    def record(self, name, url, state, etag=None, last_modified=None,
+               size=None, resumable=True):
+        """Record the state of a download.
+
+           Args:
+               name (str): target-filename.
+               url (str): URL downloaded.
+               state (str): "partial" or "done".
+               etag (str, optional): ETag of the response.
+               last_modified (str, optional): Last-Modified of the response.
+               size (int, optional): expected size in bytes.
+               resumable (bool, optional): part-file can be continued from
+                                           its size (default: True).
+
+        """
+        entry = {'file': name, 'url': url, 'state': state, 'etag': etag,
+                 'last_modified': last_modified, 'size': size,
+                 'resumable': resumable}
+        with self._lock:
+            if self.resume:
+                # Only downloads in progress may be continued (by a retry)
+                if state == 'done':
+                    self._entries.pop(name, None)
+                else:
+                    self._entries[name] = entry
+            self._write(entry)
+
+    def close(self):
+        """Close journal-file (entries stay on disk).
+
+        """
+        self._file.close()
+
+    def remove(self):
+        """Close and delete journal-file (after a completed run).
+
+        """
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,137 @@
+"""
+This module provides line-access to (huge) input-files mapped into memory.
+"""
+
+import mmap
+import os
+
+# Bytes scanned at once when counting newlines or splitting lines
+CHUNK_SIZE = 1024 * 1024
+
+
+class MappedLines():
+    """This class reads the lines of a file through mmap.
+
+    Lines are located by scanning the mapped bytes for newlines and handed
+    out as bytes, to be decoded by the caller when consumed: the file is
+    never copied as a whole. Any byte-offset can be used as a starting point
+    (a line belongs to the range its first byte is in, see line_start), and
+    newlines are counted over the mapping without creating lines.
+
+    Expected usage: with MappedLines(path) as lines: iter_lines / count_lines.
+
+    """
+    def __init__(self, filepath):
+        """Map file read-only.
+
+           Args:
+               filepath (str): path to file.
+
+           Attributes:
+               size (int): file-size in bytes.
+
+           Raises:
+               OSError: If file can not be opened or mapped.
+
+        """
+        with open(filepath, 'rb') as f:
+            self.size = os.fstat(f.fileno()).st_size
+            # Empty files can not be mapped
+            self._map = b''
+            if self.size:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Unmap file.
+
+        """
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    def line_start(self, position):
+        """Offset of the first line starting at or after position.
+
+           Args:
+               position (int): byte-offset.
+
+           Returns:
+               int: offset (size if no line starts there).
+
+        """
+        if position <= 0:
+            return 0
+        if position >= self.size:
+            return self.size
+
+        newline = self._map.find(b'\n', position - 1)
+        return self.size if newline < 0 else newline + 1
+
+    def iter_lines(self, start=0, end=None):
+        """Lines starting within bytes start..end.
+
+           Args:
+               start (int, optional): first byte-offset (default: 0).
+               end (int, optional): byte-offset after the range (default:
+                                    end of file).
+
+           Yields:
+               Tuple(int, bytes): offset, line (without newline).
+
+        """
+        end = self.size if end is None else min(end, self.size)
+        position = self.line_start(start)
+        while position < end:
+            # Split whole lines in chunks of (about) CHUNK_SIZE
+            stop = self.line_start(min(position + CHUNK_SIZE, end))
+            lines = self._map[position:stop].split(b'\n')
+            if lines[-1] == b'':
+                lines.pop()  # after last newline
+            for line in lines:
+                yield position, line
+                position += len(line) + 1
+            position = stop
+
+    def count_newlines(self, start=0, end=None):
+        """Newlines within bytes start..end (in chunks of CHUNK_SIZE).
+
+           Returns:
+               int: newlines.
+
+        """
+        end = self.size if end is None else min(end, self.size)
+        count = 0
+        for chunk_start in range(start, end, CHUNK_SIZE):
+            count += self._map[chunk_start:min(
+                end, chunk_start + CHUNK_SIZE)].count(b'\n')
+        return count
+
+    def count_lines(self, start=0, end=None):
+        """Number of lines starting within bytes start..end (see
+           iter_lines), without creating them.
+
+           Returns:
+               int: lines.
+
+        """
+        first = self.line_start(start)
+        last = self.line_start(self.size if end is None else end)
+        count = self.count_newlines(first, last)
+        if last == self.size and last > first and (
+                self._map[last - 1:last] != b'\n'):
+            count += 1  # last line without newline
+        return count
+
+    def get_line_number(self, position):
+        """Line-number of the line starting at byte-position.
+
+           Returns:
+               int: line-number (starting at 1).
+
+        """
+        return self.count_newlines(0, position) + 1
@@ -0,0 +1,114 @@
+"""
+This module provides the metadata-store used for conditional re-downloads.
+"""
+
+import sqlite3
+import threading
+import time
+
+# Records are committed in batches of this size (and at close)
+_COMMIT_EVERY = 100
+
+
+class MetadataStore():
+    """This class keeps metadata of downloaded files in a sqlite-file.
+
+    Per URL: target-filename, ETag, Last-Modified, size and sha256-checksum
+    of the file written. Later runs use ETag / Last-Modified for conditional
+    requests (If-None-Match / If-Modified-Since) and skip the body on "304
+    Not Modified".
+
+    Thread-safe (one connection guarded by a lock). Several processes may
+    use the same file if they commit every record (commit_every=1), as a
+    pending batch blocks writers of other processes. Expected usage: init
+    once; get / record per download; close at the end.
+
+    """
+    def __init__(self, path, commit_every=_COMMIT_EVERY):
+        """Init with path to sqlite-file (created if missing) and (optional)
+           batch-size of commits.
+
+           Args:
+               path (str): path to sqlite-file.
+               commit_every (int, optional): records per commit.
+
+           Attributes:
+               path (str): original path given.
+
+           Raises:
+               sqlite3.Error: If the file can not be opened / created.
+
+        """
+        self.path = path
+        self._commit_every = commit_every
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS files ('
+                         'url TEXT PRIMARY KEY, file TEXT NOT NULL, '
+                         'etag TEXT, last_modified TEXT, size INTEGER, '
+                         'sha256 TEXT, fetched REAL)')
+        self._db.commit()
+
+    def get(self, url):
+        """Metadata of the last download of url.
+
+           Args:
+               url (str): URL.
+
+           Returns:
+               dict: keys file, etag, last_modified, size, sha256 or None.
+
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT file, etag, last_modified, size, sha256 FROM files '
+                'WHERE url = ?', (url,)).fetchone()
+
+        if row is None:
+            return None
+
+        return dict(zip(('file', 'etag', 'last_modified', 'size', 'sha256'),
+                        row))
+
+    def items(self):
+        """All (target-filename, url) pairs recorded.
+
+           Returns:
+               List(Tuple(str, str)): target-filename, url.
+
+        """
+        with self._lock:
+            return self._db.execute('SELECT file, url FROM files').fetchall()
+
+    def record(self, url, name, etag=None, last_modified=None, size=None,
+               sha256=None):
+        """Record metadata of a completed download.
+
+           Args:
+               url (str): URL downloaded.
+               name (str): target-filename.
+               etag (str, optional): ETag of the response.
+               last_modified (str, optional): Last-Modified of the response.
+               size (int, optional): size of file in bytes.
+               sha256 (str, optional): hex-digest of file.
+
+        """
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, name, etag, last_modified, size, sha256, time.time()))
+            self._uncommitted += 1
+            if self._uncommitted >= self._commit_every:
+                self._db.commit()
+                self._uncommitted = 0
+
+    def close(self):
+        """Commit pending records and close sqlite-file.
+
+        """
+        with self._lock:
+            self._db.commit()
+            self._db.close()
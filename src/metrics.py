@@ -0,0 +1,388 @@
+"""
+This module provides the metrics (timings, counters) of a run.
+"""
+
+import json
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+
+# Output-formats of Metrics.write
+METRICS_FORMATS = ('json', 'prometheus')
+
+# Upper bounds of the histogram-buckets (Prometheus-output)
+TIME_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+
+# Percentiles reported per histogram
+PERCENTILES = (50, 95, 99)
+
+# Prefix of all names in Prometheus-output
+_PROMETHEUS_PREFIX = 'downloader_'
+
+
+class Histogram():
+    """This class keeps all values observed for one metric.
+
+    Values are kept as doubles (8 bytes each), so percentiles are exact;
+    buckets are only counted for the Prometheus-output.
+
+    Not thread-safe (guarded by Metrics).
+
+    """
+    def __init__(self, buckets=TIME_BUCKETS):
+        """Init with (optional) upper bounds of the buckets.
+
+           Args:
+               buckets (Tuple(float)): ascending upper bounds.
+
+           Attributes:
+               buckets (Tuple(float)): ascending upper bounds.
+               values (array.array): values observed.
+
+        """
+        self.buckets = buckets
+        self.values = array('d')
+
+    def __len__(self):
+        return len(self.values)
+
+    def observe(self, value):
+        """Add a value.
+
+        """
+        self.values.append(value)
+
+    def percentile(self, p, ordered=None):
+        """Nearest-rank percentile of the values.
+
+           Args:
+               p (float): percentile (0 < p <= 100).
+               ordered (List(float), optional): values sorted already.
+
+           Returns:
+               float: value or None if nothing was observed.
+
+        """
+        if ordered is None:
+            ordered = sorted(self.values)
+        if not ordered:
+            return None
+
+        rank = max(1, -(-len(ordered) * p // 100))  # ceil
+        return ordered[int(rank) - 1]
+
+    def bucket_counts(self):
+        """Cumulative count of values per bucket.
+
+           Returns:
+               List(Tuple(float, int)): upper bound, values <= bound.
+
+        """
+        ordered = sorted(self.values)
+        counts = []
+        i = 0
+        for bound in self.buckets:
+            while i < len(ordered) and ordered[i] <= bound:
+                i += 1
+            counts.append((bound, i))
+        return counts
+
+    def summary(self):
+        """Count, sum, mean, min, max and percentiles of the values.
+
+           Returns:
+               dict: keys count, sum, mean, min, max, p50, p95, p99 (None
+                     without values).
+
+        """
+        ordered = sorted(self.values)
+        total = sum(ordered)
+        result = {'count': len(ordered), 'sum': total,
+                  'mean': total / len(ordered) if ordered else None,
+                  'min': ordered[0] if ordered else None,
+                  'max': ordered[-1] if ordered else None}
+        for p in PERCENTILES:
+            result['p{}'.format(p)] = self.percentile(p, ordered)
+        return result
+
+
+class Metrics():
+    """This class collects the metrics of a run.
+
+    - histograms: one value per event, e.g. "download_seconds" per download
+    - counters: running totals, e.g. "bytes_total"
+    - gauges: current and peak value, e.g. "in_flight"
+
+    Names carry their unit ("_seconds", "_bytes_per_second", "_total"). At
+    the end of a run, the metrics are printed (summary) and / or written as
+    JSON or Prometheus text-format (write). Metrics of several processes
+    (sharded runs) are pickled and merged.
+
+    Thread-safe. Expected usage: init once; pass to the components to be
+    measured; summary / write at the end.
+
+    """
+    def __init__(self):
+        """Init empty metrics; elapsed time starts now.
+
+        """
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}  # name -> [current, peak]
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._elapsed = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_lock']
+        state['_elapsed'] = self.elapsed()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, buckets=TIME_BUCKETS):
+        """Add a value to a histogram.
+
+           Args:
+               name (str): name of the histogram.
+               value (float): value observed.
+               buckets (Tuple(float), optional): bounds of a new histogram.
+
+        """
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name):
+        """Context-manager observing its duration in seconds.
+
+           Args:
+               name (str): name of the histogram.
+
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def add(self, name, value=1):
+        """Increase a counter.
+
+           Args:
+               name (str): name of the counter.
+               value (float, optional): increase (default: 1).
+
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def enter(self, name):
+        """Increase a gauge (e.g. a download started).
+
+        """
+        with self._lock:
+            gauge = self._gauges.setdefault(name, [0, 0])
+            gauge[0] += 1
+            gauge[1] = max(gauge[1], gauge[0])
+
+    def leave(self, name):
+        """Decrease a gauge (e.g. a download ended).
+
+        """
+        with self._lock:
+            self._gauges.setdefault(name, [0, 0])[0] -= 1
+
+    def get_counter(self, name):
+        """Current value of a counter (0 if never increased).
+
+        """
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def get_histogram(self, name):
+        """Histogram of name (or None if nothing was observed).
+
+        """
+        with self._lock:
+            return self._histograms.get(name)
+
+    def elapsed(self):
+        """Seconds since init (fixed once pickled).
+
+        """
+        if self._elapsed is not None:
+            return self._elapsed
+        return time.perf_counter() - self._start
+
+    def merge(self, other):
+        """Add the metrics of another run (e.g. a shard) to these.
+
+           Gauges are summed (the runs were concurrent); elapsed is the
+           longer of both.
+
+           Args:
+               other (Metrics): metrics to add.
+
+        """
+        with self._lock:
+            for name, histogram in other._histograms.items():
+                if name not in self._histograms:
+                    self._histograms[name] = Histogram(histogram.buckets)
+                self._histograms[name].values.extend(histogram.values)
+            for name, value in other._counters.items():
+                self._counters[name] = self._counters.get(name, 0) + value
+            for name, (current, peak) in other._gauges.items():
+                gauge = self._gauges.setdefault(name, [0, 0])
+                gauge[0] += current
+                gauge[1] += peak
+            if self._elapsed is not None or other._elapsed is not None:
+                self._elapsed = max(self.elapsed(), other.elapsed())
+
+    def to_dict(self):
+        """All metrics as plain dict (JSON-output).
+
+           Returns:
+               dict: keys elapsed_seconds, counters, gauges (current /
+                     peak) and histograms (see Histogram.summary).
+
+        """
+        with self._lock:
+            return {
+                'elapsed_seconds': self.elapsed(),
+                'counters': dict(self._counters),
+                'gauges': {name: {'current': current, 'peak': peak}
+                           for name, (current, peak) in self._gauges.items()},
+                'histograms': {name: histogram.summary()
+                               for name, histogram
+                               in self._histograms.items()}}
+
+    def to_prometheus(self):
+        """All metrics in Prometheus text-format.
+
+           Returns:
+               str: text (one sample per line).
+
+        """
+        lines = []
+        with self._lock:
+            name = _PROMETHEUS_PREFIX + 'elapsed_seconds'
+            lines += ['# TYPE {} gauge'.format(name),
+                      '{} {}'.format(name, self.elapsed())]
+
+            for counter, value in sorted(self._counters.items()):
+                name = _PROMETHEUS_PREFIX + counter
+                lines += ['# TYPE {} counter'.format(name),
+                          '{} {}'.format(name, value)]
+
+            for gauge, (current, peak) in sorted(self._gauges.items()):
+                name = _PROMETHEUS_PREFIX + gauge
+                lines += ['# TYPE {} gauge'.format(name),
+                          '{} {}'.format(name, current),
+                          '# TYPE {}_peak gauge'.format(name),
+                          '{}_peak {}'.format(name, peak)]
+
+            for histogram_name, histogram in sorted(self._histograms.items()):
+                name = _PROMETHEUS_PREFIX + histogram_name
+                lines.append('# TYPE {} histogram'.format(name))
+                for bound, count in histogram.bucket_counts():
+                    lines.append('{}_bucket{{le="{}"}} {}'
+                                 .format(name, bound, count))
+                lines += ['{}_bucket{{le="+Inf"}} {}'
+                          .format(name, len(histogram)),
+                          '{}_sum {}'.format(name, sum(histogram.values)),
+                          '{}_count {}'.format(name, len(histogram))]
+
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Human-readable summary: totals, rates and one line per histogram.
+
+           Returns:
+               str: text (several lines).
+
+        """
+        data = self.to_dict()
+        elapsed = data['elapsed_seconds']
+        counters = data['counters']
+        downloads = counters.get('downloads_total', 0)
+        size = counters.get('bytes_total', 0)
+        lines = ['Metrics: {:.2f}s, {} download(s), {:.1f} MB, '
+                 '{:.1f} files/s, {:.2f} MB/s'
+                 .format(elapsed, downloads, size / 1e6,
+                         downloads / elapsed if elapsed else 0.0,
+                         size / 1e6 / elapsed if elapsed else 0.0)]
+
+        for name, value in sorted(counters.items()):
+            lines.append('  {:<32} {:g}'.format(name, value))
+        for name, gauge in sorted(data['gauges'].items()):
+            lines.append('  {:<32} {} (peak {})'
+                         .format(name, gauge['current'], gauge['peak']))
+
+        columns = ('count', 'mean', 'p50', 'p95', 'p99', 'max')
+        lines.append('  {:<32}'.format('histogram') +
+                     ''.join('{:>11}'.format(column) for column in columns))
+        for name, summary in sorted(data['histograms'].items()):
+            lines.append(
+                '  {:<32}{:>11}'.format(name, summary['count']) +
+                ''.join('{:>11.4g}'.format(summary[column])
+                        for column in columns[1:]))
+
+        return '\n'.join(lines)
+
+    def write(self, path, fmt='json'):
+        """Write all metrics to a file.
+
+           Args:
+               path (str): path of the file (overwritten).
+               fmt (str, optional): one of METRICS_FORMATS (default: json).
+
+           Raises:
+               ValueError: If fmt is unknown.
+               OSError: If the file can not be written.
+
+        """
+        if fmt not in METRICS_FORMATS:
+            raise ValueError('Unknown metrics-format "{}"'.format(fmt))
+
+        if fmt == 'json':
+            text = json.dumps(self.to_dict(), indent=2, sort_keys=True) + '\n'
+        else:
+            text = self.to_prometheus()
+
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+def timed_iter(iterable, metrics, name):
+    """Yield from iterable, adding the time spent in it (not in the consumer)
+       to a counter.
+
+       Args:
+           iterable (iterable): e.g. a generator reading a file.
+           metrics (Metrics): metrics to add to.
+           name (str): name of the counter (seconds).
+
+       Yields:
+           items of iterable.
+
+    """
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            metrics.add(name, time.perf_counter() - start)
+            return
+        metrics.add(name, time.perf_counter() - start)
+        yield item
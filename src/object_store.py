@@ -0,0 +1,95 @@
+"""
+This module provides the content-addressed storage of downloaded files.
+"""
+
+import os
+
+# Directory of the objects within the output-directory
+OBJECTS_DIRNAME = '.objects'
+
+# Ways to link a target-filename to its object
+LINK_MODES = ('hardlink', 'symlink')
+
+
+class ObjectStore():
+    """This class keeps every distinct file-content once, named by its
+       sha256-checksum ("<out_dir>/.objects/ab/abcdef...").
+
+    Target-filenames are hardlinks or (relative) symlinks to their object, so
+    byte-identical files of different URLs take disk-space only once.
+    Objects are never modified (a changed file gets a new object), so links
+    stay valid; objects no longer linked are not removed.
+
+    Thread-safe (objects with the same checksum have the same content, so
+    concurrent stores of it are harmless). Expected usage: init once; store
+    per completed download.
+
+    """
+    def __init__(self, out_dir, link='hardlink'):
+        """Init with output-directory and (optional) link-mode.
+
+           Args:
+               out_dir (str): path to output-directory.
+               link (str, optional): one of LINK_MODES (default: hardlink).
+
+           Attributes:
+               path (str): path of the objects-directory.
+               link (str): link-mode.
+
+           Raises:
+               ValueError: If link is unknown.
+
+        """
+        if link not in LINK_MODES:
+            raise ValueError('Unknown link-mode "{}"'.format(link))
+
+        self.path = os.path.join(out_dir, OBJECTS_DIRNAME)
+        self.link = link
+
+    def get_path(self, digest):
+        """Path of the object with a checksum.
+
+           Args:
+               digest (str): hex-digest (sha256).
+
+           Returns:
+               str: path (below path).
+
+        """
+        return os.path.join(self.path, digest[:2], digest)
+
+    def store(self, part_path, digest, target_path):
+        """Move a completed file into the store (dropped if its content is
+           stored already) and link target_path to it (replacing
+           target_path).
+
+           Args:
+               part_path (str): completed file (gone afterwards).
+               digest (str): hex-digest (sha256) of part_path.
+               target_path (str): path to link.
+
+           Returns:
+               bool: True (new object) / False (content stored already).
+
+           Raises:
+               OSError: If moving or linking fails.
+
+        """
+        object_path = self.get_path(digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+
+        new = not os.path.isfile(object_path)
+        if new:
+            os.replace(part_path, object_path)
+        else:
+            os.remove(part_path)
+
+        # Link under a temporary name, then replace atomically
+        if self.link == 'hardlink':
+            os.link(object_path, part_path)
+        else:
+            os.symlink(os.path.relpath(object_path,
+                                       os.path.dirname(target_path)),
+                       part_path)
+        os.replace(part_path, target_path)
+        return new
@@ -0,0 +1,201 @@
+"""
+This module provides an in-memory index of the output-directory.
+"""
+
+import os
+import threading
+from src.exceptions import UtilsFileDoesExistError
+
+# Allowed collision-policies (see OutputIndex.claim)
+COLLISION_POLICIES = ('fail', 'skip', 'rename')
+
+
+class OutputIndex():
+    """This class keeps the names within the output-directory in memory.
+
+    The directory is listed once (os.scandir) at init. Afterwards every
+    filename used by the batch is claimed (InputParser) or added (Downloader),
+    which gives constant-time checks for both existing files and duplicates
+    within the batch.
+
+    On collisions the policy decides:
+
+    - fail: raise UtilsFileDoesExistError
+    - skip: don't use this filename (URL is not downloaded)
+    - rename: use "<name>-<n><ext>" with the smallest free n
+
+    Names owned by a URL (files of an interrupted run, see DownloadJournal)
+    are no collision when claimed once by the same URL.
+
+    Several processes working on the same output-directory (sharded runs)
+    share their claims through a process-shared dict: a name is only reserved
+    if no other process reserved it before. A name reserved by another
+    process for the same URL (URL given twice) is skipped, whatever the
+    policy.
+
+    Thread-safe.
+
+    """
+    def __init__(self, out_dir, policy='fail', shared=None):
+        """Init with output-directory and (optional) collision-policy and
+           process-shared claims.
+
+           Args:
+               out_dir (str): path to output-directory.
+               policy (str, optional): one of COLLISION_POLICIES
+                                       (default: fail).
+               shared (optional): dict shared between processes (e.g.
+                                  multiprocessing.Manager().dict()) recording
+                                  names claimed by any process (as
+                                  name -> (pid, url)).
+
+           Attributes:
+               out_dir (str): original output-directory given.
+               policy (str): collision-policy.
+
+           Raises:
+               ValueError: If policy is unknown.
+
+        """
+        if policy not in COLLISION_POLICIES:
+            raise ValueError('Unknown collision-policy "{}"'.format(policy))
+
+        self.out_dir = out_dir
+        self.policy = policy
+        self._names = set()
+        self._next_suffix = {}  # name -> next suffix to try when renaming
+        self._owned = {}  # name -> url allowed to claim it despite existing
+        self._shared = shared
+        self._lock = threading.Lock()
+
+        try:
+            with os.scandir(out_dir) as entries:
+                self._names.update(entry.name for entry in entries)
+        except OSError:
+            pass
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, name):
+        """Record a name as taken (e.g. after a file was written).
+
+           Args:
+               name (str): filename within out_dir.
+
+        """
+        with self._lock:
+            self._names.add(name)
+
+    def discard(self, name):
+        """Record a name as free again (e.g. after a file was removed).
+
+           Args:
+               name (str): filename within out_dir.
+
+        """
+        with self._lock:
+            self._names.discard(name)
+
+    def own(self, name, url):
+        """Allow url to claim name once, even if it is taken.
+
+           Args:
+               name (str): filename within out_dir.
+               url (str): URL owning the name.
+
+        """
+        with self._lock:
+            self._owned[name] = url
+
+    def is_owned(self, name, url):
+        """Check if name is owned by url (and not claimed yet).
+
+           Args:
+               name (str): filename within out_dir.
+               url (str): URL.
+
+           Returns:
+               Bool: True (Yes) / False (No).
+
+        """
+        return url is not None and self._owned.get(name) == url
+
+    def claim(self, name, url=None):
+        """Reserve a name for a later download, applying the policy on
+           collisions.
+
+           Args:
+               name (str): wanted filename within out_dir.
+               url (str, optional): URL to be saved under this name (checked
+                                    against names owned).
+
+           Returns:
+               str: name reserved (renamed with policy rename) or
+               None: if the name is taken and policy is skip (or reserved by
+                     another process for the same URL).
+
+           Raises:
+               UtilsFileDoesExistError: If the name is taken and policy is
+                                        fail.
+
+        """
+        with self._lock:
+            if (url is not None and self._owned.get(name) == url and
+                    self._claim_shared(name, url)):
+                del self._owned[name]
+                return name
+
+            if name not in self._names and self._claim_shared(name, url):
+                self._owned.pop(name, None)
+                return name
+
+            if self.policy == 'skip' or self._is_shared_duplicate(name, url):
+                return None
+
+            if self.policy == 'fail':
+                raise UtilsFileDoesExistError(
+                    'File "{}" does exist, but must not.'
+                    .format(os.path.join(self.out_dir, name)))
+
+            stem, ext = os.path.splitext(name)
+            suffix = self._next_suffix.get(name, 1)
+            renamed = '{}-{}{}'.format(stem, suffix, ext)
+            while (renamed in self._names or
+                   not self._claim_shared(renamed, url)):
+                suffix += 1
+                renamed = '{}-{}{}'.format(stem, suffix, ext)
+            self._next_suffix[name] = suffix + 1
+            return renamed
+
+    def _claim_shared(self, name, url):
+        """Reserve name in this index and (if given) in the process-shared
+           claims; lock must be held.
+
+           Returns:
+               Bool: True (reserved) / False (claimed by another process).
+
+        """
+        self._names.add(name)
+        if self._shared is None:
+            return True
+
+        pid, _ = self._shared.setdefault(name, (os.getpid(), url))
+        return pid == os.getpid()
+
+    def _is_shared_duplicate(self, name, url):
+        """Check if name is reserved by another process for url; lock must be
+           held.
+
+           Returns:
+               Bool: True (Yes) / False (No).
+
+        """
+        if self._shared is None or url is None:
+            return False
+
+        pid, claimed_url = self._shared.get(name, (None, None))
+        return pid != os.getpid() and claimed_url == url
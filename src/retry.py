@@ -0,0 +1,250 @@
+"""
+This module provides retry-scheduling of failed downloads (backoff with
+jitter and per-host circuit-breakers).
+"""
+
+import email.utils
+import heapq
+import http.client
+import itertools
+import random
+import socket
+import sys
+import time
+from src.exceptions import DownloaderHTTPError
+
+
+def get_retry_after(error):
+    """Classify a failed download.
+
+       Timeouts, connection-problems, "429 Too Many Requests" and 5xx are
+       retryable; everything else (4xx, filesystem-problems, ...) is not.
+       The exception-chain (cause / context) is searched, as downloaders wrap
+       the original error.
+
+       Args:
+           error (BaseException): error raised by a download.
+
+       Returns:
+           float: seconds to wait at least ("Retry-After", else 0) or
+           None: if not retryable.
+
+    """
+    while error is not None:
+        if isinstance(error, DownloaderHTTPError) and error.status:
+            if error.status == 429 or 500 <= error.status <= 599:
+                return error.retry_after or 0.0
+            return None
+        if isinstance(error, _get_transient_errors()):
+            return 0.0
+        error = error.__cause__ or error.__context__
+
+    return None
+
+
+def _get_transient_errors():
+    """Exception-types of transient network-problems.
+
+       asyncio.TimeoutError is only included if asyncio was imported (by the
+       async-engine); otherwise it can not have been raised.
+
+       Returns:
+           Tuple(type): exception-types.
+
+    """
+    errors = (socket.timeout, ConnectionError, http.client.IncompleteRead,
+              http.client.BadStatusLine)
+    asyncio = sys.modules.get('asyncio')
+    if asyncio is not None:
+        errors += (asyncio.TimeoutError,)
+    return errors
+
+
+def parse_retry_after(value):
+    """Parse a "Retry-After"-header (seconds or HTTP-date).
+
+       Args:
+           value (str): header-value (or None).
+
+       Returns:
+           float: seconds (not negative) or None if missing / malformed.
+
+    """
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        timestamp = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+    return max(0.0, timestamp - time.time())
+
+
+class RetryPolicy():
+    """This class decides on the delay before retrying a download.
+
+    Exponential backoff with full jitter: attempt n waits a random time
+    between 0 and min(backoff_max, backoff * 2 ** n) seconds, but at least
+    "Retry-After" (capped at backoff_max as well).
+
+    """
+    def __init__(self, retries=3, backoff=1.0, backoff_max=60.0):
+        """Init with limits.
+
+           Args:
+               retries (int, optional): retries per download (0: none).
+               backoff (float, optional): base-delay in seconds.
+               backoff_max (float, optional): maximum delay in seconds.
+
+           Attributes:
+               retries (int): retries per download.
+               backoff (float): base-delay in seconds.
+               backoff_max (float): maximum delay in seconds.
+
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+
+    def get_delay(self, attempt, retry_after=0.0):
+        """Delay before the next attempt.
+
+           Args:
+               attempt (int): attempts failed so far minus one (0: first).
+               retry_after (float, optional): seconds asked for by server.
+
+           Returns:
+               float: seconds or None if no retries are left.
+
+        """
+        if attempt >= self.retries:
+            return None
+
+        ceiling = min(self.backoff_max, self.backoff * 2 ** attempt)
+        return max(random.uniform(0, ceiling),
+                   min(retry_after or 0.0, self.backoff_max))
+
+
+class CircuitBreaker():
+    """This class stops sending requests to hosts failing repeatedly.
+
+    After threshold retryable failures in a row, a host is "open" for
+    cooldown seconds: no downloads are started for it. Afterwards a single
+    download is let through as probe; success closes the breaker, failure
+    opens it again.
+
+    Not thread-safe: to be used by the thread scheduling the downloads.
+
+    """
+    def __init__(self, threshold=5, cooldown=30.0):
+        """Init with limits.
+
+           Args:
+               threshold (int, optional): failures in a row opening a host
+                                          (0: never).
+               cooldown (float, optional): seconds a host stays open.
+
+           Attributes:
+               threshold (int): failures in a row opening a host.
+               cooldown (float): seconds a host stays open.
+
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = {}  # host -> failures in a row
+        self._open_until = {}  # host -> time.monotonic() of next probe
+
+    def wait_time(self, host, probe=True):
+        """Seconds until a download for host may be started.
+
+           Returns 0 for a probe once the cooldown is over (further calls wait
+           for the probe's outcome).
+
+           Args:
+               host (str): netloc.
+               probe (bool, optional): let the probe through (default); False
+                                       only tells the seconds left.
+
+           Returns:
+               float: seconds (0: start now).
+
+        """
+        open_until = self._open_until.get(host)
+        if open_until is None:
+            return 0.0
+
+        now = time.monotonic()
+        if now < open_until:
+            return open_until - now
+
+        if probe:
+            self._open_until[host] = now + self.cooldown
+        return 0.0
+
+    def success(self, host):
+        """Record a completed download (closes breaker).
+
+        """
+        self._failures.pop(host, None)
+        self._open_until.pop(host, None)
+
+    def failure(self, host):
+        """Record a retryable failure (may open breaker).
+
+        """
+        failures = self._failures.get(host, 0) + 1
+        self._failures[host] = failures
+        if self.threshold and failures >= self.threshold:
+            self._open_until[host] = time.monotonic() + self.cooldown
+
+
+class RetryQueue():
+    """This class keeps downloads waiting for their next attempt, ordered by
+       due-time.
+
+    Not thread-safe: to be used by the thread scheduling the downloads.
+
+    """
+    def __init__(self):
+        """Init empty.
+
+        """
+        self._heap = []
+        self._counter = itertools.count()  # keeps order of equal due-times
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, item, delay):
+        """Add item, due in delay seconds.
+
+        """
+        heapq.heappush(self._heap, (time.monotonic() + delay,
+                                    next(self._counter), item))
+
+    def pop_due(self):
+        """Remove and return the first due item.
+
+           Returns:
+               item or None if no item is due.
+
+        """
+        if self._heap and self._heap[0][0] <= time.monotonic():
+            return heapq.heappop(self._heap)[2]
+        return None
+
+    def next_due(self):
+        """Seconds until the next item is due.
+
+           Returns:
+               float: seconds (0: due) or None if empty.
+
+        """
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
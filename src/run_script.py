@@ -1,11 +1,26 @@
 """
 This module provides the basic entry to use the program.
+
+Modules only needed by some runs (multiprocessing for --shards, sqlite3 for
+METADATA_STORE, asyncio for ENGINE=async, the daemon for --daemon) are
+imported where they are used: small batches are dominated by
+interpreter-start and imports.
 """
 
+import itertools
+import sys
 from src.cli import CLI
-from src.config_parser import read_config
-from src.input_parser import InputParser
+from src.config_parser import (read_config, read_download_config,
+                               read_output_config)
+from src.input_parser import InputParser, split_byte_ranges
 from src.downloader import Downloader
+from src.exceptions import (ConfigParserParseErrorKey,
+                            RunScriptIncompleteError)
+from src.failure_report import FailureReport
+from src.journal import DownloadJournal
+from src.metrics import Metrics
+from src.object_store import ObjectStore
+from src.output_index import OutputIndex
 
 
 def run(argv):
@@ -13,24 +28,412 @@ def run(argv):
        do the expected work.
 
        This includes parsing the commandline, reading "config.ini", parsing
-       the input-file and actual downloading of all the files.
+       the input-file and actual downloading of all the files (or serving
+       URL-batches with --daemon).
 
        Called by ```run.py``` in base-dir.
 
     """
     # Parse arguments
     arg_parser = CLI()
-    input_path, verbose = arg_parser.parse(argv[1:])  # argv[0] = script-name
+    args = arg_parser.parse(argv[1:])  # argv[0] = script-name
 
-    # Read config-file
+    # Read config-file; commandline overrides config
     output_path = read_config()
+    output_settings = read_output_config()
+    download_settings = read_download_config()
+    if args.jobs is not None:
+        # Parallel downloads: worker-threads or (async) downloads in flight
+        download_settings['WORKERS'] = args.jobs
+        if download_settings['ENGINE'] == 'async':
+            download_settings['MAX_CONNECTIONS'] = args.jobs
+    if args.on_collision is not None:
+        output_settings['ON_COLLISION'] = args.on_collision
+    if args.refresh and not output_settings['METADATA_STORE']:
+        raise ConfigParserParseErrorKey(
+            '--refresh needs key "METADATA_STORE" in section "output"')
+
+    # Metrics are reported even if the run failed (without replacing its
+    # exception)
+    metrics = Metrics() if _wants_metrics(args) else None
+    try:
+        if args.daemon is not None:
+            _run_daemon(args, output_path, output_settings, download_settings,
+                        metrics)
+        elif args.shards > 1:
+            _run_sharded(args, output_path, output_settings,
+                         download_settings, metrics)
+        else:
+            _run_batch(args, output_path, output_settings, download_settings,
+                       metrics=metrics)
+    except BaseException:
+        if metrics is not None:
+            _report_metrics(args, metrics, failed=True)
+        raise
+    if metrics is not None:
+        _report_metrics(args, metrics)
+
+
+def _run_batch(args, output_path, output_settings, download_settings,
+               byte_range=None, shared=None, stop=None, metrics=None):
+    """Parse input-file (or its byte-range) and download all files.
+
+       Args:
+           args (CLIArgs): parsed commandline.
+           output_path (str): output-directory.
+           output_settings (dict): "output"-settings.
+           download_settings (dict): "download"-settings.
+           byte_range (Tuple(int, int), optional): part of the input-file
+               (sharded run; the journal is left to the coordinator).
+           shared (optional): claims of filenames shared between shards.
+           stop (multiprocessing.Event, optional): stops taking new URLs
+                                                   when set.
+           metrics (Metrics, optional): metrics of the run.
+
+    """
+    sharded = byte_range is not None
+
+    # Index of output-directory shared by input-parser and downloader
+    index = OutputIndex(output_path, output_settings['ON_COLLISION'], shared)
+
+    # Journal of downloads; on resume, files of the interrupted run may be
+    # claimed again by their URL
+    journal = _open_journal(output_path, args.resume, args.verbose,
+                            compact=not sharded)
+    if journal is not None and args.resume:
+        for name, entry in journal.items():
+            index.own(name, entry['url'])
+
+    # Metadata of previous runs; on refresh, their files may be claimed again
+    # by their URL (and are only downloaded again if changed)
+    metadata = None
+    if output_settings['METADATA_STORE']:
+        metadata = _open_metadata(output_settings, sharded)
+        if args.refresh:
+            for name, url in metadata.items():
+                index.own(name, url)
+
+    # Content-addressed storage: files are linked to their object by checksum
+    objects = None
+    if output_settings['CONTENT_ADDRESSED'] != 'off':
+        objects = ObjectStore(output_path,
+                              output_settings['CONTENT_ADDRESSED'])
+
+    # With keep-going, failed lines / downloads go to the report (started by
+    # the coordinator in sharded runs)
+    report = None
+    on_error = None
+    if args.keep_going:
+        report = FailureReport(args.failure_report, append=sharded)
+        on_error = report.add
+
+    # Create input-parser: lazy (checks while downloading) unless all URLs
+    # are to be checked up-front
+    parser = InputParser(args.filename, output_path, args.verbose,
+                         lazy=not args.validate_first,
+                         strict_filenames=args.strict_filenames, index=index,
+                         byte_range=byte_range, on_error=on_error,
+                         metrics=metrics)
+
+    downloader = _create_downloader(args, output_path, download_settings,
+                                    index, journal, metadata, metrics,
+                                    objects)
+
+    # All URLs known up-front: resolve their hosts in parallel first
+    if not parser.lazy:
+        downloader.prefetch(parser.iter_urls())
+
+    pairs = parser.iter_url_targetname_pairs(line_numbers=args.keep_going)
+    if stop is not None:
+        pairs = itertools.takewhile(lambda pair: not stop.is_set(), pairs)
+
+    # Use downloader; journal is only kept if the run did not complete
+    try:
+        downloader.download_many(pairs, on_error)
+        if report is not None and report.failures:
+            raise RunScriptIncompleteError(
+                '{} line(s) / download(s) failed, see "{}"'
+                .format(report.failures, report.path), report.failures)
+    except BaseException:
+        if journal is not None:
+            journal.close()
+        raise
+    else:
+        if journal is not None:
+            if sharded:
+                journal.close()
+            else:
+                journal.remove()
+    finally:
+        downloader.close()
+        if metadata is not None:
+            metadata.close()
+        if report is not None:
+            report.close()
+
+
+def _run_daemon(args, output_path, output_settings, download_settings,
+                metrics=None):
+    """Serve URL-batches with one long-lived downloader (see DownloadDaemon)
+       until stopped: SIGTERM / SIGINT on a Unix-socket, end of input on
+       stdin ("-"; responses on stdout, all other output on stderr).
+
+       Files of earlier batches count as existing (ON_COLLISION), as do
+       files of earlier runs; no journal is kept.
+
+    """
+    import contextlib
+    import signal
+    from src.daemon import DownloadDaemon
+
+    index = OutputIndex(output_path, output_settings['ON_COLLISION'])
+
+    # Metadata-store committed per record (used for long, maybe by other
+    # runs meanwhile)
+    metadata = None
+    if output_settings['METADATA_STORE']:
+        metadata = _open_metadata(output_settings, True)
+        if args.refresh:
+            for name, url in metadata.items():
+                index.own(name, url)
+
+    objects = None
+    if output_settings['CONTENT_ADDRESSED'] != 'off':
+        objects = ObjectStore(output_path,
+                              output_settings['CONTENT_ADDRESSED'])
+
+    downloader = _create_downloader(args, output_path, download_settings,
+                                    index, None, metadata, metrics, objects)
+    daemon = DownloadDaemon(downloader, output_path, args.verbose,
+                            lazy=not args.validate_first,
+                            strict_filenames=args.strict_filenames,
+                            index=index, metrics=metrics)
+    try:
+        if args.daemon == '-':
+            responses = sys.stdout.buffer
+            with contextlib.redirect_stdout(sys.stderr):
+                daemon.serve_stream(sys.stdin.buffer, responses)
+        else:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, lambda signum, frame: daemon.stop())
+            daemon.serve_unix(args.daemon)
+    finally:
+        daemon.close()
+        if metadata is not None:
+            metadata.close()
+
+
+def _create_downloader(args, output_path, download_settings, index, journal,
+                       metadata, metrics, objects):
+    """Create downloader (engine selected by config).
+
+       Returns:
+           Downloader / AsyncDownloader: downloader.
+
+    """
+    if download_settings['ENGINE'] == 'async':
+        from src.async_downloader import AsyncDownloader
+
+        return AsyncDownloader(output_path, args.verbose, download_settings,
+                               index, journal, metadata, metrics, objects)
+    return Downloader(output_path, args.verbose, download_settings, index,
+                      journal, metadata, metrics, objects)
+
+
+def _run_sharded(args, output_path, output_settings, download_settings,
+                 metrics=None):
+    """Split the input-file by byte-offset and run one process per part.
+
+       Filenames claimed by any shard are shared (no collisions between
+       shards). The first failing shard stops the others from taking new
+       URLs; its exception is raised after all shards ended (mapped to the
+       status-code by ```run.py``` as usual). With keep-going, the failures
+       of all shards are summed up instead. Metrics of all shards are merged
+       into metrics (if given).
+
+    """
+    # Journal and failure-report are (re)written once here; shards only
+    # append to them
+    journal = _open_journal(output_path, args.resume, args.verbose)
+    if output_settings['METADATA_STORE']:
+        _open_metadata(output_settings, False).close()  # create once
+    if args.keep_going:
+        FailureReport(args.failure_report).close()
+
+    import multiprocessing
 
-    # Create and use input-parser
-    parser = InputParser(input_path, output_path, verbose)
+    context = multiprocessing.get_context()
+    try:
+        with context.Manager() as manager:
+            error = _run_shards(context, manager.dict(), args, output_path,
+                                output_settings, download_settings, metrics)
+    except BaseException:
+        if journal is not None:
+            journal.close()
+        raise
 
-    # Create downloader
-    downloader = Downloader(output_path, verbose)
+    if journal is not None:
+        if error is None:
+            journal.remove()
+        else:
+            journal.close()
+
+    if error is not None:
+        raise error
+
+
+def _run_shards(context, shared, args, output_path, output_settings,
+                download_settings, metrics):
+    """Start one process per shard and wait for all of them.
+
+       Returns:
+           BaseException: exception of the first failing shard or None.
+
+    """
+    import queue
+
+    stop = context.Event()
+    results = context.Queue()
+    processes = {}
+    for shard, byte_range in enumerate(split_byte_ranges(args.filename,
+                                                         args.shards)):
+        processes[shard] = context.Process(
+            target=_run_shard,
+            args=(shard, results, args, output_path, output_settings,
+                  download_settings, byte_range, shared, stop))
+        processes[shard].start()
+
+    error = None
+    failures = 0
+    try:
+        while processes:
+            try:
+                shard, shard_error, shard_metrics = results.get(timeout=1.0)
+            except queue.Empty:
+                # A shard ending without result was killed
+                for shard, process in list(processes.items()):
+                    if process.exitcode is not None and results.empty():
+                        shard_error = RuntimeError(
+                            'Shard {} ended with exit-code {}'
+                            .format(shard, process.exitcode))
+                        shard_metrics = None
+                        break
+                else:
+                    continue
+
+            processes.pop(shard).join()
+            if metrics is not None and shard_metrics is not None:
+                metrics.merge(shard_metrics)
+            if isinstance(shard_error, RunScriptIncompleteError):
+                failures += shard_error.failures
+            elif shard_error is not None:
+                stop.set()
+                if error is None:
+                    error = shard_error
+    except BaseException:
+        stop.set()
+        for process in processes.values():
+            process.join()
+        raise
+
+    if error is None and failures:
+        error = RunScriptIncompleteError(
+            '{} line(s) / download(s) failed, see "{}"'
+            .format(failures, args.failure_report), failures)
+    return error
+
+
+def _run_shard(shard, results, *batch_args):
+    """Entry of a shard-process: run _run_batch and report its outcome as
+       (shard, exception or None, metrics or None) to results.
+
+    """
+    import pickle
+
+    args, stop = batch_args[0], batch_args[-1]
+    metrics = Metrics() if _wants_metrics(args) else None
+    try:
+        _run_batch(*batch_args, metrics=metrics)
+    except BaseException as e:
+        if not isinstance(e, RunScriptIncompleteError):
+            stop.set()
+        try:
+            pickle.dumps(e)
+        except Exception:
+            e = RuntimeError('Shard {} failed: {!r}'.format(shard, e))
+        results.put((shard, e, metrics))
+    else:
+        results.put((shard, None, metrics))
+
+
+def _wants_metrics(args):
+    """Check if metrics are to be collected (printed or written).
+
+       Returns:
+           Bool: True (Yes) / False (No).
+
+    """
+    return args.stats or args.metrics is not None
+
+
+def _report_metrics(args, metrics, failed=False):
+    """Print metrics (--stats) and / or write them (--metrics).
+
+       The summary goes to stderr with --daemon - (stdout carries the
+       responses).
+
+       Args:
+           failed (bool, optional): run failed already: errors reporting
+                                    metrics are printed (to stderr) instead
+                                    of raised (default: False).
+
+    """
+    out = sys.stderr if args.daemon == '-' else sys.stdout
+    try:
+        if args.stats:
+            print(metrics.summary(), file=out)
+        if args.metrics is not None:
+            metrics.write(args.metrics, args.metrics_format)
+    except Exception as e:
+        if not failed:
+            raise
+        print('Metrics could not be reported: {}'.format(e), file=sys.stderr)
+
+
+def _open_journal(output_path, resume, verbose, compact=True):
+    """Open journal in output-directory.
+
+       Returns:
+           DownloadJournal: journal or None if it can not be written (no
+                            resume possible; output-directory problems are
+                            reported by the input-parser).
+
+    """
+    try:
+        journal = DownloadJournal(output_path, resume, compact)
+    except OSError:
+        if verbose:
+            print('Journal in "{}" could not be written'.format(output_path))
+        return None
+
+    if journal.replaced:
+        print('Warning: journal of an interrupted run in "{}" was discarded '
+              '(use --resume to continue a run)'.format(output_path),
+              file=sys.stderr)
+    return journal
+
+
+def _open_metadata(output_settings, shared):
+    """Open metadata-store (committing every record if shared by shards or
+       used by the daemon).
+
+       Returns:
+           MetadataStore: metadata-store.
+
+    """
+    from src.metadata_store import MetadataStore
 
-    # Use downloader
-    for url, filename in parser.get_url_targetname_pairs():
-        downloader.download(url, filename)
+    if shared:
+        return MetadataStore(output_settings['METADATA_STORE'],
+                             commit_every=1)
+    return MetadataStore(output_settings['METADATA_STORE'])
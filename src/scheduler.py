@@ -0,0 +1,232 @@
+"""
+This module provides per-host rate-limiting and the scheduling of downloads
+over hosts.
+"""
+
+import collections
+import heapq
+import itertools
+import time
+
+
+class RateLimiter():
+    """This class limits requests per host with token-buckets.
+
+    Each host (netloc) gets a bucket of burst tokens, refilled with rate
+    tokens per second; every download takes one token. A rate of 0 disables
+    limiting.
+
+    Not thread-safe: to be used by the thread scheduling the downloads.
+
+    """
+    def __init__(self, rate=0.0, burst=1):
+        """Init with rate and burst.
+
+           Args:
+               rate (float, optional): requests per second and host
+                                       (0: unlimited).
+               burst (int, optional): requests allowed at once per host.
+
+           Attributes:
+               rate (float): requests per second and host.
+               burst (int): requests allowed at once per host.
+
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._buckets = {}  # host -> [tokens, time.monotonic() of refill]
+
+    def _refill(self, host):
+        """Bucket of host with tokens added since the last refill.
+
+        """
+        now = time.monotonic()
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = [float(self.burst), now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) *
+                            self.rate)
+            bucket[1] = now
+        return bucket
+
+    def wait_time(self, host):
+        """Seconds until a token of host is available (none is taken).
+
+           Args:
+               host (str): netloc.
+
+           Returns:
+               float: seconds (0: a token is available now).
+
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        bucket = self._refill(host)
+        return 0.0 if bucket[0] >= 1 else (1 - bucket[0]) / self.rate
+
+    def take(self, host):
+        """Take a token of host if one is available.
+
+           Args:
+               host (str): netloc.
+
+           Returns:
+               float: 0 if a token was taken, else seconds until the next
+                      token is available.
+
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        bucket = self._refill(host)
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / self.rate
+
+    def reserve(self, host):
+        """Take the next token of host, even if it is not available yet.
+
+           Args:
+               host (str): netloc.
+
+           Returns:
+               float: seconds until the reserved token is available (0: now).
+
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        bucket = self._refill(host)
+        bucket[0] -= 1
+        return max(0.0, -bucket[0] / self.rate)
+
+
+class HostScheduler():
+    """This class queues downloads per host and hands them out interleaved
+       over hosts.
+
+    A host is ready if its rate-limiter has a token and its circuit-breaker
+    is not open. The breaker is only asked once a token is available, so a
+    probe it lets through is never held back by the limit. Ready hosts take
+    turns (round-robin), so downloads for other hosts go on while one host
+    waits for its limit.
+
+    Not thread-safe: to be used by the thread scheduling the downloads.
+
+    """
+    def __init__(self, limiter, breaker=None):
+        """Init with rate-limiter and (optional) circuit-breaker.
+
+           Args:
+               limiter (RateLimiter): per-host rate-limits.
+               breaker (CircuitBreaker, optional): per-host circuit-breaker.
+
+        """
+        self._limiter = limiter
+        self._breaker = breaker
+        self._queues = {}  # host -> deque of items
+        self._ready = []  # heap of (ready-time, counter, host)
+        self._counter = itertools.count()  # round-robin among equal times
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, host, item, first=False):
+        """Queue item for host.
+
+           Args:
+               host (str): netloc.
+               item: item to hand out later.
+               first (bool, optional): queue in front of the host's other
+                                       items (e.g. retries).
+
+        """
+        queue = self._queues.get(host)
+        if queue is None:
+            queue = self._queues[host] = collections.deque()
+            self._schedule(host, 0.0)
+
+        if first:
+            queue.appendleft(item)
+        else:
+            queue.append(item)
+        self._size += 1
+
+    def pop_ready(self):
+        """Remove and return an item of the next ready host.
+
+           Returns:
+               item or None if no host is ready.
+
+        """
+        while self._ready and self._ready[0][0] <= time.monotonic():
+            _, _, host = heapq.heappop(self._ready)
+            if not self._queues[host]:
+                # Emptied by pop_more
+                del self._queues[host]
+                continue
+
+            wait_time = self._limiter.wait_time(host)
+            if not wait_time and self._breaker is not None:
+                wait_time = self._breaker.wait_time(host)
+            if wait_time:
+                self._schedule(host, wait_time)
+                continue
+
+            self._limiter.take(host)
+            queue = self._queues[host]
+            item = queue.popleft()
+            self._size -= 1
+            if queue:
+                self._schedule(host, 0.0)
+            else:
+                del self._queues[host]
+            return item
+
+        return None
+
+    def pop_more(self, host, limit):
+        """Remove and return further items of host as long as it is ready
+           (e.g. to be batched with an item of host just handed out).
+
+           Args:
+               host (str): netloc.
+               limit (int): items at most.
+
+           Returns:
+               list: items (maybe empty).
+
+        """
+        queue = self._queues.get(host)
+        if (not queue or self._limiter.wait_time(host) or
+                (self._breaker is not None and
+                 self._breaker.wait_time(host))):
+            return []
+
+        items = []
+        while queue and len(items) < limit and not self._limiter.take(host):
+            items.append(queue.popleft())
+        self._size -= len(items)
+        return items
+
+    def next_ready(self):
+        """Seconds until the next host is ready.
+
+           Returns:
+               float: seconds (0: ready) or None if empty.
+
+        """
+        if not self._size:
+            return None
+        return max(0.0, self._ready[0][0] - time.monotonic())
+
+    def _schedule(self, host, delay):
+        """Mark host as ready in delay seconds.
+
+        """
+        heapq.heappush(self._ready, (time.monotonic() + delay,
+                                     next(self._counter), host))
@@ -3,6 +3,7 @@ This module provides URL-handling functionality as checking and inferring
 filenames.
 """
 
+import re
 from urllib.parse import urlsplit
 from os.path import basename
 from src.exceptions import (URLParsingError,
@@ -11,24 +12,38 @@ from src.exceptions import (URLParsingError,
                             UtilsFileNameValidError)
 from src.utils import assert_filename_valid
 
+# Schemes the downloaders speak (others fail when parsing, not downloading)
+URL_SCHEMES = ('http', 'https')
+
+# Plain URL (printable ASCII, no IPv6-brackets) with scheme of URL_SCHEMES,
+# netloc and path: split like urlsplit does, without calling it
+_PLAIN_URL = re.compile(r'[Hh][Tt][Tt][Pp][Ss]?://([!"$-.0->@-Z\\^-~]+)'
+                        r'(/[!"$->@-~]*)(?:[?#][!-~]*)?')
+
 
 class URLHandler():
     """This class is responsible for parsing, checking and preparing URLs for
        later downloading.
 
     """
-    def __init__(self, url, out_path):
-        """Init with a single URL and output-path.
+    def __init__(self, url, out_path, validator=None):
+        """Init with a single URL and output-path and (optional) validator.
 
            Args:
                url (str): valid URL to be downloaded.
                out_path (str): valid output-path (existing directory)
+               validator (FilenameValidator, optional): shared in-memory
+                   filename-checks for out_path; the filename is claimed
+                   in its index (default: probe-based
+                   assert_filename_valid).
 
            Attributes:
                url (str): original URL given.
                valid_url (str): parsed URL.
                out_path (str): original output-path given.
-               inferred_filename (str): target-filename obtained from URL.
+               validator (FilenameValidator): filename-checks or None.
+               inferred_filename (str): target-filename obtained from URL
+                                        (None if skipped on collision).
 
            Raises:
                URLParsingError: When URL parsing failed.
@@ -39,6 +54,7 @@ class URLHandler():
         self.url = url
         self.valid_url = True
         self.out_path = out_path
+        self.validator = validator
 
         self._url_split()
         self._url_get_filename()
@@ -54,6 +70,7 @@ class URLHandler():
             self.urlsplit_res = urlsplit(self.url)
             assert all([self.urlsplit_res.scheme, self.urlsplit_res.netloc,
                         self.urlsplit_res.path])
+            assert self.urlsplit_res.scheme in URL_SCHEMES
         except Exception as e:
             self.valid_url = False
             raise URLParsingError(
@@ -68,24 +85,121 @@ class URLHandler():
         """
         try:
             self.inferred_filename = basename(self.urlsplit_res.path).strip()
-            assert_filename_valid(self.inferred_filename, self.out_path)
-        except UtilsFileDoesExistError:
-            raise
-        except UtilsFileNameValidError:
-            raise URLInferFilenameError(
-                'Inferred filename "{}" from URL "{}" is not a valid filename'
-                .format(self.inferred_filename, self.url))
         except Exception as e:
             self.valid_url = False
             raise URLInferFilenameError(
                 'Could not infer filename from URL "{}"'.format(self.url))
 
+        self.inferred_filename = claim_filename(
+            self.url, self.inferred_filename, self.out_path, self.validator)
+
     def get_filename(self):
         """Public getter for results.
 
            Returns:
-               Tuple(str, str): url, target-filename (full-path).
+               str: target-filename (None if skipped on collision).
 
         """
         assert self.valid_url
         return self.inferred_filename
+
+
+def split_url(url):
+    """Split URL into netloc, path and inferred filename (minimal validation
+       as URLHandler: scheme of URL_SCHEMES, netloc and path are needed).
+
+       Plain URLs are matched by a precompiled regex; only unusual ones
+       (e.g. non-ASCII, IPv6-address) are split by urlsplit.
+
+       Args:
+           url (str): URL (stripped).
+
+       Returns:
+           Tuple(str, str, str): netloc, path, filename (not checked yet) or
+           None: if URL could not be parsed.
+
+    """
+    match = _PLAIN_URL.fullmatch(url)
+    if match is not None:
+        netloc, path = match.groups()
+        return netloc, path, path[path.rfind('/') + 1:]
+
+    try:
+        urlsplit_res = urlsplit(url)
+    except ValueError:
+        return None
+    if not (urlsplit_res.scheme in URL_SCHEMES and urlsplit_res.netloc and
+            urlsplit_res.path):
+        return None
+    return (urlsplit_res.netloc, urlsplit_res.path,
+            basename(urlsplit_res.path).strip())
+
+
+def split_urls(urls):
+    """Split many URLs at once (see split_url), e.g. a chunk of an
+       input-file.
+
+       Args:
+           urls (list(str)): URLs (stripped).
+
+       Returns:
+           Tuple(list(str), list(str), list(str), list(bool)): netloc, path,
+               filename and failure-mask per URL (True: could not be parsed;
+               its netloc, path and filename are None).
+
+    """
+    netlocs, paths, filenames, failed = [], [], [], []
+    match = _PLAIN_URL.fullmatch
+    for url in urls:
+        plain = match(url)
+        if plain is not None:
+            netloc, path = plain.groups()
+            filename = path[path.rfind('/') + 1:]
+        else:
+            parts = split_url(url)
+            netloc, path, filename = parts or (None, None, None)
+        netlocs.append(netloc)
+        paths.append(path)
+        filenames.append(filename)
+        failed.append(filename is None)
+    return netlocs, paths, filenames, failed
+
+
+def claim_filename(url, filename, out_path, validator=None):
+    """Check the filename inferred from URL and claim it (see URLHandler).
+
+       Args:
+           url (str): URL.
+           filename (str): filename as inferred by split_url (None: URL could
+                           not be parsed).
+           out_path (str): valid output-path (existing directory).
+           validator (FilenameValidator, optional): shared in-memory
+               filename-checks (default: probe-based assert_filename_valid).
+
+       Returns:
+           str: target-filename (None if skipped on collision).
+
+       Raises:
+           URLParsingError: When URL could not be parsed.
+           URLInferFilenameError: When filename is not valid.
+           UtilsFileDoesExistError: When filename collides (policy fail).
+
+    """
+    if filename is None:
+        raise URLParsingError(
+            'URL "{}" could not be parsed by urlsplit'.format(url))
+
+    try:
+        if validator is None:
+            assert_filename_valid(filename, out_path)
+            return filename
+        return validator.claim(filename, url)
+    except UtilsFileDoesExistError:
+        raise
+    except UtilsFileNameValidError:
+        raise URLInferFilenameError(
+            'Inferred filename "{}" from URL "{}" is not a valid filename'
+            .format(filename, url))
+    except Exception as e:
+        raise URLInferFilenameError(
+            'Could not infer filename from URL "{}"'.format(url))
@@ -0,0 +1,95 @@
+"""
+This module provides compact storage of checked URLs (with target-filename
+and line-number) for huge input-files.
+"""
+
+from array import array
+
+
+class URLTable():
+    """This class stores url / target-filename / line-number records in
+       a few flat buffers instead of objects per URL.
+
+    URLs are kept UTF-8-encoded back to back in one bytearray, indexed by
+    their end-offsets; line-numbers in an array. Target-filenames are kept
+    as str, as the output-index holds the same objects anyway. A record
+    takes the URL's length plus 24 bytes (end-offset, line-number and
+    filename-reference), instead of a str- and an int-object and three
+    list-slots (about 100 bytes more); URLs are decoded when read.
+
+    Not thread-safe. Expected usage: append while checking; iterate (or
+    index) afterwards.
+
+    """
+    __slots__ = ('_data', '_ends', '_filenames', '_line_numbers')
+
+    def __init__(self):
+        self._data = bytearray()
+        self._ends = array('Q')
+        self._filenames = []
+        self._line_numbers = array('Q')
+
+    def __len__(self):
+        return len(self._ends)
+
+    def __getitem__(self, i):
+        """Record at position i.
+
+           Returns:
+               Tuple(str, str, int): url, target-filename, line-number.
+
+           Raises:
+               IndexError: If i is out of range.
+
+        """
+        i = range(len(self._ends))[i]  # negative index / IndexError
+        start = self._ends[i - 1] if i else 0
+        return (self._data[start:self._ends[i]].decode('utf-8'),
+                self._filenames[i], self._line_numbers[i])
+
+    def __iter__(self):
+        """Yields:
+               Tuple(str, str, int): url, target-filename, line-number per
+                                     record (in order).
+
+        """
+        return zip(self.iter_urls(), self._filenames, self._line_numbers)
+
+    def append(self, url, target_filename, line_number):
+        """Add a record.
+
+           Args:
+               url (str): URL.
+               target_filename (str): target-filename of url.
+               line_number (int): line-number of url (>= 0).
+
+        """
+        self._data += url.encode('utf-8')
+        self._ends.append(len(self._data))
+        self._filenames.append(target_filename)
+        self._line_numbers.append(line_number)
+
+    def iter_urls(self):
+        """Yields:
+               str: URL per record (in order).
+
+        """
+        data = self._data
+        start = 0
+        for end in self._ends:
+            yield data[start:end].decode('utf-8')
+            start = end
+
+    @property
+    def filenames(self):
+        """Target-filenames of all records (not to be modified).
+
+        """
+        return self._filenames
+
+    @property
+    def line_numbers(self):
+        """Line-numbers of all records (array, not to be modified).
+
+        """
+        return self._line_numbers
@@ -3,9 +3,11 @@ This module provides basic utilities (IO-checks).
 """
 
 import os
+import re
 from src.exceptions import (UtilsFileDoesNotExistError,
                             UtilsFileDoesExistError,
                             UtilsFileNameValidError)
+from src.output_index import OutputIndex
 
 
 def is_filepath_valid(fp):
@@ -53,6 +55,27 @@ def assert_file_nonexisting(fp):
             'File "{}" does exist, but must not.'.format(fp))
 
 
+# Fallbacks if os.pathconf is not available / not answering
+_DEFAULT_NAME_MAX = 255
+_DEFAULT_PATH_MAX = 4096
+
+# Names (case-insensitive, with or without extension) reserved on Windows
+_WINDOWS_RESERVED_NAMES = re.compile(
+    r'^(CON|PRN|AUX|NUL|COM[1-9]|LPT[1-9])(\..*)?$', re.IGNORECASE)
+_WINDOWS_INVALID_CHARS = re.compile(r'[<>:"|?*\x00-\x1f]')
+
+
+def _pathconf(path, name, default):
+    """os.pathconf with fallback.
+
+    """
+    try:
+        value = os.pathconf(path, name)
+    except (AttributeError, ValueError, OSError):
+        return default
+    return value if value and value > 0 else default
+
+
 def assert_filename_valid(fn, out_dir):
     """Checks if a file with this name can be created in out_dir.
        This needs:
@@ -104,3 +127,166 @@ def assert_filename_valid(fn, out_dir):
         raise UtilsFileNameValidError(
             'File with name "{}" could not be created in dir "{}"'
             .format(fn, out_dir))
+
+
+class FilenameValidator():
+    """In-process counterpart of assert_filename_valid for a whole batch.
+
+    Instead of creating a probe-file per filename, limits are queried once
+    (os.pathconf) and the filename is checked in memory for:
+
+    - NUL-bytes, path-separators, "." / ".." and the empty name
+    - names reserved on Windows (on Windows only)
+    - length-limits of name and full path (in bytes)
+
+    Collisions are checked against an OutputIndex (single listing of
+    out_dir, updated by the batch). Write-permission on out_dir is checked
+    once at init, too.
+
+    With strict=True the probe-based assert_filename_valid is used instead
+    (timed as "probe_seconds" with metrics).
+
+    """
+    def __init__(self, out_dir, strict=False, index=None, metrics=None):
+        """Init with output-directory and (optional) strict-flag, index and
+           metrics.
+
+           Args:
+               out_dir (str): path to output-directory.
+               strict (bool, optional): use assert_filename_valid per
+                                        filename (default: False).
+               index (OutputIndex, optional): index of out_dir (default:
+                                              new index, policy fail).
+               metrics (Metrics, optional): metrics of the run.
+
+           Attributes:
+               out_dir (str): original output-directory given.
+               strict (bool): use assert_filename_valid per filename.
+               name_max (int): maximal filename-length in bytes.
+               path_max (int): maximal path-length in bytes.
+               writable (bool): files can be created in out_dir.
+               index (OutputIndex): index of out_dir.
+               metrics (Metrics): metrics of the run or None.
+
+        """
+        self.out_dir = out_dir
+        self.strict = strict
+        self.name_max = _pathconf(out_dir, 'PC_NAME_MAX', _DEFAULT_NAME_MAX)
+        self.path_max = _pathconf(out_dir, 'PC_PATH_MAX', _DEFAULT_PATH_MAX)
+        self.writable = (os.path.isdir(out_dir) and
+                         os.access(out_dir, os.W_OK | os.X_OK))
+        self.index = index if index is not None else OutputIndex(out_dir)
+        self.metrics = metrics
+        try:
+            # Bytes of out_dir and separator in front of every filename
+            self._dir_length = len(os.fsencode(os.path.join(out_dir, '')))
+        except UnicodeError:
+            self._dir_length = self.path_max  # no filename fits
+
+    def assert_valid(self, fn):
+        """Checks if a file with this name can be created in out_dir.
+
+           Args:
+               fn (str): filename to check.
+
+           Raises:
+               UtilsFileDoesExistError: If file already exists.
+               UtilsFileNameValidError: If filename appears to be invalid.
+
+        """
+        if self.strict:
+            self._probe(fn)
+            return
+
+        self._assert_valid_name(fn)
+
+        if fn in self.index:
+            raise UtilsFileDoesExistError(
+                'File "{}" does exist, but must not.'
+                .format(os.path.join(self.out_dir, fn)))
+
+    def claim(self, fn, url=None):
+        """Checks filename and reserves it in the index (collisions are
+           handled by the index's policy).
+
+           Args:
+               fn (str): filename to check.
+               url (str, optional): URL to be saved under fn (see
+                                    OutputIndex.own).
+
+           Returns:
+               str: filename to use (fn or renamed variant) or
+               None: if fn is taken and should be skipped.
+
+           Raises:
+               UtilsFileDoesExistError: If file already exists / is already
+                                        used by the batch (policy fail).
+               UtilsFileNameValidError: If filename appears to be invalid.
+
+        """
+        if not self.strict:
+            self._assert_valid_name(fn)
+
+        owned = self.index.is_owned(fn, url)
+        name = self.index.claim(fn, url)
+        if name is None:
+            return None
+
+        if self.strict and not owned:
+            self._probe(name)
+        elif name != fn:
+            self._assert_valid_name(name)
+
+        return name
+
+    def _probe(self, fn):
+        """Probe-based filename-check (assert_filename_valid), timed with
+           metrics.
+
+        """
+        if self.metrics is None:
+            assert_filename_valid(fn, self.out_dir)
+            return
+
+        with self.metrics.timer('probe_seconds'):
+            assert_filename_valid(fn, self.out_dir)
+
+    def _assert_valid_name(self, fn):
+        """In-memory filename-checks (without collision-check).
+
+           Raises:
+               UtilsFileNameValidError: If filename appears to be invalid.
+
+        """
+        if not self.writable or not self._is_valid_name(fn):
+            raise UtilsFileNameValidError(
+                'File with name "{}" could not be created in dir "{}"'
+                .format(fn, self.out_dir))
+
+    def _is_valid_name(self, fn):
+        """In-memory filename-checks (without collision-check).
+
+           Args:
+               fn (str): filename to check.
+
+           Returns:
+               Bool: True (valid) / False (invalid).
+
+        """
+        if fn in ('', '.', '..') or '\0' in fn or os.sep in fn:
+            return False
+        if os.altsep and os.altsep in fn:
+            return False
+
+        if os.name == 'nt':
+            if (_WINDOWS_RESERVED_NAMES.match(fn) or
+                    _WINDOWS_INVALID_CHARS.search(fn) or fn[-1] in ' .'):
+                return False
+
+        try:
+            name_length = len(os.fsencode(fn))
+        except UnicodeError:
+            return False
+
+        return (name_length <= self.name_max and
+                self._dir_length + name_length < self.path_max)
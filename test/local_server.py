@@ -0,0 +1,188 @@
+"""
+Local HTTP-server used by tests instead of remote storage.
+"""
+
+import gzip
+import hashlib
+import threading
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves the in-memory files of the owning LocalServer (keep-alive).
+
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append((self.path, dict(self.headers)))
+
+        with self.server.lock:
+            errors = self.server.errors.get(self.path)
+            status = errors.pop(0) if errors else None
+        if status is not None:
+            self.send_response(status)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        redirect = self.server.redirects.get(self.path)
+        if redirect is not None:
+            body = b'moved'
+            self.send_response(redirect[0])
+            self.send_header('Location', redirect[1])
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+
+        etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        byte_range = self.headers.get('Range', '')
+        if (byte_range.startswith('bytes=') and
+                self.headers.get('If-Range', etag) == etag):
+            start, end = byte_range[6:].split('-')
+            self.send_range(body, etag, int(start),
+                            int(end) + 1 if end else len(body))
+            return
+
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        if (self.server.compress and
+                'gzip' in self.headers.get('Accept-Encoding', '')):
+            self.send_header('Content-Encoding', 'gzip')
+            body = gzip.compress(body)
+        if self.server.chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for start in range(0, len(body), 1000):
+                chunk = body[start:start + 1000]
+                time.sleep(self.server.delay)
+                self.wfile.write('{:x}\r\n'.format(len(chunk)).encode())
+                self.wfile.write(chunk + b'\r\n')
+            self.wfile.write(b'0\r\n\r\n')
+        else:
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def send_range(self, body, etag, start, end):
+        """Send body[start:end] as 206 (or 416 if start is too large).
+
+        """
+        if start >= len(body):
+            self.send_error(416)
+            return
+
+        self.send_response(206)
+        self.send_header('ETag', etag)
+        end = min(end, len(body))
+        self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+            start, end - 1, len(body)))
+        self.send_header('Content-Length', str(end - start))
+        self.end_headers()
+        self.wfile.write(body[start:end])
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalServer():
+    """HTTP-server on localhost serving a dict of path -> bytes.
+
+       Expected usage: start in setUp, stop in tearDown.
+
+    """
+    def __init__(self, files, chunked=False, errors=None, compress=False,
+                 redirects=None, delay=0.0):
+        """Init with files to serve.
+
+           Args:
+               files (dict(str, bytes)): url-path (e.g. "/a.jpg") -> content.
+               chunked (bool, optional): use chunked transfer-encoding.
+               errors (dict(str, list(int)), optional): url-path -> statuses
+                   answered (in order) before the file is served.
+               compress (bool, optional): send complete files gzip-encoded
+                                          if the request accepts gzip.
+               redirects (dict(str, Tuple(int, str)), optional): url-path ->
+                   status and Location answered instead.
+               delay (float, optional): seconds waited before each chunk
+                                        (with chunked).
+
+        """
+        self.files = files
+        self.chunked = chunked
+        self.errors = errors or {}
+        self.compress = compress
+        self.redirects = redirects or {}
+        self.delay = delay
+        self.httpd = None
+
+    def start(self):
+        """Bind to a free port and serve in a background-thread.
+
+        """
+        self.httpd = _ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.httpd.files = self.files
+        self.httpd.chunked = self.chunked
+        self.httpd.errors = self.errors
+        self.httpd.compress = self.compress
+        self.httpd.redirects = self.redirects
+        self.httpd.delay = self.delay
+        self.httpd.connections = 0
+        self.httpd.requests = []
+        self.httpd.lock = threading.Lock()
+        thread = threading.Thread(target=self.httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        """Shutdown server.
+
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @property
+    def connections(self):
+        """Number of TCP-connections accepted so far.
+
+        """
+        return self.httpd.connections
+
+    @property
+    def requests(self):
+        """All requests so far as (url-path, headers).
+
+        """
+        return self.httpd.requests
+
+    def url(self, path):
+        """Get full URL for some url-path.
+
+        """
+        return 'http://127.0.0.1:{}{}'.format(self.httpd.server_port, path)
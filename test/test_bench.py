@@ -0,0 +1,106 @@
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.request import urlopen
+from urllib.error import HTTPError
+from bench.run import compare
+from bench.scenarios import BASE_DIR, DEFERRED_MODULES
+from bench.server import BenchServer
+
+
+class TestBenchServer(unittest.TestCase):
+    """Unit-testing for the stand-in server of the benchmarks.
+
+    """
+    def tearDown(self):
+        """Stop server.
+
+        """
+        self.server.stop()
+
+    def test_sizes(self):
+        """Files are served with the sizes of the profile (cycled); other
+           paths are not found.
+
+        """
+        self.server = BenchServer('small')
+        self.server.start()
+        with urlopen(self.server.url('/1.bin')) as response:
+            self.assertEqual(len(response.read()), self.server.sizes[1])
+        with urlopen(self.server.url('/4.bin')) as response:
+            self.assertEqual(len(response.read()), self.server.sizes[0])
+        with self.assertRaises(HTTPError):
+            urlopen(self.server.url('/a.jpg'))
+
+    def test_faults(self):
+        """Failing paths answer 503 once; bandwidth-cap slows down bodies.
+
+        """
+        self.server = BenchServer('tiny', bandwidth=1000, error_rate=1.0)
+        self.server.start()
+        with self.assertRaises(HTTPError) as context:
+            urlopen(self.server.url('/0.bin'))
+        self.assertEqual(context.exception.code, 503)
+
+        start = time.monotonic()
+        with urlopen(self.server.url('/0.bin')) as response:
+            self.assertEqual(len(response.read()), 100)
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+    def test_url_file(self):
+        """Input-file lists one URL per line; total size is returned.
+
+        """
+        self.server = BenchServer('small')
+        self.server.start()
+        with tempfile.TemporaryDirectory() as work_dir:
+            path = os.path.join(work_dir, 'urls.txt')
+            size = self.server.write_url_file(path, 5)
+            with open(path) as f:
+                urls = f.read().split()
+        self.assertEqual(urls[4], self.server.url('/4.bin'))
+        self.assertEqual(size, sum(self.server.sizes) + self.server.sizes[0])
+
+
+class TestCompare(unittest.TestCase):
+    """Unit-testing for the comparison against the baseline.
+
+    """
+    def test_compare(self):
+        """Only changes for the worse beyond the tolerance are reported.
+
+        """
+        baseline = {'pipeline/1000': {'files_per_second': 100.0,
+                                      'mb_per_second': 10.0,
+                                      'peak_rss_mb': 30.0, 'seconds': 10.0}}
+        results = {'pipeline/1000': {'files_per_second': 85.0,
+                                     'mb_per_second': 20.0,
+                                     'peak_rss_mb': 40.0, 'seconds': 5.0},
+                   'parse/1000': {'files_per_second': 1.0,
+                                  'mb_per_second': 0.0,
+                                  'peak_rss_mb': 1.0, 'seconds': 1.0}}
+        regressions = compare(results, baseline, 0.2)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith(
+            'pipeline/1000 peak_rss_mb'))
+
+
+class TestStartup(unittest.TestCase):
+    """Unit-testing for the startup-path of the program.
+
+    """
+    def test_deferred_imports(self):
+        """Importing the program does not import modules only needed by some
+           runs.
+
+        """
+        output = subprocess.run(
+            [sys.executable, '-c',
+             'import sys, run; print(" ".join(sorted(sys.modules)))'],
+            cwd=BASE_DIR, check=True, stdout=subprocess.PIPE).stdout
+        modules = set(output.decode().split())
+        for name in DEFERRED_MODULES:
+            self.assertNotIn(name, modules)
@@ -1,6 +1,6 @@
 import unittest
 import tempfile
-from src.exceptions import UtilsFileDoesNotExistError
+from src.exceptions import CLIParseError, UtilsFileDoesNotExistError
 from src.cli import CLI
 
 
@@ -62,3 +62,119 @@ class TestCLI(unittest.TestCase):
         with self.assertRaises(UtilsFileDoesNotExistError):
             parsed_args = arg_parser.parse(['-i', self.input_file.name + '1',
                                             '-v'])
+
+    def test_valid_jobs(self):
+        """Test valid input-file with number of parallel downloads.
+
+        """
+        arg_parser = CLI()
+        parsed_args = arg_parser.parse(['-i', self.input_file.name, '-j', '4'])
+        self.assertEqual(parsed_args.jobs, 4)
+
+        parsed_args = arg_parser.parse(['-i', self.input_file.name])
+        self.assertIsNone(parsed_args.jobs)
+
+    def test_invalid_jobs(self):
+        """Number of parallel downloads must be positive.
+
+        """
+        arg_parser = CLI()
+        with self.assertRaises(CLIParseError):
+            arg_parser.parse(['-i', self.input_file.name, '--jobs', '0'])
+
+    def test_validate_first(self):
+        """Up-front validation is off by default.
+
+        """
+        arg_parser = CLI()
+        parsed_args = arg_parser.parse(['-i', self.input_file.name])
+        self.assertFalse(parsed_args.validate_first)
+
+        parsed_args = arg_parser.parse(['-i', self.input_file.name,
+                                        '--validate-first'])
+        self.assertTrue(parsed_args.validate_first)
+
+    def test_on_collision(self):
+        """Collision-policy is optional and restricted to known policies.
+
+        """
+        arg_parser = CLI()
+        parsed_args = arg_parser.parse(['-i', self.input_file.name])
+        self.assertIsNone(parsed_args.on_collision)
+
+        parsed_args = arg_parser.parse(['-i', self.input_file.name,
+                                        '--on-collision', 'rename'])
+        self.assertEqual(parsed_args.on_collision, 'rename')
+
+        with self.assertRaises(CLIParseError):
+            arg_parser.parse(['-i', self.input_file.name,
+                              '--on-collision', 'overwrite'])
+
+    def test_shards(self):
+        """Number of shards defaults to 1 and must be positive.
+
+        """
+        arg_parser = CLI()
+        parsed_args = arg_parser.parse(['-i', self.input_file.name])
+        self.assertEqual(parsed_args.shards, 1)
+
+        parsed_args = arg_parser.parse(['-i', self.input_file.name,
+                                        '--shards', '4'])
+        self.assertEqual(parsed_args.shards, 4)
+
+        with self.assertRaises(CLIParseError):
+            arg_parser.parse(['-i', self.input_file.name, '--shards', '0'])
+
+    def test_keep_going(self):
+        """Keep-going is off by default; the failure-report has a default.
+
+        """
+        arg_parser = CLI()
+        parsed_args = arg_parser.parse(['-i', self.input_file.name])
+        self.assertFalse(parsed_args.keep_going)
+        self.assertEqual(parsed_args.failure_report, 'failures.jsonl')
+
+        parsed_args = arg_parser.parse(['-i', self.input_file.name,
+                                        '--keep-going',
+                                        '--failure-report', 'f.jsonl'])
+        self.assertTrue(parsed_args.keep_going)
+        self.assertEqual(parsed_args.failure_report, 'f.jsonl')
+
+    def test_metrics(self):
+        """Metrics are off by default; format is json or prometheus.
+
+        """
+        arg_parser = CLI()
+        parsed_args = arg_parser.parse(['-i', self.input_file.name])
+        self.assertFalse(parsed_args.stats)
+        self.assertIsNone(parsed_args.metrics)
+        self.assertEqual(parsed_args.metrics_format, 'json')
+
+        parsed_args = arg_parser.parse(['-i', self.input_file.name, '--stats',
+                                        '--metrics', 'm.prom',
+                                        '--metrics-format', 'prometheus'])
+        self.assertTrue(parsed_args.stats)
+        self.assertEqual(parsed_args.metrics, 'm.prom')
+        self.assertEqual(parsed_args.metrics_format, 'prometheus')
+
+        with self.assertRaises(CLIParseError):
+            arg_parser.parse(['-i', self.input_file.name,
+                              '--metrics-format', 'xml'])
+
+    def test_daemon(self):
+        """Daemon replaces the input-file; not combined with shards / resume.
+
+        """
+        arg_parser = CLI()
+        parsed_args = arg_parser.parse(['-i', self.input_file.name])
+        self.assertIsNone(parsed_args.daemon)
+
+        parsed_args = arg_parser.parse(['--daemon', 'downloader.sock'])
+        self.assertIsNone(parsed_args.filename)
+        self.assertEqual(parsed_args.daemon, 'downloader.sock')
+
+        for args in (['--daemon', '-', '-i', self.input_file.name],
+                     ['--daemon', '-', '--shards', '2'],
+                     ['--daemon', '-', '--resume'], []):
+            with self.assertRaises(CLIParseError):
+                arg_parser.parse(args)
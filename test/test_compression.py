@@ -0,0 +1,83 @@
+import unittest
+import gzip
+import hashlib
+import io
+import zlib
+from src.compression import (get_accept_encoding, get_decoder, is_identity,
+                             DecodingWriter)
+
+CONTENT = b'pseudocode ' * 1000
+
+
+def decode(encoded, coding, chunk_size=100):
+    """Write encoded in chunks through a DecodingWriter.
+
+       Returns:
+           Tuple(bytes, int, bytes): decoded content, bytes received,
+                                     checksum of the decoded content.
+
+    """
+    f = io.BytesIO()
+    checksum = hashlib.sha256()
+    writer = DecodingWriter(f, get_decoder(coding), checksum)
+    for start in range(0, len(encoded), chunk_size):
+        writer.write(memoryview(encoded)[start:start + chunk_size])
+    writer.close()
+    return f.getvalue(), writer.received, checksum.digest()
+
+
+class TestCompression(unittest.TestCase):
+    """Unit-testing for compression.
+
+    """
+    def test_accept_encoding(self):
+        """Identity without compression, gzip / deflate offered otherwise.
+
+        """
+        self.assertEqual(get_accept_encoding('off'), 'identity')
+        self.assertTrue(get_accept_encoding('decode')
+                        .startswith('gzip, deflate'))
+
+    def test_is_identity(self):
+        """Missing or identity Content-Encoding is not encoded.
+
+        """
+        self.assertTrue(is_identity(None))
+        self.assertTrue(is_identity(' Identity'))
+        self.assertFalse(is_identity('gzip'))
+        self.assertIsNone(get_decoder(None))
+
+    def test_gzip(self):
+        """Gzip-encoded content is decoded; checksum and received match.
+
+        """
+        encoded = gzip.compress(CONTENT)
+        content, received, digest = decode(encoded, 'gzip')
+        self.assertEqual(content, CONTENT)
+        self.assertEqual(received, len(encoded))
+        self.assertEqual(digest, hashlib.sha256(CONTENT).digest())
+
+    def test_deflate(self):
+        """Deflate is decoded zlib-wrapped as well as raw.
+
+        """
+        self.assertEqual(decode(zlib.compress(CONTENT), 'deflate')[0],
+                         CONTENT)
+        raw = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        self.assertEqual(decode(raw.compress(CONTENT) + raw.flush(),
+                                'deflate')[0], CONTENT)
+
+    def test_incomplete(self):
+        """Truncated encoded content fails on close.
+
+        """
+        with self.assertRaises(ValueError):
+            decode(gzip.compress(CONTENT)[:-20], 'gzip')
+
+    def test_unsupported(self):
+        """Unknown coding is rejected.
+
+        """
+        with self.assertRaises(ValueError):
+            get_decoder('compress')
+
@@ -1,14 +1,47 @@
 import unittest
+import os
 import tempfile
 from src.exceptions import (ConfigParserParseError,
                             ConfigParserParseErrorSection,
                             ConfigParserParseErrorKey,
                             UtilsFileDoesNotExistError)
-from src.config_parser import read_config
+from src.config_parser import (read_config, read_download_config,
+                               read_output_config, DOWNLOAD_DEFAULTS,
+                               DOWNLOAD_MINIMUMS, _load_config)
 
 VALID_CONFIG = b"""[output]
 TARGET_DIR=example_out"""
 
+VALID_CONFIG_DOWNLOAD = b"""[output]
+TARGET_DIR=example_out
+
+[download]
+WORKERS=8
+CHUNK_SIZE=4096
+PREALLOCATE=yes
+COMPRESSION=decode"""
+
+VALID_CONFIG_OUTPUT = b"""[output]
+TARGET_DIR=example_out
+ON_COLLISION=rename
+CONTENT_ADDRESSED=symlink"""
+
+INVALID_CONFIG_OUTPUT = b"""[output]
+TARGET_DIR=example_out
+ON_COLLISION=overwrite"""
+
+INVALID_CONFIG_DOWNLOAD = b"""[output]
+TARGET_DIR=example_out
+
+[download]
+WORKERS=many"""
+
+KEY_CONFIG_DOWNLOAD = """[output]
+TARGET_DIR=example_out
+
+[download]
+{}={}"""
+
 INVALID_CONFIG_A = b"""[input]
 TARGET_DIR=example_out"""
 
@@ -98,3 +131,98 @@ class TestConfigParserParsing(TestConfigParserBase):
         """
         with self.assertRaises(UtilsFileDoesNotExistError):
             config = read_config(self.config_file_valid_format.name + '1')
+
+
+class TestConfigParserDownload(unittest.TestCase):
+    """Unit-testing config_parser: optional download-section / output-keys
+
+    """
+    def setUp(self):
+        """Create tempfiles used as input.
+
+        """
+        self.config_files = {}
+        for name, content in [('without', VALID_CONFIG),
+                              ('valid', VALID_CONFIG_DOWNLOAD),
+                              ('invalid', INVALID_CONFIG_DOWNLOAD),
+                              ('valid_output', VALID_CONFIG_OUTPUT),
+                              ('invalid_output', INVALID_CONFIG_OUTPUT)]:
+            self.config_files[name] = tempfile.NamedTemporaryFile()
+            self.config_files[name].write(content)
+            self.config_files[name].seek(0)
+
+    def tearDown(self):
+        """Close and delete tempfiles.
+
+        """
+        for f in self.config_files.values():
+            f.close()
+
+    def test_missing_section(self):
+        """No download-section: defaults are used.
+
+        """
+        settings = read_download_config(self.config_files['without'].name)
+        self.assertEqual(settings, DOWNLOAD_DEFAULTS)
+
+    def test_valid_section(self):
+        """Download-section with typed value.
+
+        """
+        settings = read_download_config(self.config_files['valid'].name)
+        self.assertEqual(settings['WORKERS'], 8)
+        self.assertEqual(settings['CHUNK_SIZE'], 4096)
+        self.assertTrue(settings['PREALLOCATE'])
+        self.assertEqual(settings['COMPRESSION'], 'decode')
+
+    def test_cached(self):
+        """Config is parsed once per path until the file changes.
+
+        """
+        f = self.config_files['valid']
+        config = _load_config(f.name)
+        self.assertIs(_load_config(f.name), config)
+
+        f.seek(0, os.SEEK_END)
+        f.write(b'\nRETRIES=1\n')
+        f.flush()
+        self.assertIsNot(_load_config(f.name), config)
+        self.assertEqual(read_download_config(f.name)['RETRIES'], 1)
+
+    def test_invalid_value(self):
+        """Download-section with value of wrong type.
+
+        """
+        with self.assertRaises(ConfigParserParseError):
+            read_download_config(self.config_files['invalid'].name)
+
+    def test_below_minimum(self):
+        """Download-section with value below its minimum.
+
+        """
+        for key, minimum in DOWNLOAD_MINIMUMS.items():
+            with tempfile.NamedTemporaryFile() as f:
+                f.write(KEY_CONFIG_DOWNLOAD.format(key, minimum).encode())
+                f.flush()
+                self.assertEqual(read_download_config(f.name)[key], minimum)
+
+            with tempfile.NamedTemporaryFile() as f:
+                f.write(KEY_CONFIG_DOWNLOAD.format(key, minimum - 1).encode())
+                f.flush()
+                with self.assertRaises(ConfigParserParseError):
+                    read_download_config(f.name)
+
+    def test_output_keys(self):
+        """Optional output-keys: default, valid and invalid choice.
+
+        """
+        settings = read_output_config(self.config_files['without'].name)
+        self.assertEqual(settings['ON_COLLISION'], 'fail')
+        self.assertEqual(settings['CONTENT_ADDRESSED'], 'off')
+
+        settings = read_output_config(self.config_files['valid_output'].name)
+        self.assertEqual(settings['ON_COLLISION'], 'rename')
+        self.assertEqual(settings['CONTENT_ADDRESSED'], 'symlink')
+
+        with self.assertRaises(ConfigParserParseError):
+            read_output_config(self.config_files['invalid_output'].name)
@@ -0,0 +1,63 @@
+import unittest
+from urllib.parse import urlsplit
+from src.connection_pool import ConnectionPool
+
+KEY = ('http', 'example.com', 80)
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Unit-testing for ConnectionPool.
+
+       Connections are never connected: no network-activity.
+
+    """
+    def test_get_key(self):
+        """Default-ports are filled in; unsupported schemes are rejected.
+
+        """
+        self.assertEqual(
+            ConnectionPool.get_key(urlsplit('https://example.com/a.jpg')),
+            ('https', 'example.com', 443))
+        self.assertEqual(
+            ConnectionPool.get_key(urlsplit('http://example.com:8080/a')),
+            ('http', 'example.com', 8080))
+        with self.assertRaises(ValueError):
+            ConnectionPool.get_key(urlsplit('ftp://example.com/a.jpg'))
+
+    def test_reuse(self):
+        """Given back connection is reused.
+
+        """
+        pool = ConnectionPool()
+        conn, reused = pool.get(KEY)
+        self.assertFalse(reused)
+
+        pool.put(KEY, conn)
+        conn_again, reused = pool.get(KEY)
+        self.assertTrue(reused)
+        self.assertIs(conn_again, conn)
+
+    def test_idle_timeout(self):
+        """Connections idle for too long are not reused.
+
+        """
+        pool = ConnectionPool(idle_timeout=-1)
+        conn, _ = pool.get(KEY)
+        pool.put(KEY, conn)
+
+        conn_again, reused = pool.get(KEY)
+        self.assertFalse(reused)
+        self.assertIsNot(conn_again, conn)
+
+    def test_max_size(self):
+        """At most max_size idle connections are kept per host.
+
+        """
+        pool = ConnectionPool(max_size=2)
+        connections = [pool.new(KEY) for _ in range(3)]
+        for conn in connections:
+            pool.put(KEY, conn)
+
+        self.assertIs(pool.get(KEY)[0], connections[1])
+        self.assertIs(pool.get(KEY)[0], connections[0])
+        self.assertFalse(pool.get(KEY)[1])
@@ -0,0 +1,137 @@
+import unittest
+import io
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+from src.daemon import DownloadDaemon
+from src.downloader import Downloader
+from src.output_index import OutputIndex
+from test.local_server import LocalServer
+
+FILES = {'/a.jpg': b'a' * 1000, '/b.jpg': b'b' * 2000}
+
+
+class TestDownloadDaemon(unittest.TestCase):
+    """Unit-testing for DownloadDaemon against a local HTTP-server.
+
+    """
+    def setUp(self):
+        """Create temp-directory as output-dir, start local server and
+           daemon.
+
+        """
+        self.out_dir = tempfile.mkdtemp()
+        self.server = LocalServer(FILES)
+        self.server.start()
+        index = OutputIndex(self.out_dir)
+        self.daemon = DownloadDaemon(
+            Downloader(self.out_dir, index=index, settings={'RETRIES': 0}),
+            self.out_dir, index=index)
+
+    def tearDown(self):
+        """Close daemon, delete temp-directory and stop local server.
+
+        """
+        self.daemon.close()
+        shutil.rmtree(self.out_dir)
+        self.server.stop()
+
+    def test_handle(self):
+        """Batch reports downloaded, skipped and failed URLs by line.
+
+        """
+        url_a = self.server.url('/a.jpg')
+        response = self.daemon.handle({'id': 7, 'urls': [
+            url_a, 'no url', url_a, self.server.url('/missing.jpg')]})
+
+        self.assertEqual(response['id'], 7)
+        self.assertEqual(response['downloaded'],
+                         [{'line': 1, 'url': url_a, 'filename': 'a.jpg'}])
+        self.assertEqual(response['skipped'], [3])
+        self.assertEqual([(entry['line'], entry['error'])
+                          for entry in response['failed']],
+                         [(2, 'URLParsingError'),
+                          (4, 'DownloaderDownloadError')])
+        with open(os.path.join(self.out_dir, 'a.jpg'), 'rb') as f:
+            self.assertEqual(f.read(), FILES['/a.jpg'])
+
+    def test_batches_share_connections(self):
+        """Later batches reuse the connection of earlier ones; files of
+           earlier batches exist.
+
+        """
+        for path in ('/a.jpg', '/b.jpg'):
+            response = self.daemon.handle({'urls': [self.server.url(path)]})
+            self.assertEqual(len(response['downloaded']), 1)
+        self.assertEqual(self.server.connections, 1)
+
+        response = self.daemon.handle({'urls': [self.server.url('/a.jpg')]})
+        self.assertEqual(response['failed'][0]['error'],
+                         'UtilsFileDoesExistError')
+
+    def test_serve_stream(self):
+        """One response per request-line; malformed requests are answered
+           with an error.
+
+        """
+        requests = (json.dumps({'id': 1, 'urls': [self.server.url('/a.jpg')]})
+                    + '\n\nnot json\n' + json.dumps({'id': 2}) + '\n')
+        output = io.BytesIO()
+        self.daemon.serve_stream(io.BytesIO(requests.encode()), output)
+
+        responses = [json.loads(line)
+                     for line in output.getvalue().decode().splitlines()]
+        self.assertEqual(len(responses), 3)
+        self.assertEqual(len(responses[0]['downloaded']), 1)
+        self.assertIn('error', responses[1])
+        self.assertEqual(responses[2]['id'], 2)
+        self.assertIn('error', responses[2])
+
+    def test_serve_unix(self):
+        """Batches over a Unix-socket replacing a stale socket-file;
+           socket-file is removed on stop.
+
+        """
+        path = os.path.join(self.out_dir, 'daemon.sock')
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        thread = threading.Thread(target=self.daemon.serve_unix, args=(path,))
+        thread.start()
+        try:
+            while self.daemon._server is None or not os.path.exists(path):
+                thread.join(0.01)
+
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(path)
+            with client, client.makefile('rwb') as f:
+                for url_path in ('/a.jpg', '/b.jpg'):
+                    request = {'urls': [self.server.url(url_path)]}
+                    f.write(json.dumps(request).encode() + b'\n')
+                    f.flush()
+                    response = json.loads(f.readline().decode())
+                    self.assertEqual(len(response['downloaded']), 1)
+        finally:
+            self.daemon.stop()
+            thread.join()
+
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(sorted(os.listdir(self.out_dir)),
+                         ['a.jpg', 'b.jpg'])
+
+    def test_serve_unix_regular_file(self):
+        """Regular file at the socket-path is neither removed nor
+           replaced.
+
+        """
+        path = os.path.join(self.out_dir, 'config.ini')
+        with open(path, 'w') as f:
+            f.write('[DEFAULT]\n')
+
+        with self.assertRaisesRegex(OSError, 'no socket-file'):
+            self.daemon.serve_unix(path)
+        with open(path) as f:
+            self.assertEqual(f.read(), '[DEFAULT]\n')
@@ -0,0 +1,65 @@
+import unittest
+import threading
+import time
+from src.dns_cache import DNSCache, get_hosts
+
+
+class TestDNSCache(unittest.TestCase):
+    """Unit-testing for DNSCache (resolving localhost only).
+
+    """
+    def test_resolve_cached(self):
+        """Addresses are resolved once and reused until invalidated.
+
+        """
+        dns = DNSCache()
+        self.assertIsNone(dns.lookup('localhost', 80))
+
+        addresses = dns.resolve('localhost', 80)
+        self.assertEqual(addresses[0][4][1], 80)
+        self.assertIs(dns.lookup('localhost', 80), addresses)
+        self.assertIs(dns.resolve('localhost', 80), addresses)
+
+        dns.invalidate('localhost', 80)
+        self.assertIsNone(dns.lookup('localhost', 80))
+
+    def test_ttl(self):
+        """Addresses expire after ttl.
+
+        """
+        dns = DNSCache(ttl=0.05)
+        dns.resolve('localhost', 80)
+        time.sleep(0.1)
+        self.assertIsNone(dns.lookup('localhost', 80))
+
+    def test_concurrent(self):
+        """Concurrent lookups of a host share one resolution.
+
+        """
+        dns = DNSCache()
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(dns.resolve('localhost', 443)))
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(result) for result in results}), 1)
+
+    def test_prefetch(self):
+        """Distinct hosts are resolved; failures are skipped (not cached).
+
+        """
+        dns = DNSCache()
+        hosts = get_hosts(['http://localhost/a.jpg', 'http://localhost/b.jpg',
+                           'https://localhost:8443/c.jpg',
+                           'http://nonexistent.invalid/d.jpg',
+                           'ftp://localhost/e.jpg', 'no url'])
+        self.assertEqual(hosts, {('localhost', 80), ('localhost', 8443),
+                                 ('nonexistent.invalid', 80)})
+
+        self.assertEqual(dns.prefetch(hosts), 2)
+        self.assertIsNotNone(dns.lookup('localhost', 8443))
+        self.assertIsNone(dns.lookup('nonexistent.invalid', 80))
+        self.assertEqual(dns.prefetch(hosts), 0)
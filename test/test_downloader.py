@@ -1,9 +1,20 @@
 import unittest
 import tempfile
+import gzip
+import hashlib
+import json
 import os
 import shutil
+import socket
+import time
 from src.exceptions import DownloaderDownloadError
-from src.downloader import Downloader
+from src.async_downloader import AsyncDownloader
+from src.downloader import Downloader, MAX_REDIRECTS
+from src.journal import DownloadJournal, JOURNAL_FILENAME
+from src.metadata_store import MetadataStore
+from src.metrics import Metrics
+from src.object_store import ObjectStore
+from test.local_server import LocalServer
 
 EXISTING_DOWNLOADL_URL = ("https://storage.googleapis.com/"
                           "blueyonder_assignment/python-pseudocode.jpg")
@@ -11,6 +22,13 @@ NON_EXISTING_DOWNLOAD_URL = ("https://storage.googleapis.com/"
                              "blueyonder_assignment/NOFILE.nope")
 
 
+LOCAL_FILES = {'/{}.jpg'.format(i): bytes([i]) * (1000 + i)
+               for i in range(10)}
+
+# Fast retries for tests against the local server
+RETRY_SETTINGS = {'RETRIES': 2, 'BACKOFF': 0.01, 'BACKOFF_MAX': 0.05}
+
+
 def get_size(filename):
     """Get size of file in bytes.
 
@@ -78,3 +96,766 @@ class TestDownloader(unittest.TestCase):
         downloader = Downloader(self.valid_out_dir)
         with self.assertRaises(DownloaderDownloadError):
             downloader.download(NON_EXISTING_DOWNLOAD_URL, target_file)
+
+
+class LocalServerTestCase(unittest.TestCase):
+    """Base for tests against a local HTTP-server serving LOCAL_FILES.
+
+    """
+    def setUp(self):
+        """Create temp-directory as output-dir and start local server.
+
+        """
+        self.valid_out_dir = tempfile.mkdtemp()
+        self.server = LocalServer(dict(LOCAL_FILES, **{'/flaky.jpg': b'ok'}),
+                                  errors={'/503.jpg': [503] * 10,
+                                          '/flaky.jpg': [503, 500]})
+        self.server.start()
+
+    def tearDown(self):
+        """Delete temp-directory and stop local server.
+
+        """
+        shutil.rmtree(self.valid_out_dir)
+        self.server.stop()
+
+    def get_pairs(self):
+        """All local files as url / target-filename pairs.
+
+        """
+        return [(self.server.url(path), path[1:]) for path in LOCAL_FILES]
+
+    def count_requests(self, path):
+        """Number of requests for url-path so far.
+
+        """
+        return len([request for request in self.server.requests
+                    if request[0] == path])
+
+    def get_journal_state(self, name):
+        """State of target-filename recorded last in the journal-file.
+
+        """
+        with open(os.path.join(self.valid_out_dir, JOURNAL_FILENAME)) as f:
+            entries = [json.loads(line) for line in f]
+        return [entry for entry in entries if entry['file'] == name][-1][
+            'state']
+
+    def assert_all_downloaded(self):
+        """Check content of all downloaded files.
+
+        """
+        self.assert_downloaded(LOCAL_FILES)
+
+    def assert_metrics(self, metrics, histograms):
+        """Check metrics of a batch downloading all local files once.
+
+        """
+        self.assertEqual(metrics.get_counter('downloads_total'),
+                         len(LOCAL_FILES))
+        self.assertEqual(metrics.get_counter('bytes_total'),
+                         sum(map(len, LOCAL_FILES.values())))
+        for name in histograms:
+            self.assertIsNotNone(metrics.get_histogram(name), name)
+        self.assertEqual(metrics.to_dict()['gauges']['in_flight']['current'],
+                         0)
+
+    def assert_stored_once(self, downloader_class):
+        """Byte-identical files of different URLs share one object.
+
+        """
+        self.server.stop()
+        self.server = LocalServer({'/a.jpg': b'same', '/b.jpg': b'same',
+                                   '/c.jpg': b'other'})
+        self.server.start()
+
+        objects = ObjectStore(self.valid_out_dir)
+        downloader = downloader_class(self.valid_out_dir, objects=objects)
+        downloader.download_many([(self.server.url(path), path[1:])
+                                  for path in ('/a.jpg', '/b.jpg', '/c.jpg')])
+
+        paths = [os.path.join(self.valid_out_dir, name)
+                 for name in ('a.jpg', 'b.jpg', 'c.jpg')]
+        with open(paths[1], 'rb') as f:
+            self.assertEqual(f.read(), b'same')
+        self.assertTrue(os.path.samefile(paths[0], paths[1]))
+        self.assertFalse(os.path.samefile(paths[0], paths[2]))
+        self.assertEqual(os.path.realpath(paths[0]), paths[0])  # hardlink
+        self.assertEqual(os.stat(objects.get_path(
+            hashlib.sha256(b'same').hexdigest())).st_nlink, 3)
+
+    def assert_compressed(self, downloader_class, mode, chunked=False):
+        """Files are transferred gzip-encoded and written decoded (decode) or
+           as received (keep).
+
+        """
+        self.server.stop()
+        self.server = LocalServer(LOCAL_FILES, chunked=chunked, compress=True)
+        self.server.start()
+
+        metrics = Metrics()
+        downloader = downloader_class(self.valid_out_dir, metrics=metrics,
+                                      settings={'COMPRESSION': mode,
+                                                'CHUNK_SIZE': 100})
+        downloader.download_many(self.get_pairs())
+
+        self.assertIn('gzip', self.server.requests[0][1]['Accept-Encoding'])
+        self.assertLess(metrics.get_counter('bytes_total'),
+                        sum(map(len, LOCAL_FILES.values())))
+        if mode == 'decode':
+            self.assert_all_downloaded()
+        else:
+            for path, content in LOCAL_FILES.items():
+                with open(os.path.join(self.valid_out_dir, path[1:]),
+                          'rb') as f:
+                    self.assertEqual(gzip.decompress(f.read()), content)
+
+    def assert_dns_cached(self, downloader_class):
+        """Hosts are resolved once (prefetched) into the DNS-cache; without
+           DNS_TTL nothing is cached.
+
+        """
+        downloader = downloader_class(self.valid_out_dir)
+        pairs = self.get_pairs()
+        self.assertEqual(downloader.prefetch([url for url, _ in pairs]), 1)
+        addresses = downloader.dns.lookup('127.0.0.1',
+                                          self.server.httpd.server_port)
+        downloader.download_many(pairs)
+        downloader.close()
+        self.assert_all_downloaded()
+        self.assertIs(downloader.dns.lookup('127.0.0.1',
+                                            self.server.httpd.server_port),
+                      addresses)
+
+        downloader = downloader_class(self.valid_out_dir,
+                                      settings={'DNS_TTL': 0})
+        self.assertIsNone(downloader.dns)
+        self.assertEqual(downloader.prefetch([pairs[0][0]]), 0)
+
+    def assert_redirected(self, downloader_class, settings=None):
+        """Redirects (301 relative, 307 absolute) are followed; endless
+           ones fail after MAX_REDIRECTS.
+
+        """
+        self.server.redirects.update({
+            '/moved.jpg': (301, '/0.jpg'),
+            '/temporary.jpg': (307, self.server.url('/1.jpg')),
+            '/loop.jpg': (302, '/loop.jpg')})
+
+        downloader = downloader_class(self.valid_out_dir, settings=settings)
+        downloader.download_many([
+            (self.server.url('/moved.jpg'), 'moved.jpg'),
+            (self.server.url('/temporary.jpg'), 'temporary.jpg')])
+        for name, path in (('moved.jpg', '/0.jpg'),
+                           ('temporary.jpg', '/1.jpg')):
+            with open(os.path.join(self.valid_out_dir, name), 'rb') as f:
+                self.assertEqual(f.read(), LOCAL_FILES[path])
+
+        with self.assertRaises(DownloaderDownloadError):
+            downloader.download(self.server.url('/loop.jpg'), 'loop.jpg')
+        self.assertEqual(self.count_requests('/loop.jpg'), MAX_REDIRECTS + 1)
+
+    def assert_downloaded(self, paths):
+        """Check content of downloaded files of given server-paths.
+
+        """
+        for path in paths:
+            with open(os.path.join(self.valid_out_dir, path[1:]), 'rb') as f:
+                self.assertEqual(f.read(), LOCAL_FILES[path])
+
+
+class TestDownloaderLocal(LocalServerTestCase):
+    """Unit-testing for Downloader against a local HTTP-server.
+
+    """
+    def test_download_many_serial(self):
+        """Batch with a single worker.
+
+        """
+        downloader = Downloader(self.valid_out_dir)
+        downloader.download_many(self.get_pairs())
+        self.assert_all_downloaded()
+
+    def test_download_many_keep_alive(self):
+        """Serial batch reuses a single connection.
+
+        """
+        downloader = Downloader(self.valid_out_dir)
+        downloader.download_many(self.get_pairs())
+        downloader.close()
+        self.assert_all_downloaded()
+        self.assertEqual(self.server.connections, 1)
+
+    def test_download_reconnect_after_server_close(self):
+        """Pooled connection closed by server is replaced transparently.
+
+        """
+        downloader = Downloader(self.valid_out_dir)
+        pairs = self.get_pairs()
+        downloader.download(*pairs[0])
+
+        for conn, _ in downloader.pool._idle[('http', '127.0.0.1',
+                                              self.server.httpd.server_port)]:
+            conn.sock.shutdown(socket.SHUT_RDWR)
+
+        downloader.download_many(pairs[1:])
+        self.assert_all_downloaded()
+
+    def test_download_no_part_left(self):
+        """Completed download is renamed from its part-file.
+
+        """
+        downloader = Downloader(self.valid_out_dir)
+        downloader.download(*self.get_pairs()[0])
+        self.assertEqual(os.listdir(self.valid_out_dir), ['0.jpg'])
+
+    def test_download_small_chunks(self):
+        """Body is copied in many chunks through the reused buffer.
+
+        """
+        downloader = Downloader(self.valid_out_dir,
+                                settings={'CHUNK_SIZE': 7})
+        downloader.download_many(self.get_pairs())
+        self.assert_all_downloaded()
+
+    def test_download_preallocate(self):
+        """Preallocated part-file is recorded as not resumable.
+
+        """
+        journal = DownloadJournal(self.valid_out_dir)
+        downloader = Downloader(self.valid_out_dir, journal=journal,
+                                settings={'PREALLOCATE': True})
+        downloader.download(*self.get_pairs()[9])
+        journal.close()
+
+        self.assert_downloaded(['/9.jpg'])
+        self.assertEqual(self.get_journal_state('9.jpg'), 'done')
+
+    def test_resume_not_resumable(self):
+        """Part-file recorded as not resumable is restarted.
+
+        """
+        journal = DownloadJournal(self.valid_out_dir)
+        journal.record('9.jpg', self.server.url('/9.jpg'), 'partial',
+                       '"{}"'.format(
+                           hashlib.md5(LOCAL_FILES['/9.jpg']).hexdigest()),
+                       None, len(LOCAL_FILES['/9.jpg']), resumable=False)
+        journal.close()
+        with open(os.path.join(self.valid_out_dir, '9.jpg.part'), 'wb') as f:
+            f.write(b'\0' * len(LOCAL_FILES['/9.jpg']))
+
+        journal = DownloadJournal(self.valid_out_dir, resume=True)
+        downloader = Downloader(self.valid_out_dir, journal=journal)
+        downloader.download(self.server.url('/9.jpg'), '9.jpg')
+        journal.close()
+
+        self.assertNotIn('Range', self.server.requests[-1][1])
+        self.assert_downloaded(['/9.jpg'])
+
+    def test_download_segmented(self):
+        """Large file is downloaded in parallel byte-ranges.
+
+        """
+        journal = DownloadJournal(self.valid_out_dir)
+        downloader = Downloader(self.valid_out_dir, journal=journal,
+                                settings={'SEGMENTS': 3,
+                                          'SEGMENT_THRESHOLD': 1000})
+        downloader.download(*self.get_pairs()[9])
+        downloader.close()
+        journal.close()
+
+        self.assert_downloaded(['/9.jpg'])
+        self.assertEqual(self.get_journal_state('9.jpg'), 'done')
+        ranges = sorted(headers.get('Range', '')
+                        for _, headers in self.server.requests)
+        self.assertEqual(ranges, ['', 'bytes=336-671', 'bytes=672-1008'])
+
+    def test_download_segmented_below_threshold(self):
+        """Small file is downloaded with a single request.
+
+        """
+        downloader = Downloader(self.valid_out_dir,
+                                settings={'SEGMENTS': 3,
+                                          'SEGMENT_THRESHOLD': 2000})
+        downloader.download(*self.get_pairs()[9])
+        self.assert_downloaded(['/9.jpg'])
+        self.assertEqual(len(self.server.requests), 1)
+
+    def prepare_resume(self, etag, part_length):
+        """Simulate interrupted download of "/9.jpg" and return journal
+           opened for resume.
+
+        """
+        journal = DownloadJournal(self.valid_out_dir)
+        journal.record('9.jpg', self.server.url('/9.jpg'), 'partial', etag,
+                       None, len(LOCAL_FILES['/9.jpg']))
+        journal.close()
+
+        with open(os.path.join(self.valid_out_dir, '9.jpg.part'), 'wb') as f:
+            f.write(LOCAL_FILES['/9.jpg'][:part_length])
+
+        return DownloadJournal(self.valid_out_dir, resume=True)
+
+    def test_resume_partial(self):
+        """Partial download is continued with a Range-request.
+
+        """
+        etag = '"{}"'.format(hashlib.md5(LOCAL_FILES['/9.jpg']).hexdigest())
+        journal = self.prepare_resume(etag, 500)
+
+        downloader = Downloader(self.valid_out_dir, journal=journal)
+        downloader.download(self.server.url('/9.jpg'), '9.jpg')
+        journal.close()
+
+        self.assertEqual(self.server.requests[-1][1]['Range'], 'bytes=500-')
+        with open(os.path.join(self.valid_out_dir, '9.jpg'), 'rb') as f:
+            self.assertEqual(f.read(), LOCAL_FILES['/9.jpg'])
+        self.assertEqual(self.get_journal_state('9.jpg'), 'done')
+
+    def test_resume_changed(self):
+        """Partial download of a changed file is restarted.
+
+        """
+        journal = self.prepare_resume('"outdated"', 500)
+
+        downloader = Downloader(self.valid_out_dir, journal=journal)
+        downloader.download(self.server.url('/9.jpg'), '9.jpg')
+        journal.close()
+
+        with open(os.path.join(self.valid_out_dir, '9.jpg'), 'rb') as f:
+            self.assertEqual(f.read(), LOCAL_FILES['/9.jpg'])
+
+    def test_resume_complete_part(self):
+        """Part-file was complete, but not renamed yet.
+
+        """
+        etag = '"{}"'.format(hashlib.md5(LOCAL_FILES['/9.jpg']).hexdigest())
+        journal = self.prepare_resume(etag, len(LOCAL_FILES['/9.jpg']))
+
+        downloader = Downloader(self.valid_out_dir, journal=journal)
+        downloader.download(self.server.url('/9.jpg'), '9.jpg')
+        journal.close()
+
+        with open(os.path.join(self.valid_out_dir, '9.jpg'), 'rb') as f:
+            self.assertEqual(f.read(), LOCAL_FILES['/9.jpg'])
+
+    def test_resume_skip_done(self):
+        """Completed downloads of a previous run are skipped.
+
+        """
+        journal = DownloadJournal(self.valid_out_dir)
+        downloader = Downloader(self.valid_out_dir, journal=journal)
+        downloader.download_many(self.get_pairs())
+        journal.close()
+        n_requests = len(self.server.requests)
+
+        journal = DownloadJournal(self.valid_out_dir, resume=True)
+        downloader = Downloader(self.valid_out_dir, journal=journal)
+        downloader.download_many(self.get_pairs())
+        journal.close()
+
+        self.assertEqual(len(self.server.requests), n_requests)
+        self.assert_all_downloaded()
+
+    def download_with_metadata(self, url, target_filename):
+        """Download once using a metadata-store within out-dir.
+
+        """
+        metadata = MetadataStore(os.path.join(self.valid_out_dir,
+                                              'meta.sqlite'))
+        try:
+            Downloader(self.valid_out_dir, metadata=metadata).download(
+                url, target_filename)
+            return metadata.get(url)
+        finally:
+            metadata.close()
+
+    def test_refresh_not_modified(self):
+        """Unchanged file is requested conditionally and not downloaded.
+
+        """
+        url = self.server.url('/3.jpg')
+        entry = self.download_with_metadata(url, '3.jpg')
+        self.assertEqual(entry['sha256'],
+                         hashlib.sha256(LOCAL_FILES['/3.jpg']).hexdigest())
+
+        self.download_with_metadata(url, '3.jpg')
+        self.assertEqual(self.server.requests[-1][1]['If-None-Match'],
+                         entry['etag'])
+        with open(os.path.join(self.valid_out_dir, '3.jpg'), 'rb') as f:
+            self.assertEqual(f.read(), LOCAL_FILES['/3.jpg'])
+
+    def test_refresh_modified(self):
+        """Changed file is downloaded again.
+
+        """
+        url = self.server.url('/changing.jpg')
+        self.server.files['/changing.jpg'] = b'old'
+        self.addCleanup(self.server.files.pop, '/changing.jpg')
+        self.download_with_metadata(url, 'changing.jpg')
+
+        self.server.files['/changing.jpg'] = b'new content'
+        entry = self.download_with_metadata(url, 'changing.jpg')
+        self.assertEqual(entry['size'], len(b'new content'))
+        with open(os.path.join(self.valid_out_dir, 'changing.jpg'), 'rb') as f:
+            self.assertEqual(f.read(), b'new content')
+
+    def test_download_many_parallel(self):
+        """Batch with more files than workers; pairs given lazily.
+
+        """
+        downloader = Downloader(self.valid_out_dir, settings={'WORKERS': 3})
+        downloader.download_many(iter(self.get_pairs()))
+        self.assert_all_downloaded()
+
+    def test_download_many_parallel_failure(self):
+        """One missing file in a parallel batch.
+
+        """
+        pairs = self.get_pairs()
+        pairs.insert(5, (self.server.url('/missing.jpg'), 'missing.jpg'))
+
+        downloader = Downloader(self.valid_out_dir, settings={'WORKERS': 3})
+        with self.assertRaises(DownloaderDownloadError):
+            downloader.download_many(pairs)
+
+    def test_metrics(self):
+        """Timings per stage and totals are recorded with metrics.
+
+        """
+        metrics = Metrics()
+        downloader = Downloader(self.valid_out_dir, settings={'WORKERS': 3},
+                                metrics=metrics)
+        downloader.download_many(self.get_pairs())
+        self.assert_all_downloaded()
+        self.assert_metrics(metrics, ('dns_seconds', 'connect_seconds',
+                                      'ttfb_seconds', 'body_seconds',
+                                      'download_seconds'))
+        self.assertEqual(len(metrics.get_histogram('download_seconds')),
+                         len(LOCAL_FILES))
+
+    def test_content_addressed(self):
+        """Byte-identical files of different URLs are stored once.
+
+        """
+        self.assert_stored_once(Downloader)
+
+    def test_compression_decode(self):
+        """Gzip-encoded files are decoded while writing.
+
+        """
+        self.assert_compressed(Downloader, 'decode')
+
+    def test_dns_cache(self):
+        """Name-resolutions are shared by all connections.
+
+        """
+        self.assert_dns_cached(Downloader)
+
+    def test_compression_keep(self):
+        """Gzip-encoded files are written as received.
+
+        """
+        self.assert_compressed(Downloader, 'keep')
+
+    def test_compression_off(self):
+        """Files are requested as-is by default.
+
+        """
+        self.server.httpd.compress = True
+        downloader = Downloader(self.valid_out_dir)
+        downloader.download_many(self.get_pairs())
+        self.assert_all_downloaded()
+        self.assertEqual(self.server.requests[0][1]['Accept-Encoding'],
+                         'identity')
+
+    def test_download_many_pipelined(self):
+        """Serial batch with pipelining: all GETs over a single connection.
+
+        """
+        metrics = Metrics()
+        downloader = Downloader(self.valid_out_dir, settings={'PIPELINE': 4},
+                                metrics=metrics)
+        downloader.download_many(self.get_pairs())
+        downloader.close()
+        self.assert_all_downloaded()
+        self.assert_metrics(metrics, ('ttfb_seconds', 'download_seconds'))
+        self.assertEqual(metrics.get_counter('pipelined_total'),
+                         len(LOCAL_FILES))
+        self.assertEqual(self.server.connections, 1)
+
+    def test_download_many_pipelined_failures(self):
+        """Pipelined downloads failing are retried / reported; responses
+           after a server closing the connection are fetched again.
+
+        """
+        pairs = [pair + (i + 1,) for i, pair in enumerate(self.get_pairs())]
+        pairs.insert(2, (self.server.url('/flaky.jpg'), 'flaky.jpg', 98))
+        pairs.insert(5, (self.server.url('/missing.jpg'), 'missing.jpg', 99))
+
+        failures = []
+        downloader = Downloader(self.valid_out_dir, settings=dict(
+            RETRY_SETTINGS, PIPELINE=8))
+        downloader.download_many(pairs, lambda error, line_number, url:
+                                 failures.append((type(error), line_number,
+                                                  url)))
+        self.assert_all_downloaded()
+        self.assertEqual(get_size(os.path.join(self.valid_out_dir,
+                                               'flaky.jpg')), 2)
+        self.assertEqual(self.count_requests('/flaky.jpg'), 3)
+        self.assertEqual(failures, [(DownloaderDownloadError, 99,
+                                     self.server.url('/missing.jpg'))])
+
+    def test_redirect(self):
+        """Redirects are followed (on the pool of their target).
+
+        """
+        self.assert_redirected(Downloader)
+
+    def test_redirect_pipelined(self):
+        """Redirected pipelined downloads are followed one by one.
+
+        """
+        self.assert_redirected(Downloader, {'PIPELINE': 4})
+
+    def test_download_many_on_error(self):
+        """With on_error, failed downloads are reported and the batch goes on.
+
+        """
+        pairs = [pair + (i + 1,) for i, pair in enumerate(self.get_pairs())]
+        pairs.insert(5, (self.server.url('/missing.jpg'), 'missing.jpg', 99))
+
+        failures = []
+        downloader = Downloader(self.valid_out_dir, settings={'WORKERS': 3})
+        downloader.download_many(pairs, lambda error, line_number, url:
+                                 failures.append((type(error), line_number,
+                                                  url)))
+        self.assert_all_downloaded()
+        self.assertEqual(failures, [(DownloaderDownloadError, 99,
+                                     self.server.url('/missing.jpg'))])
+
+    def test_retry(self):
+        """Server-errors are retried after a backoff.
+
+        """
+        pairs = self.get_pairs()
+        pairs.insert(5, (self.server.url('/flaky.jpg'), 'flaky.jpg'))
+
+        downloader = Downloader(self.valid_out_dir, settings=dict(
+            RETRY_SETTINGS, WORKERS=3))
+        downloader.download_many(pairs)
+        self.assert_all_downloaded()
+        self.assertEqual(self.count_requests('/flaky.jpg'), 3)
+
+    def test_retry_exhausted(self):
+        """Download failing more often than RETRIES stops the batch.
+
+        """
+        pairs = self.get_pairs()
+        pairs.insert(5, (self.server.url('/503.jpg'), '503.jpg'))
+
+        downloader = Downloader(self.valid_out_dir, settings=RETRY_SETTINGS)
+        with self.assertRaises(DownloaderDownloadError):
+            downloader.download_many(pairs)
+        self.assertEqual(self.count_requests('/503.jpg'), 3)
+
+    def test_no_retry_client_error(self):
+        """Client-errors (4xx) are not retried.
+
+        """
+        downloader = Downloader(self.valid_out_dir, settings=RETRY_SETTINGS)
+        with self.assertRaises(DownloaderDownloadError):
+            downloader.download_many([(self.server.url('/missing.jpg'),
+                                       'missing.jpg')])
+        self.assertEqual(self.count_requests('/missing.jpg'), 1)
+
+    def test_circuit_breaker(self):
+        """Open circuit-breaker delays further downloads of the host.
+
+        """
+        downloader = Downloader(self.valid_out_dir, settings=dict(
+            RETRY_SETTINGS, BREAKER_THRESHOLD=2, BREAKER_COOLDOWN=0.3))
+        downloader.download_many([(self.server.url('/flaky.jpg'),
+                                   'flaky.jpg')])
+        self.assertIsNone(downloader.breaker._open_until.get(
+            '127.0.0.1:{}'.format(self.server.httpd.server_port)))
+
+        with self.assertRaises(DownloaderDownloadError):
+            downloader.download_many([(self.server.url('/503.jpg'),
+                                       '503.jpg')])
+        self.assertGreater(downloader.breaker.wait_time(
+            '127.0.0.1:{}'.format(self.server.httpd.server_port)), 0)
+
+    def test_rate_limit(self):
+        """Downloads of a host are spaced by RATE_LIMIT.
+
+        """
+        downloader = Downloader(self.valid_out_dir, settings={
+            'WORKERS': 4, 'RATE_LIMIT': 50.0})
+        start = time.monotonic()
+        downloader.download_many(self.get_pairs())
+        self.assert_all_downloaded()
+        self.assertGreaterEqual(time.monotonic() - start, 9 / 50.0)
+
+
+class TestAsyncDownloader(LocalServerTestCase):
+    """Unit-testing for AsyncDownloader against a local HTTP-server.
+
+    """
+    def test_download_many(self):
+        """Batch with tight global / per-host connection caps.
+
+        """
+        downloader = AsyncDownloader(self.valid_out_dir, settings={
+            'MAX_CONNECTIONS': 3, 'MAX_CONNECTIONS_PER_HOST': 2})
+        downloader.download_many(iter(self.get_pairs()))
+        self.assert_all_downloaded()
+
+    def test_download_many_small_chunks_preallocate(self):
+        """Batch with preallocated part-files, copied in small chunks.
+
+        """
+        downloader = AsyncDownloader(self.valid_out_dir, settings={
+            'CHUNK_SIZE': 7, 'PREALLOCATE': True})
+        downloader.download_many(iter(self.get_pairs()))
+        self.assert_all_downloaded()
+
+    def test_download_many_chunked(self):
+        """Batch with chunked transfer-encoding.
+
+        """
+        self.server.stop()
+        self.server = LocalServer(LOCAL_FILES, chunked=True)
+        self.server.start()
+
+        downloader = AsyncDownloader(self.valid_out_dir)
+        downloader.download_many(self.get_pairs())
+        self.assert_all_downloaded()
+
+    def test_timeout_per_read(self):
+        """TIMEOUT limits each read, not the whole download: a body
+           trickling in for longer is downloaded, a stalled one fails.
+
+        """
+        self.server.stop()
+        self.server = LocalServer({'/slow.jpg': b'x' * 5000}, chunked=True,
+                                  delay=0.1)
+        self.server.start()
+
+        downloader = AsyncDownloader(self.valid_out_dir, settings={
+            'TIMEOUT': 0.3, 'RETRIES': 0})
+        downloader.download(self.server.url('/slow.jpg'), 'slow.jpg')
+        with open(os.path.join(self.valid_out_dir, 'slow.jpg'), 'rb') as f:
+            self.assertEqual(f.read(), b'x' * 5000)
+
+        self.server.httpd.delay = 0.6
+        with self.assertRaises(DownloaderDownloadError):
+            downloader.download(self.server.url('/slow.jpg'), 'stalled.jpg')
+
+    def test_metrics(self):
+        """Timings per stage and totals are recorded with metrics.
+
+        """
+        metrics = Metrics()
+        downloader = AsyncDownloader(self.valid_out_dir, metrics=metrics)
+        downloader.download_many(self.get_pairs())
+        self.assert_all_downloaded()
+        self.assert_metrics(metrics, ('dns_seconds', 'connect_seconds',
+                                      'ttfb_seconds', 'body_seconds',
+                                      'download_seconds'))
+
+    def test_content_addressed(self):
+        """Byte-identical files of different URLs are stored once.
+
+        """
+        self.assert_stored_once(AsyncDownloader)
+
+    def test_compression_decode(self):
+        """Gzip-encoded (chunked) files are decoded while writing.
+
+        """
+        self.assert_compressed(AsyncDownloader, 'decode', chunked=True)
+
+    def test_dns_cache(self):
+        """Name-resolutions are shared by all connections.
+
+        """
+        self.assert_dns_cached(AsyncDownloader)
+
+    def test_compression_keep(self):
+        """Gzip-encoded files are written as received.
+
+        """
+        self.assert_compressed(AsyncDownloader, 'keep')
+
+    def test_download_many_failure(self):
+        """One missing file in a batch.
+
+        """
+        pairs = self.get_pairs()
+        pairs.insert(5, (self.server.url('/missing.jpg'), 'missing.jpg'))
+
+        downloader = AsyncDownloader(self.valid_out_dir)
+        with self.assertRaises(DownloaderDownloadError):
+            downloader.download_many(pairs)
+
+    def test_download_many_on_error(self):
+        """With on_error, failed downloads are reported and the batch goes on.
+
+        """
+        pairs = self.get_pairs()
+        pairs.insert(5, (self.server.url('/missing.jpg'), 'missing.jpg', 99))
+
+        failures = []
+        downloader = AsyncDownloader(self.valid_out_dir)
+        downloader.download_many(iter(pairs), lambda error, line_number, url:
+                                 failures.append((type(error), line_number,
+                                                  url)))
+        self.assert_all_downloaded()
+        self.assertEqual(failures, [(DownloaderDownloadError, 99,
+                                     self.server.url('/missing.jpg'))])
+
+    def test_rate_limit(self):
+        """Downloads of a host are spaced by RATE_LIMIT.
+
+        """
+        downloader = AsyncDownloader(self.valid_out_dir,
+                                     settings={'RATE_LIMIT': 50.0,
+                                               'LOOKAHEAD': 3})
+        start = time.monotonic()
+        downloader.download_many(iter(self.get_pairs()))
+        self.assert_all_downloaded()
+        self.assertGreaterEqual(time.monotonic() - start, 9 / 50.0)
+
+    def test_retry(self):
+        """Server-errors are retried after a backoff; retries exhausted stop
+           the batch.
+
+        """
+        pairs = self.get_pairs()
+        pairs.insert(5, (self.server.url('/flaky.jpg'), 'flaky.jpg'))
+
+        downloader = AsyncDownloader(self.valid_out_dir,
+                                     settings=RETRY_SETTINGS)
+        downloader.download_many(iter(pairs))
+        self.assert_all_downloaded()
+        self.assertEqual(self.count_requests('/flaky.jpg'), 3)
+
+        with self.assertRaises(DownloaderDownloadError):
+            downloader.download(self.server.url('/503.jpg'), '503.jpg')
+        self.assertEqual(self.count_requests('/503.jpg'), 3)
+
+    def test_redirect(self):
+        """Redirects are followed (each over a new connection).
+
+        """
+        self.assert_redirected(AsyncDownloader)
+
+    def test_download_invalid_outdir(self):
+        """Single download into non-existing directory.
+
+        """
+        url, target_filename = self.get_pairs()[0]
+        downloader = AsyncDownloader(self.valid_out_dir + '1')
+        with self.assertRaises(DownloaderDownloadError):
+            downloader.download(url, target_filename)
@@ -0,0 +1,73 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from src.exceptions import DownloaderDownloadError, URLParsingError
+from src.failure_report import FailureReport
+
+
+class TestFailureReport(unittest.TestCase):
+    """Unit-testing for FailureReport.
+
+    """
+    def setUp(self):
+        """Create temporary directory holding the report.
+
+        """
+        self.out_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.out_dir, 'failures.jsonl')
+
+    def tearDown(self):
+        """Clean-up temporary directory.
+
+        """
+        shutil.rmtree(self.out_dir)
+
+    def read_report(self):
+        """Lines of the report as dicts.
+
+        """
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_add(self):
+        """One JSON-object per failure, with the underlying cause.
+
+        """
+        report = FailureReport(self.path)
+        report.add(URLParsingError('Invalid url "foo"'), 3, 'foo')
+        try:
+            try:
+                raise OSError('HTTP status 404')
+            except OSError as e:
+                raise DownloaderDownloadError('Could not download') from e
+        except DownloaderDownloadError as e:
+            report.add(e, None, 'http://example.com/a.jpg')
+        report.close()
+
+        self.assertEqual(report.failures, 2)
+        self.assertEqual(self.read_report(), [
+            {'line': 3, 'url': 'foo', 'error': 'URLParsingError',
+             'message': 'Invalid url "foo"', 'cause': None},
+            {'line': None, 'url': 'http://example.com/a.jpg',
+             'error': 'DownloaderDownloadError',
+             'message': 'Could not download', 'cause': 'HTTP status 404'}])
+
+    def test_append(self):
+        """Without append the report is started empty; with append lines are
+           kept.
+
+        """
+        report = FailureReport(self.path)
+        report.add(URLParsingError('first'), 1, 'a')
+        report.close()
+
+        report = FailureReport(self.path, append=True)
+        report.add(URLParsingError('second'), 2, 'b')
+        report.close()
+        self.assertEqual([entry['line'] for entry in self.read_report()],
+                         [1, 2])
+
+        FailureReport(self.path).close()
+        self.assertEqual(self.read_report(), [])
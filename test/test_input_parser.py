@@ -5,8 +5,11 @@ import shutil
 from src.exceptions import (InputParserParseError,
                             URLParsingError,
                             URLInferFilenameError,
+                            UtilsFileDoesExistError,
                             UtilsFileDoesNotExistError)
-from src.input_parser import InputParser
+from src.input_parser import InputParser, split_byte_ranges
+from src.metrics import Metrics
+from src.output_index import OutputIndex
 
 FIRST_URL = ("https://storage.googleapis.com/"
              "blueyonder_assignment/python-pseudocode.jpg")
@@ -21,11 +24,13 @@ VALID_URLS = FIRST_URL + '\n' + SECOND_URL
 MALFORMED_URLS = VALID_URLS + '\n' + MALFORMED_URL
 MALFORMED_FILENAME = VALID_URLS + '\n' + _BROKEN_URL_FILENAME
 MALFORMED_EMPTY = FIRST_URL + '\n' + '\n' + SECOND_URL
+DUPLICATE_FILENAME = VALID_URLS + '\n' + FIRST_URL + '?v=2'
+DUPLICATE_URL = VALID_URLS + '\n' + FIRST_URL + '\n' + SECOND_URL
 
 
-class TestInputParser(unittest.TestCase):
+class InputParserTestCase(unittest.TestCase):
     """
-    Unit-testing for InputParser.
+    Base for InputParser-tests: temporary input-files and output-dir.
 
     """
     def setUp(self):
@@ -50,6 +55,14 @@ class TestInputParser(unittest.TestCase):
         self.malformed_f_empty_line.write(MALFORMED_EMPTY)
         self.malformed_f_empty_line.seek(0)
 
+        self.duplicate_f = tempfile.NamedTemporaryFile(mode='w')
+        self.duplicate_f.write(DUPLICATE_FILENAME)
+        self.duplicate_f.seek(0)
+
+        self.duplicate_url_f = tempfile.NamedTemporaryFile(mode='w')
+        self.duplicate_url_f.write(DUPLICATE_URL)
+        self.duplicate_url_f.seek(0)
+
         self.wrong_file_mode = tempfile.NamedTemporaryFile(mode='wb')
         self.wrong_file_mode.write(secrets.token_bytes(100))
         self.wrong_file_mode.seek(0)
@@ -63,8 +76,16 @@ class TestInputParser(unittest.TestCase):
         self.malformed_f.close()
         self.malformed_f_filename.close()
         self.malformed_f_empty_line.close()
+        self.duplicate_f.close()
+        self.duplicate_url_f.close()
         self.wrong_file_mode.close()
 
+
+class TestInputParser(InputParserTestCase):
+    """
+    Unit-testing for InputParser.
+
+    """
     def test_valid_case(self):
         """All good case.
 
@@ -84,6 +105,34 @@ class TestInputParser(unittest.TestCase):
             parser = InputParser(self.valid_f.name + '_WRONG_PATH',
                                  self.valid_out_dir)
 
+    def test_duplicate_filenames(self):
+        """Two URLs infer the same filename (default policy: fail).
+
+        """
+        with self.assertRaises(UtilsFileDoesExistError):
+            InputParser(self.duplicate_f.name,
+                        self.valid_out_dir).get_url_targetname_pairs()
+
+    def test_duplicate_filenames_skip(self):
+        """Two URLs infer the same filename (policy: skip).
+
+        """
+        index = OutputIndex(self.valid_out_dir, 'skip')
+        parser = InputParser(self.duplicate_f.name, self.valid_out_dir,
+                             index=index)
+        self.assertEqual(parser.get_url_targetname_pairs(),
+                         [(FIRST_URL, FIRST_FILE), (SECOND_URL, SECOND_FILE)])
+
+    def test_duplicate_filenames_rename(self):
+        """Two URLs infer the same filename (policy: rename).
+
+        """
+        index = OutputIndex(self.valid_out_dir, 'rename')
+        parser = InputParser(self.duplicate_f.name, self.valid_out_dir,
+                             index=index)
+        self.assertEqual(parser.get_url_targetname_pairs()[2],
+                         (FIRST_URL + '?v=2', 'python-pseudocode-1.jpg'))
+
     def test_invalid_input_urls(self):
         """Opening successfull, but parsing URL/filename fails.
 
@@ -116,3 +165,173 @@ class TestInputParser(unittest.TestCase):
         with self.assertRaisesRegex(InputParserParseError,
                                     'Could not open input'):
             parser = InputParser(self.wrong_file_mode.name, self.valid_out_dir)
+
+
+class TestInputParserLazy(InputParserTestCase):
+    """
+    Unit-testing for InputParser in lazy mode.
+
+    """
+    def test_valid_case(self):
+        """All good case: pairs are yielded lazily.
+
+        """
+        parser = InputParser(self.valid_f.name, self.valid_out_dir, lazy=True)
+        self.assertEqual(parser.urls, [])
+
+        pairs = parser.iter_url_targetname_pairs()
+        self.assertEqual(next(pairs), (FIRST_URL, FIRST_FILE))
+        self.assertEqual(next(pairs), (SECOND_URL, SECOND_FILE))
+        with self.assertRaises(StopIteration):
+            next(pairs)
+
+    def test_invalid_input_path(self):
+        """Path does not lead to existing file: raised at init.
+
+        """
+        with self.assertRaises(UtilsFileDoesNotExistError):
+            parser = InputParser(self.valid_f.name + '_WRONG_PATH',
+                                 self.valid_out_dir, lazy=True)
+
+    def test_invalid_input_urls(self):
+        """Parsing URL fails when the offending line is reached.
+
+        """
+        parser = InputParser(self.malformed_f.name, self.valid_out_dir,
+                             lazy=True)
+        pairs = parser.iter_url_targetname_pairs()
+        self.assertEqual(next(pairs), (FIRST_URL, FIRST_FILE))
+        self.assertEqual(next(pairs), (SECOND_URL, SECOND_FILE))
+        with self.assertRaises(URLParsingError):
+            next(pairs)
+
+    def test_invalid_filenames(self):
+        """Inferred filename is invalid.
+
+        """
+        parser = InputParser(self.malformed_f_filename.name,
+                             self.valid_out_dir, lazy=True)
+        with self.assertRaises(URLInferFilenameError):
+            parser.get_url_targetname_pairs()
+
+    def test_malformed_input_file(self):
+        """Empty-line is reported with its line-number.
+
+        """
+        parser = InputParser(self.malformed_f_empty_line.name,
+                             self.valid_out_dir, lazy=True)
+        pairs = parser.iter_url_targetname_pairs()
+        self.assertEqual(next(pairs), (FIRST_URL, FIRST_FILE))
+        with self.assertRaisesRegex(InputParserParseError, r'\(line 2\)'):
+            next(pairs)
+
+    def test_wrong_file_mode(self):
+        """Reading fails, as binary-file is opened in txt-mode.
+
+        """
+        parser = InputParser(self.wrong_file_mode.name, self.valid_out_dir,
+                             lazy=True)
+        with self.assertRaisesRegex(InputParserParseError,
+                                    'Could not open input'):
+            parser.get_url_targetname_pairs()
+
+    def test_byte_ranges(self):
+        """Every line is used by exactly one of the byte-ranges.
+
+        """
+        for n in range(1, 8):
+            pairs = []
+            for byte_range in split_byte_ranges(self.malformed_f.name, n):
+                parser = InputParser(self.malformed_f.name,
+                                     self.valid_out_dir, lazy=True,
+                                     byte_range=byte_range)
+                try:
+                    pairs.extend(parser.iter_url_targetname_pairs())
+                except URLParsingError:
+                    pairs.append(MALFORMED_URL)
+            self.assertEqual(pairs, [(FIRST_URL, FIRST_FILE),
+                                     (SECOND_URL, SECOND_FILE),
+                                     MALFORMED_URL])
+
+    def test_byte_range_empty_line(self):
+        """Empty-line within a byte-range is reported with its line-number.
+
+        """
+        start = len(FIRST_URL) + 1
+        parser = InputParser(self.malformed_f_empty_line.name,
+                             self.valid_out_dir, lazy=True,
+                             byte_range=(start, start + 1))
+        with self.assertRaisesRegex(InputParserParseError, r'\(line 2\)'):
+            parser.get_url_targetname_pairs()
+
+    def test_count_lines(self):
+        """Lines (empty ones included) are counted per byte-range without
+           reading URLs.
+
+        """
+        parser = InputParser(self.malformed_f_empty_line.name,
+                             self.valid_out_dir, lazy=True)
+        self.assertEqual(parser.count_lines(), 3)
+        for n in range(1, 8):
+            self.assertEqual(sum(
+                InputParser(self.malformed_f_empty_line.name,
+                            self.valid_out_dir, lazy=True,
+                            byte_range=byte_range).count_lines()
+                for byte_range in split_byte_ranges(
+                    self.malformed_f_empty_line.name, n)), 3)
+
+    def test_on_error(self):
+        """With on_error, failing lines are reported and skipped.
+
+        """
+        for lazy in (True, False):
+            failures = []
+            parser = InputParser(
+                self.malformed_f_empty_line.name, self.valid_out_dir,
+                lazy=lazy, on_error=lambda error, line_number, url:
+                    failures.append((type(error), line_number, url)))
+            pairs = parser.iter_url_targetname_pairs(line_numbers=True)
+            self.assertEqual(list(pairs), [(FIRST_URL, FIRST_FILE, 1),
+                                           (SECOND_URL, SECOND_FILE, 3)])
+            self.assertEqual(failures, [(InputParserParseError, 2, '')])
+
+            failures.clear()
+            parser = InputParser(
+                self.malformed_f.name, self.valid_out_dir, lazy=lazy,
+                on_error=lambda error, line_number, url:
+                    failures.append((type(error), line_number, url)))
+            self.assertEqual(len(parser.get_url_targetname_pairs()), 2)
+            self.assertEqual(failures, [(URLParsingError, 3, MALFORMED_URL)])
+
+    def test_metrics(self):
+        """Lines read, parse- and validation-time (and probes with strict
+           filenames) are recorded with metrics.
+
+        """
+        for strict_filenames in (False, True):
+            metrics = Metrics()
+            parser = InputParser(self.valid_f.name, self.valid_out_dir,
+                                 lazy=True, strict_filenames=strict_filenames,
+                                 metrics=metrics)
+            self.assertEqual(len(parser.get_url_targetname_pairs()), 2)
+            self.assertEqual(metrics.get_counter('lines_total'), 2)
+            self.assertGreater(metrics.get_counter('parse_seconds_total'), 0)
+            self.assertEqual(len(metrics.get_histogram('validate_seconds')),
+                             2)
+            self.assertEqual(metrics.get_histogram('probe_seconds') is None,
+                             not strict_filenames)
+
+    def test_duplicate_urls(self):
+        """URL given again is skipped (no collision), also when checked
+           up-front.
+
+        """
+        for lazy in (True, False):
+            metrics = Metrics()
+            parser = InputParser(self.duplicate_url_f.name,
+                                 self.valid_out_dir, lazy=lazy,
+                                 metrics=metrics)
+            self.assertEqual(parser.get_url_targetname_pairs(),
+                             [(FIRST_URL, FIRST_FILE),
+                              (SECOND_URL, SECOND_FILE)])
+            self.assertEqual(metrics.get_counter('duplicates_total'), 2)
@@ -0,0 +1,106 @@
+import unittest
+import tempfile
+import os
+import shutil
+from src.journal import DownloadJournal, JOURNAL_FILENAME
+
+URL = 'https://storage.googleapis.com/blueyonder_assignment/1.jpg'
+
+
+class TestDownloadJournal(unittest.TestCase):
+    """Unit-testing for DownloadJournal.
+
+    """
+    def setUp(self):
+        """Create temp-directory as output-dir.
+
+        """
+        self.valid_out_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Delete temp-directory.
+
+        """
+        shutil.rmtree(self.valid_out_dir)
+
+    def test_record_and_resume(self):
+        """Latest entry per file survives a restart.
+
+        """
+        journal = DownloadJournal(self.valid_out_dir)
+        journal.record('1.jpg', URL, 'partial', '"abc"', None, 10)
+        journal.record('1.jpg', URL, 'done', '"abc"', None, 10)
+        journal.close()
+
+        journal = DownloadJournal(self.valid_out_dir, resume=True)
+        self.assertEqual(journal.get('1.jpg')['state'], 'done')
+        self.assertEqual(journal.get('1.jpg')['etag'], '"abc"')
+        self.assertEqual(len(journal.items()), 1)
+        journal.close()
+
+        # compacted to one line per file
+        with open(os.path.join(self.valid_out_dir, JOURNAL_FILENAME)) as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    def test_no_resume(self):
+        """Without resume, entries of the previous run are dropped.
+
+        """
+        journal = DownloadJournal(self.valid_out_dir)
+        self.assertFalse(journal.replaced)
+        journal.record('1.jpg', URL, 'done')
+        journal.close()
+
+        journal = DownloadJournal(self.valid_out_dir)
+        self.assertTrue(journal.replaced)
+        self.assertIsNone(journal.get('1.jpg'))
+        journal.close()
+
+    def test_entries_in_memory(self):
+        """Entries are only kept with resume, while in progress.
+
+        """
+        journal = DownloadJournal(self.valid_out_dir)
+        journal.record('1.jpg', URL, 'partial')
+        self.assertEqual(journal.items(), [])
+        journal.close()
+
+        journal = DownloadJournal(self.valid_out_dir, resume=True)
+        self.assertFalse(journal.replaced)
+        journal.record('2.jpg', URL, 'partial')
+        self.assertEqual(journal.get('2.jpg')['state'], 'partial')
+        journal.record('2.jpg', URL, 'done')
+        self.assertIsNone(journal.get('2.jpg'))
+        self.assertEqual(journal.get('1.jpg')['state'], 'partial')
+        journal.close()
+
+    def test_truncated_line(self):
+        """Line cut off by a crash is ignored.
+
+        """
+        journal = DownloadJournal(self.valid_out_dir)
+        journal.record('1.jpg', URL, 'partial')
+        journal.close()
+        with open(journal.path, 'a') as f:
+            f.write('{"file": "1.jpg", "url": "')
+
+        journal = DownloadJournal(self.valid_out_dir, resume=True)
+        self.assertEqual(journal.get('1.jpg')['state'], 'partial')
+        journal.remove()
+        self.assertFalse(os.path.exists(journal.path))
+
+    def test_shared_append(self):
+        """Journals opened without compact append to the same file.
+
+        """
+        coordinator = DownloadJournal(self.valid_out_dir)
+        shards = [DownloadJournal(self.valid_out_dir, compact=False)
+                  for _ in range(2)]
+        shards[0].record('1.jpg', URL, 'done')
+        shards[1].record('2.jpg', URL, 'partial')
+        for journal in shards + [coordinator]:
+            journal.close()
+
+        journal = DownloadJournal(self.valid_out_dir, resume=True)
+        self.assertEqual(len(journal.items()), 2)
+        journal.close()
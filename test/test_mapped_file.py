@@ -0,0 +1,64 @@
+import unittest
+import tempfile
+from src.mapped_file import MappedLines
+
+LINES = [b'https://example.com/a.jpg\n', b'\n',
+         b'https://example.com/b\xc3\xa4r.jpg\n', b'https://example.com/c.jpg']
+
+
+class TestMappedLines(unittest.TestCase):
+    """Unit-testing for MappedLines.
+
+    """
+    def setUp(self):
+        """Create temporary-file with LINES (last one without newline).
+
+        """
+        self.f = tempfile.NamedTemporaryFile(mode='wb')
+        self.f.write(b''.join(LINES))
+        self.f.flush()
+
+    def tearDown(self):
+        """Clean-up temporary-file.
+
+        """
+        self.f.close()
+
+    def test_iter_lines(self):
+        """Lines are read with their offsets; every line belongs to the
+           range its first byte is in.
+
+        """
+        with MappedLines(self.f.name) as lines:
+            self.assertEqual([line for _, line in lines.iter_lines()],
+                             [line.rstrip(b'\n') for line in LINES])
+            self.assertEqual(lines.count_lines(), len(LINES))
+
+            size = lines.size
+            for step in range(1, size + 1):
+                ranged = [line for start in range(0, size, step)
+                          for _, line in lines.iter_lines(start, start + step)]
+                self.assertEqual(ranged, [line.rstrip(b'\n')
+                                          for line in LINES])
+                self.assertEqual(sum(lines.count_lines(start, start + step)
+                                     for start in range(0, size, step)),
+                                 len(LINES))
+
+    def test_line_number(self):
+        """Line-number of a line is found from its offset.
+
+        """
+        with MappedLines(self.f.name) as lines:
+            for line_number, (position, _) in enumerate(lines.iter_lines(),
+                                                        1):
+                self.assertEqual(lines.get_line_number(position),
+                                 line_number)
+
+    def test_empty(self):
+        """Empty file (which can not be mapped) has no lines.
+
+        """
+        with tempfile.NamedTemporaryFile() as f:
+            with MappedLines(f.name) as lines:
+                self.assertEqual(list(lines.iter_lines()), [])
+                self.assertEqual(lines.count_lines(), 0)
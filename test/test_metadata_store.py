@@ -0,0 +1,50 @@
+import unittest
+import tempfile
+import shutil
+import os
+from src.metadata_store import MetadataStore
+
+URL = 'https://storage.googleapis.com/blueyonder_assignment/1.jpg'
+
+
+class TestMetadataStore(unittest.TestCase):
+    """Unit-testing for MetadataStore.
+
+    """
+    def setUp(self):
+        """Create temp-directory for sqlite-file.
+
+        """
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'meta.sqlite')
+
+    def tearDown(self):
+        """Delete temp-directory.
+
+        """
+        shutil.rmtree(self.tmp_dir)
+
+    def test_record_and_reopen(self):
+        """Records survive closing; latest record per URL wins.
+
+        """
+        store = MetadataStore(self.path)
+        store.record(URL, '1.jpg', '"a"', None, 10, 'ab')
+        store.record(URL, '1.jpg', '"b"', 'Mon, 01 Jan 2018 00:00:00 GMT',
+                     20, 'cd')
+        store.close()
+
+        store = MetadataStore(self.path)
+        entry = store.get(URL)
+        self.assertEqual(entry['etag'], '"b"')
+        self.assertEqual(entry['size'], 20)
+        self.assertEqual(store.items(), [('1.jpg', URL)])
+        store.close()
+
+    def test_unknown_url(self):
+        """Nothing recorded for URL.
+
+        """
+        store = MetadataStore(self.path)
+        self.assertIsNone(store.get(URL))
+        store.close()
@@ -0,0 +1,136 @@
+import unittest
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from src.metrics import Histogram, Metrics, RATE_BUCKETS, timed_iter
+
+
+class TestHistogram(unittest.TestCase):
+    """Unit-testing for Histogram.
+
+    """
+    def test_percentile(self):
+        """Nearest-rank percentiles; None without values.
+
+        """
+        histogram = Histogram()
+        self.assertIsNone(histogram.percentile(50))
+
+        for value in range(100, 0, -1):
+            histogram.observe(value)
+        self.assertEqual(histogram.percentile(50), 50)
+        self.assertEqual(histogram.percentile(95), 95)
+        self.assertEqual(histogram.percentile(99), 99)
+        self.assertEqual(histogram.percentile(100), 100)
+
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 100)
+        self.assertEqual(summary['mean'], 50.5)
+        self.assertEqual((summary['min'], summary['max']), (1, 100))
+
+    def test_bucket_counts(self):
+        """Buckets count all values up to their bound (cumulative).
+
+        """
+        histogram = Histogram(buckets=(1.0, 2.0, 3.0))
+        for value in (0.5, 1.0, 2.5, 10.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.bucket_counts(),
+                         [(1.0, 2), (2.0, 2), (3.0, 3)])
+
+
+class TestMetrics(unittest.TestCase):
+    """Unit-testing for Metrics.
+
+    """
+    def setUp(self):
+        """Create temporary directory for written metrics.
+
+        """
+        self.out_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean-up temporary directory.
+
+        """
+        shutil.rmtree(self.out_dir)
+
+    def get_metrics(self):
+        """Metrics with one histogram, counter and gauge.
+
+        """
+        metrics = Metrics()
+        with metrics.timer('download_seconds'):
+            pass
+        metrics.observe('throughput_bytes_per_second', 5e5, RATE_BUCKETS)
+        metrics.add('bytes_total', 100)
+        metrics.enter('in_flight')
+        metrics.enter('in_flight')
+        metrics.leave('in_flight')
+        return metrics
+
+    def test_collect(self):
+        """Histograms, counters and gauges (with peak) are collected.
+
+        """
+        data = self.get_metrics().to_dict()
+        self.assertEqual(data['histograms']['download_seconds']['count'], 1)
+        self.assertEqual(data['counters'], {'bytes_total': 100})
+        self.assertEqual(data['gauges'],
+                         {'in_flight': {'current': 1, 'peak': 2}})
+
+    def test_merge_pickled(self):
+        """Metrics survive pickling (shards) and are added up when merged.
+
+        """
+        metrics = self.get_metrics()
+        metrics.merge(pickle.loads(pickle.dumps(self.get_metrics())))
+
+        data = metrics.to_dict()
+        self.assertEqual(data['histograms']['download_seconds']['count'], 2)
+        self.assertEqual(data['counters'], {'bytes_total': 200})
+        self.assertEqual(data['gauges'],
+                         {'in_flight': {'current': 2, 'peak': 4}})
+
+    def test_write(self):
+        """Metrics are written as JSON or Prometheus text-format.
+
+        """
+        metrics = self.get_metrics()
+        path = os.path.join(self.out_dir, 'metrics')
+
+        metrics.write(path)
+        with open(path) as f:
+            self.assertEqual(json.load(f)['counters'], {'bytes_total': 100})
+
+        metrics.write(path, 'prometheus')
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertIn('downloader_bytes_total 100', lines)
+        self.assertIn('downloader_in_flight_peak 2', lines)
+        self.assertIn('downloader_download_seconds_count 1', lines)
+        self.assertIn('downloader_throughput_bytes_per_second_bucket'
+                      '{le="1000000.0"} 1', lines)
+
+        with self.assertRaises(ValueError):
+            metrics.write(path, 'xml')
+
+    def test_summary(self):
+        """Summary names every metric.
+
+        """
+        summary = self.get_metrics().summary()
+        for name in ('bytes_total', 'in_flight', 'download_seconds',
+                     'throughput_bytes_per_second'):
+            self.assertIn(name, summary)
+
+    def test_timed_iter(self):
+        """Items are passed through; time spent producing them is added up.
+
+        """
+        metrics = Metrics()
+        self.assertEqual(list(timed_iter(range(3), metrics, 'seconds')),
+                         [0, 1, 2])
+        self.assertGreater(metrics.get_counter('seconds'), 0)
@@ -0,0 +1,78 @@
+import unittest
+import os
+import shutil
+import tempfile
+from src.object_store import ObjectStore
+
+DIGEST = 'ab' + '0' * 62
+
+
+class TestObjectStore(unittest.TestCase):
+    """Unit-testing for ObjectStore.
+
+    """
+    def setUp(self):
+        """Create temporary output-directory.
+
+        """
+        self.out_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean-up temporary output-directory.
+
+        """
+        shutil.rmtree(self.out_dir)
+
+    def write_part(self, name, content):
+        """Write a completed part-file.
+
+        """
+        path = os.path.join(self.out_dir, name + '.part')
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def assert_linked(self, store, names, content):
+        """Check names have content and share one object.
+
+        """
+        object_path = store.get_path(DIGEST)
+        for name in names:
+            path = os.path.join(self.out_dir, name)
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), content)
+            self.assertTrue(os.path.samefile(path, object_path))
+            self.assertFalse(os.path.exists(path + '.part'))
+
+    def test_hardlink(self):
+        """Identical content is stored once; names are hardlinks.
+
+        """
+        store = ObjectStore(self.out_dir)
+        for i, name in enumerate(('a.jpg', 'b.jpg')):
+            new = store.store(self.write_part(name, b'data'), DIGEST,
+                              os.path.join(self.out_dir, name))
+            self.assertEqual(new, i == 0)
+
+        self.assert_linked(store, ('a.jpg', 'b.jpg'), b'data')
+        self.assertEqual(os.stat(store.get_path(DIGEST)).st_nlink, 3)
+
+    def test_symlink(self):
+        """Names are relative symlinks; existing names are replaced.
+
+        """
+        store = ObjectStore(self.out_dir, 'symlink')
+        target = os.path.join(self.out_dir, 'a.jpg')
+        with open(target, 'wb') as f:
+            f.write(b'old')
+
+        store.store(self.write_part('a.jpg', b'data'), DIGEST, target)
+        self.assert_linked(store, ('a.jpg',), b'data')
+        self.assertFalse(os.path.isabs(os.readlink(target)))
+
+    def test_invalid_link(self):
+        """Unknown link-mode is rejected.
+
+        """
+        with self.assertRaises(ValueError):
+            ObjectStore(self.out_dir, 'copy')
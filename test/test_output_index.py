@@ -0,0 +1,124 @@
+import unittest
+import tempfile
+import os
+import shutil
+from src.exceptions import UtilsFileDoesExistError
+from src.output_index import OutputIndex
+
+
+class TestOutputIndex(unittest.TestCase):
+    """Unit-testing for OutputIndex.
+
+    """
+    def setUp(self):
+        """Create temporary-dir with one existing file.
+
+        """
+        self.valid_out_dir = tempfile.mkdtemp()
+        open(os.path.join(self.valid_out_dir, 'existing.jpg'), 'w').close()
+
+    def tearDown(self):
+        """Clean-up temporary-dir.
+
+        """
+        shutil.rmtree(self.valid_out_dir)
+
+    def test_listing(self):
+        """Existing files are indexed at init; added names afterwards.
+
+        """
+        index = OutputIndex(self.valid_out_dir)
+        self.assertIn('existing.jpg', index)
+        self.assertNotIn('new.jpg', index)
+
+        index.add('new.jpg')
+        self.assertIn('new.jpg', index)
+        index.discard('new.jpg')
+        self.assertNotIn('new.jpg', index)
+
+    def test_policy_fail(self):
+        """Existing file and duplicate within batch raise.
+
+        """
+        index = OutputIndex(self.valid_out_dir)
+        with self.assertRaises(UtilsFileDoesExistError):
+            index.claim('existing.jpg')
+
+        self.assertEqual(index.claim('new.jpg'), 'new.jpg')
+        with self.assertRaises(UtilsFileDoesExistError):
+            index.claim('new.jpg')
+
+    def test_policy_skip(self):
+        """Taken names are skipped.
+
+        """
+        index = OutputIndex(self.valid_out_dir, 'skip')
+        self.assertIsNone(index.claim('existing.jpg'))
+        self.assertEqual(index.claim('new.jpg'), 'new.jpg')
+        self.assertIsNone(index.claim('new.jpg'))
+
+    def test_policy_rename(self):
+        """Taken names get the smallest free suffix.
+
+        """
+        index = OutputIndex(self.valid_out_dir, 'rename')
+        index.add('existing-2.jpg')
+        self.assertEqual(index.claim('existing.jpg'), 'existing-1.jpg')
+        self.assertEqual(index.claim('existing.jpg'), 'existing-3.jpg')
+        self.assertEqual(index.claim('noext'), 'noext')
+        self.assertEqual(index.claim('noext'), 'noext-1')
+
+    def test_unknown_policy(self):
+        """Policy must be one of COLLISION_POLICIES.
+
+        """
+        with self.assertRaises(ValueError):
+            OutputIndex(self.valid_out_dir, 'overwrite')
+
+    def test_nonexisting_out_dir(self):
+        """Out-dir does not exist: empty index.
+
+           This "non-existence" in this test is true with high-probability.
+
+        """
+        self.assertEqual(len(OutputIndex(self.valid_out_dir + '1')), 0)
+
+    def test_owned(self):
+        """Owned name can be claimed once by its URL only.
+
+        """
+        index = OutputIndex(self.valid_out_dir)
+        index.own('existing.jpg', 'http://a/existing.jpg')
+
+        with self.assertRaises(UtilsFileDoesExistError):
+            index.claim('existing.jpg', 'http://b/existing.jpg')
+        self.assertEqual(index.claim('existing.jpg', 'http://a/existing.jpg'),
+                         'existing.jpg')
+        with self.assertRaises(UtilsFileDoesExistError):
+            index.claim('existing.jpg', 'http://a/existing.jpg')
+
+    def test_shared(self):
+        """Names claimed by another process are taken.
+
+        """
+        # -1: no own pid
+        shared = {'other.jpg': (-1, 'http://a/other.jpg'),
+                  'other-1.jpg': (-1, None)}
+        index = OutputIndex(self.valid_out_dir, 'rename', shared)
+        self.assertEqual(index.claim('other.jpg'), 'other-2.jpg')
+        self.assertEqual(index.claim('new.jpg'), 'new.jpg')
+        self.assertIn('new.jpg', shared)
+        self.assertIn('other-2.jpg', shared)
+
+        index = OutputIndex(self.valid_out_dir, 'fail', shared)
+        with self.assertRaises(UtilsFileDoesExistError):
+            index.claim('other.jpg')
+
+    def test_shared_duplicate(self):
+        """Name claimed by another process for the same URL is skipped.
+
+        """
+        shared = {'other.jpg': (-1, 'http://a/other.jpg')}
+        for policy in ('fail', 'skip', 'rename'):
+            index = OutputIndex(self.valid_out_dir, policy, shared)
+            self.assertIsNone(index.claim('other.jpg', 'http://a/other.jpg'))
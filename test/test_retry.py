@@ -0,0 +1,100 @@
+import unittest
+import email.utils
+import socket
+import time
+from src.exceptions import DownloaderDownloadError, DownloaderHTTPError
+from src.retry import (get_retry_after, parse_retry_after, CircuitBreaker,
+                       RetryPolicy, RetryQueue)
+
+
+def wrapped(error):
+    """Raise error wrapped like the downloaders do and return the wrapper.
+
+    """
+    try:
+        try:
+            raise error
+        except Exception:
+            raise DownloaderDownloadError('Could not retrieve / download')
+    except DownloaderDownloadError as e:
+        return e
+
+
+class TestRetry(unittest.TestCase):
+    """Unit-testing for retry-classification and -scheduling.
+
+    """
+    def test_get_retry_after(self):
+        """Timeouts, connection-problems, 429 and 5xx are retryable.
+
+        """
+        self.assertEqual(get_retry_after(
+            wrapped(DownloaderHTTPError('HTTP status 503', 503))), 0.0)
+        self.assertEqual(get_retry_after(
+            DownloaderHTTPError('HTTP status 429', 429, 5.0)), 5.0)
+        self.assertEqual(get_retry_after(wrapped(socket.timeout())), 0.0)
+        self.assertEqual(get_retry_after(wrapped(ConnectionResetError())),
+                         0.0)
+
+        self.assertIsNone(get_retry_after(
+            wrapped(DownloaderHTTPError('HTTP status 404', 404))))
+        self.assertIsNone(get_retry_after(wrapped(FileNotFoundError())))
+        self.assertIsNone(get_retry_after(wrapped(ValueError())))
+
+    def test_parse_retry_after(self):
+        """Seconds and HTTP-dates are parsed; anything else is ignored.
+
+        """
+        self.assertEqual(parse_retry_after('120'), 120.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+
+        date = email.utils.formatdate(time.time() + 60, usegmt=True)
+        self.assertAlmostEqual(parse_retry_after(date), 60.0, delta=2.0)
+
+    def test_retry_policy(self):
+        """Delays are bounded by the backoff and respect Retry-After.
+
+        """
+        policy = RetryPolicy(retries=3, backoff=1.0, backoff_max=3.0)
+        for attempt in range(3):
+            delay = policy.get_delay(attempt)
+            self.assertGreaterEqual(delay, 0.0)
+            self.assertLessEqual(delay, min(3.0, 2 ** attempt))
+
+        self.assertEqual(policy.get_delay(0, 2.5), 2.5)
+        self.assertEqual(policy.get_delay(0, 100.0), 3.0)
+        self.assertIsNone(policy.get_delay(3))
+
+    def test_circuit_breaker(self):
+        """Breaker opens after threshold failures and lets one probe through
+           after the cooldown.
+
+        """
+        breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+        breaker.failure('a')
+        self.assertEqual(breaker.wait_time('a'), 0.0)
+        breaker.failure('a')
+        self.assertGreater(breaker.wait_time('a'), 0.0)
+        self.assertEqual(breaker.wait_time('b'), 0.0)
+
+        time.sleep(0.06)
+        self.assertEqual(breaker.wait_time('a', probe=False), 0.0)
+        self.assertEqual(breaker.wait_time('a'), 0.0)  # probe
+        self.assertGreater(breaker.wait_time('a'), 0.0)
+        breaker.success('a')
+        self.assertEqual(breaker.wait_time('a'), 0.0)
+
+    def test_retry_queue(self):
+        """Items are returned by due-time.
+
+        """
+        retries = RetryQueue()
+        self.assertIsNone(retries.next_due())
+        retries.push('later', 60.0)
+        retries.push('now', 0.0)
+
+        self.assertEqual(len(retries), 2)
+        self.assertEqual(retries.pop_due(), 'now')
+        self.assertIsNone(retries.pop_due())
+        self.assertGreater(retries.next_due(), 0.0)
@@ -0,0 +1,152 @@
+import unittest
+import tempfile
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from src.cli import CLI
+from src.config_parser import DOWNLOAD_DEFAULTS, OUTPUT_DEFAULTS
+from src.journal import JOURNAL_FILENAME
+from src.run_script import _run_shards
+from test.local_server import LocalServer
+
+RUN_PY = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'run.py')
+
+LOCAL_FILES = {'/{}.jpg'.format(i): bytes([i]) * (1000 + i)
+               for i in range(12)}
+
+
+class TestRunSharded(unittest.TestCase):
+    """Unit-testing for sharded runs (--shards) against a local HTTP-server:
+       status-codes (run.py), failures and metrics summed over shards.
+
+    """
+    def setUp(self):
+        """Create work-dir (config.ini, output-dir) and start local server.
+
+        """
+        self.work_dir = tempfile.mkdtemp()
+        self.out_dir = os.path.join(self.work_dir, 'out')
+        os.mkdir(self.out_dir)
+        with open(os.path.join(self.work_dir, 'config.ini'), 'w') as f:
+            f.write('[output]\nTARGET_DIR={}\n'.format(self.out_dir))
+        self.url_file = os.path.join(self.work_dir, 'urls.txt')
+
+        self.server = LocalServer(dict(LOCAL_FILES))
+        self.server.start()
+
+    def tearDown(self):
+        """Delete work-dir and stop local server.
+
+        """
+        shutil.rmtree(self.work_dir)
+        self.server.stop()
+
+    def write_urls(self, paths):
+        """Write URLs of url-paths to the url-file.
+
+        """
+        with open(self.url_file, 'w') as f:
+            f.write(''.join(self.server.url(path) + '\n' for path in paths))
+
+    def run_sharded(self, *options):
+        """Run run.py with three shards in the work-dir.
+
+           Returns:
+               subprocess.CompletedProcess: exit-code and output.
+
+        """
+        return subprocess.run([sys.executable, RUN_PY, '-i', self.url_file,
+                               '--shards', '3'] + list(options),
+                              cwd=self.work_dir, stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE, timeout=120,
+                              universal_newlines=True)
+
+    def assert_downloaded(self, paths):
+        """Check that exactly the files of url-paths are in the output-dir
+           (next to the journal of an incomplete run).
+
+        """
+        names = set(os.listdir(self.out_dir)) - {JOURNAL_FILENAME}
+        self.assertEqual(sorted(names), sorted(path[1:] for path in paths))
+        for path in paths:
+            with open(os.path.join(self.out_dir, path[1:]), 'rb') as f:
+                self.assertEqual(f.read(), LOCAL_FILES[path])
+
+    def test_sharded(self):
+        """All shards complete: status-code 0, journal removed, metrics of
+           all shards merged.
+
+        """
+        self.write_urls(LOCAL_FILES)
+        result = self.run_sharded('--metrics', 'metrics.json')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assert_downloaded(LOCAL_FILES)
+        self.assertFalse(os.path.exists(os.path.join(self.out_dir,
+                                                     JOURNAL_FILENAME)))
+
+        with open(os.path.join(self.work_dir, 'metrics.json')) as f:
+            metrics = json.load(f)
+        self.assertEqual(metrics['histograms']['download_seconds']['count'],
+                         len(LOCAL_FILES))
+
+    def test_sharded_failure(self):
+        """A failing download of one shard decides the status-code
+           (DownloaderDownloadError: 11); the journal is kept.
+
+        """
+        self.write_urls(['/missing.jpg'] + sorted(LOCAL_FILES))
+        result = self.run_sharded()
+        self.assertEqual(result.returncode, 11, result.stderr)
+        self.assertIn('DownloaderDownloadError', result.stderr)
+        self.assertTrue(os.path.exists(os.path.join(self.out_dir,
+                                                    JOURNAL_FILENAME)))
+
+    def test_sharded_keep_going(self):
+        """With --keep-going the failures of all shards are summed up
+           (RunScriptIncompleteError: 12), all other files are downloaded.
+
+        """
+        paths = sorted(LOCAL_FILES)
+        self.write_urls(['/missing-a.jpg'] + paths + ['/missing-b.jpg'])
+        result = self.run_sharded('--keep-going')
+        self.assertEqual(result.returncode, 12, result.stderr)
+        self.assertIn('2 line(s) / download(s) failed', result.stderr)
+        self.assert_downloaded(paths)
+
+        with open(os.path.join(self.work_dir, 'failures.jsonl')) as f:
+            failures = [json.loads(line) for line in f]
+        self.assertEqual(sorted(failure['line'] for failure in failures),
+                         [1, len(paths) + 2])
+
+    def test_killed_shard(self):
+        """A shard ending without result (killed) fails the run.
+
+        """
+        self.server.stop()
+        self.server = LocalServer(dict(LOCAL_FILES), chunked=True,
+                                  delay=10.0)
+        self.server.start()
+        self.write_urls(LOCAL_FILES)
+
+        def kill_shards():
+            while not self.server.requests:
+                time.sleep(0.01)
+            for process in multiprocessing.active_children():
+                os.kill(process.pid, signal.SIGKILL)
+
+        killer = threading.Thread(target=kill_shards)
+        killer.start()
+        args = CLI().parse(['-i', self.url_file, '--shards', '2'])
+        error = _run_shards(multiprocessing.get_context(), {}, args,
+                            self.out_dir, dict(OUTPUT_DEFAULTS),
+                            dict(DOWNLOAD_DEFAULTS), None)
+        killer.join()
+        self.assertIsInstance(error, RuntimeError)
+        self.assertIn('ended with exit-code -9', str(error))
@@ -0,0 +1,131 @@
+import unittest
+import time
+from src.retry import CircuitBreaker
+from src.scheduler import HostScheduler, RateLimiter
+
+
+class TestScheduler(unittest.TestCase):
+    """Unit-testing for RateLimiter and HostScheduler.
+
+    """
+    def test_rate_limiter_take(self):
+        """Burst is allowed at once; further tokens come with the rate.
+
+        """
+        limiter = RateLimiter(rate=10.0, burst=2)
+        self.assertEqual(limiter.take('a'), 0.0)
+        self.assertEqual(limiter.take('a'), 0.0)
+        self.assertGreater(limiter.take('a'), 0.0)
+        self.assertEqual(limiter.take('b'), 0.0)
+
+        time.sleep(0.11)
+        self.assertEqual(limiter.take('a'), 0.0)
+
+    def test_rate_limiter_reserve(self):
+        """Reserved tokens are spaced by the rate.
+
+        """
+        limiter = RateLimiter(rate=10.0)
+        self.assertEqual(limiter.reserve('a'), 0.0)
+        self.assertAlmostEqual(limiter.reserve('a'), 0.1, delta=0.01)
+        self.assertAlmostEqual(limiter.reserve('a'), 0.2, delta=0.01)
+
+    def test_rate_limiter_unlimited(self):
+        """Rate 0 never waits.
+
+        """
+        limiter = RateLimiter()
+        for _ in range(100):
+            self.assertEqual(limiter.take('a'), 0.0)
+
+    def test_interleave(self):
+        """Hosts take turns; a limited host does not block the others.
+
+        """
+        hosts = HostScheduler(RateLimiter(rate=1.0))
+        for i in range(3):
+            hosts.add('a', 'a{}'.format(i))
+        for i in range(3):
+            hosts.add('b', 'b{}'.format(i))
+        hosts.add('c', 'c0')
+
+        order = []
+        item = hosts.pop_ready()
+        while item is not None:
+            order.append(item)
+            item = hosts.pop_ready()
+
+        self.assertEqual(order, ['a0', 'b0', 'c0'])
+        self.assertEqual(len(hosts), 4)
+        self.assertGreater(hosts.next_ready(), 0.5)
+
+    def test_first(self):
+        """Items queued first are handed out before the host's others.
+
+        """
+        hosts = HostScheduler(RateLimiter())
+        hosts.add('a', 'new')
+        hosts.add('a', 'retry', first=True)
+        self.assertEqual(hosts.pop_ready(), 'retry')
+        self.assertEqual(hosts.pop_ready(), 'new')
+        self.assertIsNone(hosts.pop_ready())
+        self.assertIsNone(hosts.next_ready())
+
+    def test_pop_more(self):
+        """Further items of a ready host are handed out up to its
+           rate-limit; emptied hosts are dropped.
+
+        """
+        hosts = HostScheduler(RateLimiter(rate=1.0, burst=3))
+        for i in range(5):
+            hosts.add('a', 'a{}'.format(i))
+        hosts.add('b', 'b0')
+
+        self.assertEqual(hosts.pop_ready(), 'a0')
+        self.assertEqual(hosts.pop_more('a', 8), ['a1', 'a2'])
+        self.assertEqual(hosts.pop_ready(), 'b0')
+        self.assertEqual(hosts.pop_more('b', 8), [])
+        self.assertEqual(len(hosts), 2)
+
+        hosts = HostScheduler(RateLimiter())
+        hosts.add('a', 'a0')
+        hosts.add('a', 'a1')
+        self.assertEqual(hosts.pop_more('a', 8), ['a0', 'a1'])
+        self.assertIsNone(hosts.next_ready())
+        self.assertIsNone(hosts.pop_ready())
+        hosts.add('a', 'a2')
+        self.assertEqual(hosts.pop_ready(), 'a2')
+
+    def test_breaker(self):
+        """Host with open circuit-breaker is not ready.
+
+        """
+        breaker = CircuitBreaker(threshold=1, cooldown=60.0)
+        breaker.failure('a')
+        hosts = HostScheduler(RateLimiter(), breaker)
+        hosts.add('a', 'a0')
+        hosts.add('b', 'b0')
+
+        self.assertEqual(hosts.pop_ready(), 'b0')
+        self.assertIsNone(hosts.pop_ready())
+        self.assertGreater(hosts.next_ready(), 30.0)
+
+    def test_breaker_probe_rate_limited(self):
+        """Probe of a breaker is only let through once the host has a token
+           (not lost while waiting for the rate-limit).
+
+        """
+        breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+        limiter = RateLimiter(rate=10.0)
+        hosts = HostScheduler(limiter, breaker)
+        limiter.take('a')  # next token in 0.1s
+        breaker.failure('a')
+        hosts.add('a', 'a0')
+
+        time.sleep(0.06)  # cooldown over, no token yet
+        self.assertIsNone(hosts.pop_ready())
+        self.assertEqual(breaker.wait_time('a', probe=False), 0.0)
+
+        time.sleep(hosts.next_ready() + 0.01)
+        self.assertEqual(hosts.pop_ready(), 'a0')
+        self.assertGreater(breaker.wait_time('a'), 0.0)  # probe running
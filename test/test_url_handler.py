@@ -4,13 +4,17 @@ import shutil
 from src.exceptions import (URLParsingError,
                             URLInferFilenameError,
                             UtilsFileNameValidError)
-from src.url_handler import URLHandler
+from urllib.parse import urlsplit
+from src.url_handler import URLHandler, claim_filename, split_url, split_urls
+from src.utils import FilenameValidator
 
 VALID_URL = ("https://storage.googleapis.com/blueyonder_assignment"
              "/python-pseudocode.jpg")
 VALID_URL_INF_FILENAME = 'python-pseudocode.jpg'
 
 MALFORMED_URL = 'foo.bar'
+UNSUPPORTED_SCHEME_URLS = ['ftp://host/a.jpg', 'FILE://host/a.jpg',
+                           'ftp://h\u00f6st.de/b\u00e4r.jpg']
 BROKEN_URL_FILENAME = ("https://storage.googleapis.com/blueyonder_assignment"
                        "/while-loop-animation\0-python.gif")
 
@@ -50,6 +54,16 @@ class TestURLHandler(unittest.TestCase):
         with self.assertRaises(URLParsingError):
             url_handler = URLHandler(MALFORMED_URL, self.valid_out_dir)
 
+    def test_unsupported_scheme(self):
+        """URL with other scheme than http(s) is given:
+           - cannot be parsed (not downloadable)
+
+        """
+        for url in UNSUPPORTED_SCHEME_URLS:
+            with self.assertRaises(URLParsingError):
+                url_handler = URLHandler(url, self.valid_out_dir)
+            self.assertIsNone(split_url(url))
+
     def test_invalid_filename_inference(self):
         """URL given:
            - can be parsed
@@ -58,3 +72,56 @@ class TestURLHandler(unittest.TestCase):
         """
         with self.assertRaises(URLInferFilenameError):
             url_handler = URLHandler(BROKEN_URL_FILENAME, self.valid_out_dir)
+
+    def test_valid_url_with_validator(self):
+        """Valid URL is given; filename is checked in memory.
+
+        """
+        validator = FilenameValidator(self.valid_out_dir)
+        url_handler = URLHandler(VALID_URL, self.valid_out_dir, validator)
+        self.assertEqual(url_handler.get_filename(), VALID_URL_INF_FILENAME)
+
+    def test_invalid_filename_with_validator(self):
+        """Filename-inference leads to invalid filename; checked in memory.
+
+        """
+        validator = FilenameValidator(self.valid_out_dir)
+        with self.assertRaises(URLInferFilenameError):
+            url_handler = URLHandler(BROKEN_URL_FILENAME, self.valid_out_dir,
+                                     validator)
+
+    def test_split_urls(self):
+        """Bulk-split matches urlsplit (plain and unusual URLs); URLs without
+           scheme (http / https), netloc or path are masked as failed.
+
+        """
+        urls = [VALID_URL, 'http://host:8080/a/b.jpg?x=/y#z',
+                'HTTP://user@host/a', 'http://[::1]/a.jpg',
+                'https://h\u00f6st.de/b\u00e4r.jpg', 'http://host/a b.jpg',
+                MALFORMED_URL, 'http://host', 'http://host?a/b.jpg',
+                'http://[::1/a.jpg'] + UNSUPPORTED_SCHEME_URLS
+        netlocs, paths, filenames, failed = split_urls(urls)
+
+        self.assertEqual(failed, [False] * 6 + [True] * 7)
+        for i, url in enumerate(urls[:6]):
+            urlsplit_res = urlsplit(url)
+            self.assertEqual((netlocs[i], paths[i]),
+                             (urlsplit_res.netloc, urlsplit_res.path))
+            self.assertEqual(split_url(url),
+                             (netlocs[i], paths[i], filenames[i]))
+        self.assertEqual(filenames[:2], [VALID_URL_INF_FILENAME, 'b.jpg'])
+        self.assertEqual(netlocs[6:], [None] * 7)
+
+    def test_claim_filename(self):
+        """Unparsable URL and invalid filename raise as in URLHandler.
+
+        """
+        validator = FilenameValidator(self.valid_out_dir)
+        self.assertEqual(claim_filename(VALID_URL, VALID_URL_INF_FILENAME,
+                                        self.valid_out_dir, validator),
+                         VALID_URL_INF_FILENAME)
+        with self.assertRaises(URLParsingError):
+            claim_filename(MALFORMED_URL, None, self.valid_out_dir)
+        with self.assertRaises(URLInferFilenameError):
+            claim_filename(BROKEN_URL_FILENAME, split_url(
+                BROKEN_URL_FILENAME)[2], self.valid_out_dir, validator)
@@ -0,0 +1,45 @@
+import unittest
+from src.url_table import URLTable
+
+RECORDS = [('https://example.com/a.jpg', 'a.jpg', 1),
+           ('https://example.com/bär.jpg', 'bär.jpg', 3),
+           ('http://[::1]:8080/a.jpg?x=1', 'a-1.jpg', 2 ** 40)]
+
+
+class TestURLTable(unittest.TestCase):
+    """Unit-testing for URLTable.
+
+    """
+    def setUp(self):
+        """Table of RECORDS.
+
+        """
+        self.table = URLTable()
+        for record in RECORDS:
+            self.table.append(*record)
+
+    def test_iter(self):
+        """Records are read back in order (non-ASCII URLs included).
+
+        """
+        self.assertEqual(len(self.table), len(RECORDS))
+        self.assertEqual(list(self.table), RECORDS)
+        self.assertEqual(list(self.table.iter_urls()),
+                         [url for url, _, _ in RECORDS])
+        self.assertEqual(list(self.table.line_numbers), [1, 3, 2 ** 40])
+
+    def test_getitem(self):
+        """Records are indexed like a list.
+
+        """
+        self.assertEqual(self.table[0], RECORDS[0])
+        self.assertEqual(self.table[1], RECORDS[1])
+        self.assertEqual(self.table[-1], RECORDS[-1])
+        with self.assertRaises(IndexError):
+            self.table[len(RECORDS)]
+
+    def test_empty(self):
+        """Empty table has no records.
+
+        """
+        self.assertEqual(list(URLTable()), [])
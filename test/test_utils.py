@@ -5,7 +5,8 @@ import shutil
 from src.exceptions import (UtilsFileDoesNotExistError,
                             UtilsFileDoesExistError,
                             UtilsFileNameValidError)
-from src.utils import assert_file_existing, assert_filename_valid
+from src.utils import (assert_file_existing, assert_filename_valid,
+                       FilenameValidator)
 
 INVALID_FILENAME = 'myfile\0.jpg'  # null-byte!
 
@@ -63,3 +64,68 @@ class TestUtils(unittest.TestCase):
         with self.assertRaises(UtilsFileNameValidError):
             assert_filename_valid(INVALID_FILENAME,
                                   os.path.dirname(self.valid_fp.name))
+
+
+class TestFilenameValidator(unittest.TestCase):
+    """Unit-testing for FilenameValidator
+
+    """
+    def setUp(self):
+        """Create temporary-dir with one existing file.
+
+        """
+        self.valid_out_dir = tempfile.mkdtemp()
+        open(os.path.join(self.valid_out_dir, 'existing.jpg'), 'w').close()
+
+    def tearDown(self):
+        """Clean-up temporary-dir.
+
+        """
+        shutil.rmtree(self.valid_out_dir)
+
+    def test_valid_filename(self):
+        """All good case; no probe-file is created.
+
+        """
+        validator = FilenameValidator(self.valid_out_dir)
+        validator.assert_valid('myfile.jpg')
+        self.assertEqual(os.listdir(self.valid_out_dir), ['existing.jpg'])
+
+    def test_invalid_filenames(self):
+        """NUL-bytes, separators, special and too long names.
+
+        """
+        validator = FilenameValidator(self.valid_out_dir)
+        for fn in [INVALID_FILENAME, 'a' + os.sep + 'b', '', '.', '..',
+                   'a' * (validator.name_max + 1)]:
+            with self.assertRaises(UtilsFileNameValidError):
+                validator.assert_valid(fn)
+
+    def test_existing_filename(self):
+        """Collision with listing of out-dir.
+
+        """
+        validator = FilenameValidator(self.valid_out_dir)
+        with self.assertRaises(UtilsFileDoesExistError):
+            validator.assert_valid('existing.jpg')
+
+    def test_nonexisting_out_dir(self):
+        """Out-dir does not exist: no filename is valid.
+
+           This "non-existence" in this test is true with high-probability.
+
+        """
+        validator = FilenameValidator(self.valid_out_dir + '1')
+        with self.assertRaises(UtilsFileNameValidError):
+            validator.assert_valid('myfile.jpg')
+
+    def test_strict(self):
+        """Strict mode uses probe-based checks (sees files created later).
+
+        """
+        validator = FilenameValidator(self.valid_out_dir, strict=True)
+        open(os.path.join(self.valid_out_dir, 'later.jpg'), 'w').close()
+        with self.assertRaises(UtilsFileDoesExistError):
+            validator.assert_valid('later.jpg')
+        with self.assertRaises(UtilsFileNameValidError):
+            validator.assert_valid(INVALID_FILENAME)